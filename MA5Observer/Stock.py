@@ -1,15 +1,16 @@
 
+import numpy as np
 import pandas as pd
 
-from MA5Observer.data_provider.data_provider import AdataProvider
-
-import time
+from MA5Observer.indicator import IndicatorState
+from MA5Observer.signal_engine import SELL_SIGNALS, first_sell_signal
+from MA5Observer.tick_buffer import TickBuffer
 
 
 class Stock:
     def __init__(self, stock_code, data_provider, is_held=True, time_interval=60):
         self.stock_code = stock_code
-        self.stock_name = data_provider.all_info[data_provider.all_info['stock_code'] == stock_code]['short_name'].iloc[0]
+        self.stock_name = data_provider.get_stock_name(stock_code)
         self.data_provider = data_provider  # 注入数据提供者实例
         # | 字段           | 类型    | 说明           |
         # |----------------|---------|----------------|
@@ -32,29 +33,21 @@ class Stock:
 
 
         self._current_price = None  # 当前实时价格
-        self._ma5 = None  # 5日均线
-        self.highest_price_yesterday = None  # 昨日最高价
-        self.open_price_yesterday = None  # 昨日开盘价
-        self.lowest_price_yesterday = None  # 昨日最低价
+        # 增量均线状态(MA5/MA10/MA20 与昨日开高低收)，盘中更新价格时不再改写 k_day
+        self.indicators = IndicatorState()
         self.is_held = is_held  # 是否持有该股票
         self.isOpened = data_provider.is_market_open()  # 是否开市
         # 获取当前日期年月日
-        self.today = pd.Timestamp.now().strftime('%Y-%m-%d')
+        self.today = data_provider.clock.now().strftime('%Y-%m-%d')
         self.yesterday = self.data_provider.get_yesterday_trade_date()
-        # 创建一个空的当日tick数据 表格 表头 ：stock_code short_name  price change change_pct     volume        amount trade_time
-        self.today_tick_data = pd.DataFrame(
-            columns=['stock_code', 'short_name', 'price', 'change', 'change_pct', 'volume', 'amount'])
+        # 当日tick数据：列式缓冲区 trade_time price change change_pct volume amount
+        self.ticks = TickBuffer()
 
         # 初始化股票数据
         self.initialize_stock_data()
 
-        # 存储每个卖点的上次触发时间戳
-        self.sell_signals_timestamp = {
-            "highest_price_break": 0,
-            "open_price_break": 0,
-            "lowest_price_break": 0,
-            "ma5_break": 0
-        }
+        # 存储每个卖点的上次触发时间戳，顺序同 SELL_SIGNALS；加入 SellSignalEngine 后为其 last_times 中对应行的视图
+        self.signal_times = np.zeros(len(SELL_SIGNALS))
 
         # 设置时间间隔，默认 60 秒
         self.time_interval = time_interval
@@ -69,98 +62,129 @@ class Stock:
         # 获取用today昨日的收盘价、最高价、最低价和开盘价等
         yesterday_data = df[df["trade_date"] == self.yesterday].iloc[0]
         # 转换浮点数
-        self.highest_price_yesterday = float(yesterday_data["high"])
-        self.open_price_yesterday = float(yesterday_data["open"])
-        self.lowest_price_yesterday = float(yesterday_data["low"])
+        self.indicators.set_yesterday(yesterday_data["open"], yesterday_data["high"],
+                                      yesterday_data["low"], yesterday_data["close"])
+
+        # 用已收盘交易日的收盘价初始化均线状态；数据源若带有当日未收盘K线，则作为当日临时价
+        history = df[df["trade_date"] != self.today]
+        for close in history["close"].astype(float):
+            self.indicators.push_close(close)
+        if len(history) < len(df):
+            self.indicators.update_today(float(df["close"].iloc[-1]))
+
+    def start_new_day(self, trade_date):
+        """
+        换日：按历史K线重建均线状态与昨日开高低收；数据源还没有上一交易日的K线时，
+        用上一交易日的 tick 收盘(IndicatorState.close_day)，昨日开高低收取 tick 的首/高/低/末价。之后清空 tick
+        """
+        previous, prices = self.indicators, np.array(self.ticks.column("price"))
+        self.today = trade_date
+        self.yesterday = self.data_provider.get_yesterday_trade_date()
+        self.indicators = IndicatorState()
+        try:
+            self.initialize_stock_data()
+        except (IndexError, KeyError):
+            self.indicators = previous
+            if len(prices):
+                previous.set_yesterday(prices[0], prices.max(), prices.min(), prices[-1])
+            previous.close_day()
+        self.ticks.clear()
+        self._current_price = None
+
+    @property
+    def current_price(self):
+        """获取当前实时价格"""
+        return self._current_price
+
+    @property
+    def highest_price_yesterday(self):
+        """昨日最高价"""
+        return self.indicators.yesterday_high
 
+    @property
+    def open_price_yesterday(self):
+        """昨日开盘价"""
+        return self.indicators.yesterday_open
 
-        # 初始化5日均线
-        close_prices = df["close"].tolist()
-        if len(close_prices) >= 5:
-            self._ma5 = sum(close_prices[-5:]) / 5
+    @property
+    def lowest_price_yesterday(self):
+        """昨日最低价"""
+        return self.indicators.yesterday_low
 
     @property
     def ma5(self):
         """获取5日均线"""
-        return self._ma5
+        return self.indicators.ma(5)
 
     @ma5.setter
     def ma5(self, value):
-        """更新5日均线并同步更新历史数据"""
-        # self._ma5 = value
-        # close_prices = self.k_day["close"].tolist()
-        # 更新最后一条数据的close（即今天的收盘价）
-        if self.today in self.k_day['trade_date'].values:
-            self.k_day.loc[self.k_day['trade_date'] == self.today, 'close'] = value
-        else:
-            # 如果今天没有数据，添加今天的收盘价
-            new_data = pd.DataFrame([{'trade_date': self.today, 'close': value}])
-            self.k_day = pd.concat([self.k_day, new_data], ignore_index=True)
-
-        # 转换类型
-        self.k_day['close'] = self.k_day['close'].astype(float)
-
-        # 重新计算5日均线：使用pandas的rolling函数计算
-        self._ma5 = self.k_day['close'].tail(5).mean()  # 获取最近5天的均线
+        """以最新价作为今天的临时收盘价，增量更新各周期均线"""
+        self.indicators.update_today(value)
+
+    def ma(self, window):
+        """获取指定周期(5/10/20)的均线"""
+        return self.indicators.ma(window)
+
+    @property
+    def today_tick_data(self):
+        """当日tick数据表：stock_code short_name price change change_pct volume amount trade_time"""
+        frame = self.ticks.to_frame()
+        frame.insert(0, 'stock_code', self.stock_code)
+        frame.insert(1, 'short_name', self.stock_name)
+        return frame
 
     def update_current(self, real_time_data):
-        """更新当前行情 stock_code short_name price change change_pct volume amount"""
-        # 检查输入的数据是否为空series
-        if real_time_data.empty:
+        """更新当前行情 stock_code short_name price change change_pct volume amount
+        real_time_data 为实时行情快照中的一行(Series)，也兼容只有一行的 DataFrame"""
+        # 检查输入的数据是否为空
+        if real_time_data is None or real_time_data.empty:
             return
         # 当前没开市,不更新
         if not self.isOpened:
             return
+        if isinstance(real_time_data, pd.DataFrame):
+            real_time_data = real_time_data.iloc[0]
 
-        real_time_data['trade_time'] = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        if self.today_tick_data.empty:
-            self.today_tick_data = pd.concat([self.today_tick_data, real_time_data], ignore_index=True)
-        else:
-            latest_data = self.today_tick_data.iloc[-1]
-            # 去掉trade_time列后与real_time_data比较若不同则更新
-            if not latest_data.drop('trade_time').equals(real_time_data):
-                self.today_tick_data = pd.concat([self.today_tick_data, real_time_data], ignore_index=True)
+        price = float(real_time_data['price'])
+        # 价格和成交量与上一条相同的快照不重复记录
+        self.ticks.append(self.data_provider.clock.time(), price, float(real_time_data['change']),
+                          float(real_time_data['change_pct']), float(real_time_data['volume']),
+                          float(real_time_data['amount']))
 
         # 更新当前价格
-        self._current_price = real_time_data['price']
+        self._current_price = price
         # 更新 ma5
         self.ma5 = self._current_price  # 当价格更新时，也自动更新 ma5
 
+    def restore_ticks(self, columns):
+        """从检查点恢复当日tick {列名: 数组}，并以最后一个价格更新当前价与均线"""
+        if not len(columns["price"]):
+            return
+        self.ticks.extend(columns)
+        self._current_price = self.ticks.last("price")
+        self.ma5 = self._current_price
+
+    @property
+    def sell_signals_timestamp(self):
+        """各卖点的上次触发时间戳 {卖点名称: 时间戳}"""
+        return {name: float(t) for (name, _), t in zip(SELL_SIGNALS, self.signal_times)}
+
     def check_sell_conditions(self):
         """检查卖点条件"""
-        if self._current_price is None or self._ma5 is None:
+        ma5 = self.ma5
+        if self._current_price is None or ma5 is None:
             return False, "价格或5日均线数据不足"
 
         # 获取昨日的最高价、开盘价、最低价
         if self.highest_price_yesterday is None or self.open_price_yesterday is None or self.lowest_price_yesterday is None:
             return False, "昨日数据不足"
 
-        current_time = time.time()  # 获取当前时间戳（秒）
-
-        # 卖点1: 突破上一日最高价后回落卖出
-        if self._current_price > self.highest_price_yesterday:
-            if current_time - self.sell_signals_timestamp["highest_price_break"] > self.time_interval:
-                self.sell_signals_timestamp["highest_price_break"] = current_time
-                return True, "突破上一日最高价"
-
-        # 卖点2: 突破上一日开盘价后回落卖出
-        if self._current_price > self.open_price_yesterday:
-            if current_time - self.sell_signals_timestamp["open_price_break"] > self.time_interval:
-                self.sell_signals_timestamp["open_price_break"] = current_time
-                return True, "突破上一日开盘价"
-
-        # 卖点5: 开盘价跌破上一日最低价，同时跌破5日均线，坚决卖出
-        if self._current_price < self.lowest_price_yesterday and self._current_price < self._ma5:
-            if current_time - self.sell_signals_timestamp["lowest_price_break"] > self.time_interval:
-                self.sell_signals_timestamp["lowest_price_break"] = current_time
-                return True, "开盘价跌破上一日最低价，同时跌破5日均线，坚决卖出"
-
-        # 卖点6: 盘中跌破5日均线，同时跌破上一日最低价，坚决卖出
-        if self._current_price < self._ma5 and self._current_price < self.lowest_price_yesterday:
-            if current_time - self.sell_signals_timestamp["ma5_break"] > self.time_interval:
-                self.sell_signals_timestamp["ma5_break"] = current_time
-                return True, "盘中跌破5日均线，同时跌破上一日最低价，坚决卖出"
+        # 与 SellSignalEngine 使用同一套判断逻辑(标量版本)
+        which = first_sell_signal(self._current_price, self.highest_price_yesterday, self.open_price_yesterday,
+                                  self.lowest_price_yesterday, ma5, self.signal_times,
+                                  self.data_provider.clock.time(), self.time_interval)
+        if which is not None:
+            return True, SELL_SIGNALS[which][1]
 
         return False, "未满足卖出条件"
 
@@ -168,6 +192,7 @@ class Stock:
 if __name__ == '__main__':
     #测试Stock类
     # 初始化数据提供者
+    from MA5Observer.data_provider.data_provider import AdataProvider
     data_provider = AdataProvider()
     # 创建股票实例
     stock = Stock(stock_code='000001', data_provider=data_provider)
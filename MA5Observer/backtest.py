@@ -0,0 +1,206 @@
+# backtest.py
+"""
+用 data/*.csv 日K线历史回放实盘规则：
+  - 买点：PriceRangeStrategy 的 MA5 区间，价格落入 [MA5, MA5 * (1 + tolerance)] 时买入
+  - 卖点：Stock.check_sell_conditions 的卖点，突破昨日最高价 / 突破昨日开盘价 / 同时跌破昨日最低价与 MA5
+    (卖点5与卖点6条件相同，统一记为 lowest_price_break)
+
+日线上无法得知盘中路径，规则都换算成价格阈值后用当日开高低判断是否触及：
+  - 记 S4 为前4个交易日收盘价之和，以价格 x 计算的 MA5 = (S4 + x) / 5，
+    故 x >= MA5 等价于 x >= S4 / 4，x <= MA5 * (1 + t) 等价于 x <= S4 * (1 + t) / (4 - t)
+  - 触及阈值时按阈值成交，开盘即越过阈值(跳空)时按开盘价成交
+  - 同一天上下两个方向都触及时，除非开盘已越过上方阈值，否则按先触发止损处理(保守估计)
+全部股票的数组首尾相接一次性向量化计算，按股票分块多进程并行。
+加 --binary 时改为读取 mmap 二进制历史数据(见 history_data)，各进程共享同一份页缓存，不再解析 CSV。
+
+用法：
+    python -m MA5Observer.backtest --data data --tolerance 0.03 --output trades.csv
+    python -m MA5Observer.backtest --binary
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.history_data import (DEFAULT_DATA_DIR, DEFAULT_BINARY_DIR, list_csv_codes, load_csv_dir,
+                                      load_arrays, load_history)
+
+
+def evaluate_rules(history, tolerance=0.03):
+    """
+    对 HistoryArrays 中所有K线计算买卖信号
+    :return: dict，各项均为与K线等长的数组：
+        entry / entry_price：是否触发买点及成交价
+        exit / exit_price / exit_signal：是否触发卖点、成交价及卖点名称序号(见 EXIT_SIGNALS)
+    """
+    c = history.columns
+    close, open_, high, low = c["close"], c["open"], c["high"], c["low"]
+    n = len(close)
+    pos = history.position_in_code()
+    idx = np.arange(n)
+
+    # 前4个交易日收盘价之和，不足4天的位置为 nan(逐项相加而非累计和相减，结果不受拼接顺序影响)
+    s4 = np.full(n, np.nan)
+    has4 = pos >= 4
+    rows = idx[has4]
+    s4[has4] = close[rows - 4] + close[rows - 3] + close[rows - 2] + close[rows - 1]
+
+    # 买点：当日价格区间与 MA5 区间有交集
+    lower = s4 / 4
+    upper = s4 * (1 + tolerance) / (4 - tolerance)
+    entry = (low <= upper) & (high >= lower)
+    entry_price = np.clip(open_, lower, upper)
+
+    # 卖点：与昨日K线比较
+    prev_high = np.full(n, np.nan)
+    prev_open = np.full(n, np.nan)
+    prev_low = np.full(n, np.nan)
+    has_prev = pos >= 1
+    prev_high[has_prev] = high[idx[has_prev] - 1]
+    prev_open[has_prev] = open_[idx[has_prev] - 1]
+    prev_low[has_prev] = low[idx[has_prev] - 1]
+
+    # 向上：与 SellSignalEngine 相同，突破昨日最高价(price > 昨日最高价)优先于突破昨日开盘价(price > 昨日开盘价)；
+    # 开盘即越过阈值时按开盘价判断，否则当日最高价越过哪个阈值就按哪个卖点在该阈值成交
+    gap_high = open_ > prev_high
+    gap_open = open_ > prev_open
+    up_signal = np.where(gap_high | (~gap_open & (high > prev_high)), 0, 1)  # 0=突破昨日最高价，1=突破昨日开盘价
+    up_level = np.where(up_signal == 0, prev_high, prev_open)
+    up_hit = (high > prev_high) | (high > prev_open)
+    # 向下：价格同时低于昨日最低价与 MA5，即低于 min(昨日最低价, S4/4)
+    down_level = np.fmin(prev_low, lower)
+    down_hit = low < down_level
+
+    gap_up = gap_high | gap_open
+    use_down = down_hit & ~gap_up
+    exit_ = (up_hit | down_hit) & has4
+    exit_price = np.where(use_down, np.minimum(open_, down_level), np.maximum(open_, up_level))
+    exit_signal = np.where(use_down, 2, up_signal)
+    return {
+        "entry": entry & has4,
+        "entry_price": entry_price,
+        "exit": exit_,
+        "exit_price": exit_price,
+        "exit_signal": exit_signal,
+    }
+
+
+# 卖点名称，顺序与 evaluate_rules 返回的 exit_signal 一致
+EXIT_SIGNALS = ("highest_price_break", "open_price_break", "lowest_price_break")
+
+
+def pair_trades(history, signals):
+    """
+    按股票把买点与其后第一个卖点配对成交易(同一时间最多持有一笔，卖出当天之后才可再次买入)
+    :return: 交易明细 DataFrame，未平仓的交易按最后一根K线收盘价估值，is_open=True
+    """
+    entries = np.flatnonzero(signals["entry"])
+    exits = np.flatnonzero(signals["exit"])
+    dates = history.columns["trade_date"]
+    close = history.columns["close"]
+    records = []
+    for i, code in enumerate(history.codes):
+        start, end = history.offsets[i], history.offsets[i + 1]
+        es = entries[np.searchsorted(entries, start):np.searchsorted(entries, end)]
+        xs = exits[np.searchsorted(exits, start):np.searchsorted(exits, end)]
+        last = start - 1
+        while True:
+            k = np.searchsorted(es, last, side="right")
+            if k == len(es):
+                break
+            e = es[k]
+            j = np.searchsorted(xs, e, side="right")
+            if j == len(xs):
+                records.append((code, dates[e], signals["entry_price"][e], dates[end - 1], close[end - 1],
+                                "open", end - 1 - e, True))
+                break
+            x = xs[j]
+            records.append((code, dates[e], signals["entry_price"][e], dates[x], signals["exit_price"][x],
+                            EXIT_SIGNALS[signals["exit_signal"][x]], x - e, False))
+            last = x
+    trades = pd.DataFrame(records, columns=["stock_code", "entry_date", "entry_price", "exit_date",
+                                            "exit_price", "exit_signal", "holding_days", "is_open"])
+    trades["return_pct"] = (trades["exit_price"] / trades["entry_price"] - 1) * 100
+    return trades
+
+
+def backtest_history(history, tolerance=0.03):
+    """对已加载的 HistoryArrays 回测，返回交易明细"""
+    return pair_trades(history, evaluate_rules(history, tolerance))
+
+
+def _backtest_chunk(args):
+    data_dir, codes, tolerance = args
+    return backtest_history(load_csv_dir(data_dir, codes=codes, workers=1), tolerance)
+
+
+def _backtest_binary_chunk(args):
+    binary_dir, start, end, tolerance = args
+    return backtest_history(load_arrays(binary_dir).subset(start, end), tolerance)
+
+
+def run_backtest(data_dir=DEFAULT_DATA_DIR, codes=None, tolerance=0.03, workers=None, binary_dir=None):
+    """
+    回测 data_dir 下的全部(或指定)股票，按股票分块在多个进程中加载并计算
+    :param binary_dir: 指定时使用该目录下的 mmap 二进制历史数据(过期则先从 data_dir 转换)，忽略 codes
+    :return: 交易明细 DataFrame
+    """
+    workers = workers or os.cpu_count() or 1
+    if binary_dir is not None:
+        total = len(load_history(data_dir, binary_dir, workers=workers))
+        chunk = max(1, total // (workers * 4))
+        tasks = [(binary_dir, i, min(i + chunk, total), tolerance) for i in range(0, total, chunk)]
+        if workers == 1:
+            return _backtest_binary_chunk((binary_dir, 0, total, tolerance))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return pd.concat(list(executor.map(_backtest_binary_chunk, tasks)), ignore_index=True)
+
+    codes = list_csv_codes(data_dir) if codes is None else list(codes)
+    if workers == 1 or len(codes) < 2 * workers:
+        return _backtest_chunk((data_dir, codes, tolerance))
+    chunk = max(1, len(codes) // (workers * 4))
+    tasks = [(data_dir, codes[i:i + chunk], tolerance) for i in range(0, len(codes), chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        frames = list(executor.map(_backtest_chunk, tasks))
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize(trades):
+    """按卖点汇总交易笔数、胜率与收益，最后一行为全部已平仓交易"""
+    closed = trades[~trades["is_open"]]
+
+    def stats(df):
+        return pd.Series({
+            "trades": len(df),
+            "hit_rate": (df["return_pct"] > 0).mean() * 100 if len(df) else np.nan,
+            "avg_return_pct": df["return_pct"].mean(),
+            "total_return_pct": df["return_pct"].sum(),
+            "avg_holding_days": df["holding_days"].mean(),
+        })
+
+    rows = {signal: stats(df) for signal, df in closed.groupby("exit_signal")}
+    rows["all"] = stats(closed)
+    return pd.DataFrame(rows).T.rename_axis("exit_signal")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MA5 区间买点 + 卖点规则的日线回测")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="日K线 CSV 目录")
+    parser.add_argument("--tolerance", type=float, default=0.03, help="MA5 区间上沿比例")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--output", default=None, help="交易明细输出 CSV 路径")
+    parser.add_argument("--binary", nargs="?", const=DEFAULT_BINARY_DIR, default=None,
+                        help="使用 mmap 二进制历史数据目录，默认 MA5Observer/cache/history")
+    args = parser.parse_args()
+
+    trades = run_backtest(args.data, tolerance=args.tolerance, workers=args.workers, binary_dir=args.binary)
+    if args.output:
+        trades.to_csv(args.output, index=False, encoding="utf-8")
+    print(f"共 {trades['stock_code'].nunique()} 只股票, {len(trades)} 笔交易(其中未平仓 {int(trades['is_open'].sum())} 笔)")
+    print(summarize(trades).round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
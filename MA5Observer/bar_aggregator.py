@@ -0,0 +1,172 @@
+# bar_aggregator.py
+"""
+由实时行情快照增量生成分钟K线(默认 1/5/15 分钟)：
+  - 每个周期为全部股票各保存一根未完成的K线(开高低收 + 起始累计成交量/成交额)，每个快照一次向量化更新
+  - 快照时间进入新的周期时，未完成的K线整体收盘，写入固定长度的环形数组，读取最近第 k 根为 O(1)
+  - 快照中的 volume / amount 为当日累计值，K线成交量为本根K线内累计值的增量；
+    每只股票以第一次收到的累计值为起点(盘中启动时第一根K线不会计入开盘以来的全部成交量)
+周期按 Unix 时间戳整除对齐(北京时间与 UTC 相差 8 小时，是 15 分钟的整数倍，对齐到本地整分钟)。
+某个周期内没有快照的股票对应的K线为 nan。
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.signal_engine import common_rows
+
+DEFAULT_PERIODS = (60, 300, 900)
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "amount")
+
+
+class _PeriodBars:
+    """单个周期：未完成K线 + 已完成K线的环形数组(keep 根 x 股票数)"""
+
+    def __init__(self, period, n, keep):
+        self.period = period
+        self.keep = keep
+        self.start = None  # 未完成K线的起始时间戳
+        self.open = np.full(n, np.nan)
+        self.high = np.full(n, np.nan)
+        self.low = np.full(n, np.nan)
+        self.close = np.full(n, np.nan)
+        self.volume_base = np.full(n, np.nan)  # 本根K线开始前最后一次的累计成交量/成交额，未收到过时为 nan
+        self.amount_base = np.full(n, np.nan)
+        self.volume_last = np.full(n, np.nan)  # 最近一次的累计成交量/成交额
+        self.amount_last = np.full(n, np.nan)
+        self.finished = {name: np.full((keep, n), np.nan) for name in BAR_FIELDS}
+        self.finished_start = np.zeros(keep, dtype=np.int64)
+        self.count = 0  # 已完成的K线总数，第 i 根位于环形数组的 i % keep
+
+    def finish(self):
+        """未完成的K线收盘写入环形数组，开始新的空K线"""
+        if self.start is None:
+            return
+        slot = self.count % self.keep
+        bars = self.finished
+        bars["open"][slot] = self.open
+        bars["high"][slot] = self.high
+        bars["low"][slot] = self.low
+        bars["close"][slot] = self.close
+        # 累计值变小说明已换日重新累计
+        volume = self.volume_last - self.volume_base
+        amount = self.amount_last - self.amount_base
+        traded = ~np.isnan(self.close)
+        bars["volume"][slot] = np.where(traded, np.where(volume >= 0, volume, self.volume_last), np.nan)
+        bars["amount"][slot] = np.where(traded, np.where(amount >= 0, amount, self.amount_last), np.nan)
+        self.finished_start[slot] = self.start
+        self.count += 1
+        self.volume_base[:] = self.volume_last
+        self.amount_base[:] = self.amount_last
+        for array in (self.open, self.high, self.low, self.close):
+            array[:] = np.nan
+        self.start = None
+
+    def update(self, now, price, volume, amount, valid):
+        start = int(now // self.period * self.period)
+        if self.start is not None and start != self.start:
+            self.finish()
+        self.start = start
+        first = valid & np.isnan(self.open)
+        self.open[first] = price[first]
+        self.high[valid] = np.fmax(self.high[valid], price[valid])
+        self.low[valid] = np.fmin(self.low[valid], price[valid])
+        self.close[valid] = price[valid]
+        self.volume_last[valid] = volume[valid]
+        self.amount_last[valid] = amount[valid]
+        # 第一次收到的累计值作为起点
+        np.copyto(self.volume_base, self.volume_last, where=np.isnan(self.volume_base))
+        np.copyto(self.amount_base, self.amount_last, where=np.isnan(self.amount_base))
+
+    def carry_over(self, previous, new, old):
+        """从旧的同周期状态复制共有股票的行"""
+        self.start = previous.start
+        for name in ("open", "high", "low", "close", "volume_base", "amount_base", "volume_last", "amount_last"):
+            getattr(self, name)[new] = getattr(previous, name)[old]
+        keep = min(self.keep, previous.keep)
+        self.count = previous.count
+        for k in range(min(keep, previous.count)):
+            i = previous.count - 1 - k
+            slot, previous_slot = i % self.keep, i % previous.keep
+            self.finished_start[slot] = previous.finished_start[previous_slot]
+            for name in BAR_FIELDS:
+                self.finished[name][slot, new] = previous.finished[name][previous_slot, old]
+
+
+class BarAggregator:
+    """
+    一组股票的分钟K线增量聚合。
+    update(snapshot, now) 在每个快照后调用；bar(period, code, ago) / bars(period, code) 读取已完成的K线，
+    current(period) 返回全部股票未完成的K线
+    """
+
+    def __init__(self, codes, periods=DEFAULT_PERIODS, keep=64):
+        """
+        :param codes: 股票代码列表
+        :param periods: K线周期(秒)
+        :param keep: 每个周期保留的已完成K线根数(环形数组，更早的被覆盖)
+        """
+        self.codes = list(codes)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.keep = keep
+        self.periods = {period: _PeriodBars(period, len(self.codes), keep) for period in periods}
+
+    def update(self, snapshot, now):
+        """用一个快照(以 stock_code 为索引，含 price volume amount)更新全部周期的未完成K线"""
+        positions = snapshot.index.get_indexer(self.codes)
+        found = positions >= 0
+        columns = []
+        for name in ("price", "volume", "amount"):
+            values = np.full(len(self.codes), np.nan)
+            values[found] = snapshot[name].to_numpy(dtype=np.float64)[positions[found]]
+            columns.append(values)
+        price, volume, amount = columns
+        valid = ~np.isnan(price)
+        for bars in self.periods.values():
+            bars.update(now, price, volume, amount, valid)
+
+    def flush(self):
+        """收盘或休市时把全部未完成的K线收盘"""
+        for bars in self.periods.values():
+            bars.finish()
+
+    def bar(self, period, code, ago=0):
+        """
+        已完成的倒数第 ago+1 根K线 {start open high low close volume amount}，不存在时返回 None
+        """
+        bars = self.periods[period]
+        if ago >= min(bars.count, bars.keep):
+            return None
+        slot = (bars.count - 1 - ago) % bars.keep
+        i = self._index[code]
+        bar = {name: float(bars.finished[name][slot, i]) for name in BAR_FIELDS}
+        bar["start"] = int(bars.finished_start[slot])
+        return bar
+
+    def bars(self, period, code):
+        """单只股票保留的全部已完成K线 DataFrame(按时间升序)，start 为本地时间"""
+        bars = self.periods[period]
+        n = min(bars.count, bars.keep)
+        slots = [(bars.count - n + k) % bars.keep for k in range(n)]
+        i = self._index[code]
+        frame = pd.DataFrame({name: bars.finished[name][slots, i] for name in BAR_FIELDS})
+        utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+        frame.insert(0, "start", pd.to_datetime(bars.finished_start[slots] + utc_offset, unit="s"))
+        return frame
+
+    def current(self, period):
+        """全部股票未完成的K线 DataFrame(以 stock_code 为索引)"""
+        bars = self.periods[period]
+        volume = bars.volume_last - bars.volume_base
+        amount = bars.amount_last - bars.amount_base
+        return pd.DataFrame({"open": bars.open, "high": bars.high, "low": bars.low, "close": bars.close,
+                             "volume": np.where(volume >= 0, volume, bars.volume_last),
+                             "amount": np.where(amount >= 0, amount, bars.amount_last)},
+                            index=pd.Index(self.codes, name="stock_code"))
+
+    def carry_over(self, previous):
+        """观察列表变更后，从旧的聚合器复制仍在列表中的股票的未完成与已完成K线"""
+        new, old = common_rows(self.codes, previous.codes)
+        for period, bars in self.periods.items():
+            if period in previous.periods:
+                bars.carry_over(previous.periods[period], new, old)
@@ -0,0 +1,284 @@
+# benchmark.py
+"""
+观察程序热点路径的基准测试(离线运行，不访问网络)：
+  - 数据来自 ReplayProvider，股票数超过 data/ 中的数量时用随机游走合成日K线
+  - 每个用例在 10 / 100 / 1000 / 5000 只股票下逐 tick 计时，输出每个 tick 耗时的分位数
+  - 另用 tracemalloc 单独跑几个 tick 统计 tick 内的内存分配峰值，避免影响计时；同时记录进程最大常驻内存
+  - 结果可保存为 JSON，并与之前保存的基线比较，列出变慢的用例
+
+用法：
+    python -m MA5Observer.benchmark
+    python -m MA5Observer.benchmark --sizes 10 100 --ticks 50 --only update_current observer_tick
+    python -m MA5Observer.benchmark --output bench.json
+    python -m MA5Observer.benchmark --compare bench.json
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, time as dtime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.Stock import Stock
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.history_data import PRICE_COLUMNS, HistoryArrays, list_csv_codes, load_history
+from MA5Observer.observer import StockObserver
+from MA5Observer.signal_engine import SellSignalEngine, BandSignalEngine
+from MA5Observer.strategy import PriceRangeStrategy
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+
+
+def synthetic_history(n_codes, days=60, end="2024-12-31", seed=0):
+    """随机游走合成 n_codes 只股票、各 days 个交易日的日K线 HistoryArrays"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=days).to_numpy(dtype="datetime64[D]")
+    returns = rng.normal(0, 0.02, (n_codes, days))
+    close = 10 * rng.uniform(0.5, 5, (n_codes, 1)) * np.exp(np.cumsum(returns, axis=1))
+    open_ = close * np.exp(rng.normal(0, 0.01, close.shape))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.03, close.shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.03, close.shape))
+    volume = rng.uniform(1e4, 1e6, close.shape).round()
+    columns = {
+        "trade_date": np.tile(dates, n_codes),
+        "open": open_.ravel(), "close": close.ravel(), "high": high.ravel(), "low": low.ravel(),
+        "volume": volume.ravel(), "amount": (volume * close * 100).ravel(),
+    }
+    prev = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    columns["change"] = (close - prev).ravel()
+    columns["change_pct"] = ((close / prev - 1) * 100).ravel()
+    columns["turnover_ratio"] = rng.uniform(0.1, 10, close.shape).ravel()
+    codes = [f"{900000 + i:06d}" for i in range(n_codes)]
+    offsets = np.arange(n_codes + 1, dtype=np.int64) * days
+    return HistoryArrays(codes, offsets, {name: columns[name] for name in ("trade_date",) + PRICE_COLUMNS})
+
+
+_synthetic_cache = {}
+
+
+def make_provider(n_codes):
+    """
+    n_codes 只股票的回放数据源，虚拟时钟静止在最后一个交易日 9:30，由基准用例逐 tick 推进
+    data/ 中的股票足够时直接使用，否则全部用合成数据(保证不同规模的数据特征一致)
+    """
+    if len(list_csv_codes()) >= n_codes:
+        history = load_history().subset(0, n_codes)
+    else:
+        if n_codes not in _synthetic_cache:
+            _synthetic_cache[n_codes] = synthetic_history(n_codes)
+        history = _synthetic_cache[n_codes]
+    provider = ReplayProvider(history=history, speed=0)
+    provider.clock.set(datetime.combine(provider.clock.now().date(), dtime(9, 30)))
+    return provider
+
+
+class Case:
+    """
+    一个基准用例：setup(provider) 构造被测对象，tick(state) 执行一个 tick 的工作。
+    每个 tick 之前虚拟时钟前进 1 秒，行情快照在计时之外获取(observer_tick 除外)。
+    """
+
+    def __init__(self, name, setup, tick, description):
+        self.name = name
+        self.setup = setup
+        self.tick = tick
+        self.description = description
+
+
+def _holdings(provider):
+    return [Stock(code, provider) for code in provider.history.codes]
+
+
+def _setup_stocks(provider):
+    stocks = _holdings(provider)
+    for stock in stocks:
+        stock.isOpened = True
+    return {"provider": provider, "stocks": stocks}
+
+
+def _tick_update_current(state):
+    snapshot = state["snapshot"]
+    for stock in state["stocks"]:
+        stock.update_current(snapshot.loc[stock.stock_code])
+
+
+def _tick_ma5_setter(state):
+    price = state["snapshot"]["price"]
+    for stock in state["stocks"]:
+        stock.ma5 = float(price[stock.stock_code])
+
+
+def _setup_checked_stocks(provider):
+    state = _setup_stocks(provider)
+    _tick_update_current({**state, "snapshot": provider.get_realtime_snapshot(provider.history.codes)})
+    return state
+
+
+def _tick_check_sell(state):
+    for stock in state["stocks"]:
+        stock.check_sell_conditions()
+
+
+def _setup_strategy(provider):
+    closes = {code: provider.get_history_k_data(code)["close"].tail(4).tolist() for code in provider.history.codes}
+    return {"provider": provider, "strategy": PriceRangeStrategy(tolerance=0.03), "closes": closes}
+
+
+def _tick_strategy(state):
+    """原主循环的逐只计算方式：拼接4个收盘价与实时价算 MA5，再判断是否在区间内"""
+    strategy = state["strategy"]
+    price = state["snapshot"]["price"]
+    for code, closes in state["closes"].items():
+        ma5 = strategy.calc_ma5(closes + [float(price[code])])
+        strategy.is_in_range(float(price[code]), ma5)
+
+
+def _setup_engines(provider):
+    stocks = _holdings(provider)
+    closes = {code: provider.get_history_k_data(code)["close"].tail(4).tolist() for code in provider.history.codes}
+    return {"provider": provider, "sell": SellSignalEngine(stocks), "band": BandSignalEngine(closes, 0.03)}
+
+
+def _tick_engines(state):
+    now = state["provider"].clock.time()
+    state["sell"].evaluate(state["snapshot"], now)
+    state["band"].evaluate(state["snapshot"], now)
+
+
+def _setup_observer(provider):
+    stocks = _holdings(provider)
+    observer = StockObserver(provider, stocks, provider.history.codes, tolerance=0.03)
+    observer.set_market_open(True)
+    return {"provider": provider, "observer": observer}
+
+
+def _tick_observer(state):
+    """调度器每个 tick 的完整工作：获取快照 + 更新持仓 + 计算买卖点"""
+    observer = state["observer"]
+    observer.on_snapshot(state["provider"].get_realtime_snapshot(observer.watch_codes))
+
+
+CASES = [
+    Case("update_current", _setup_stocks, _tick_update_current, "逐只 Stock.update_current"),
+    Case("ma5_setter", _setup_stocks, _tick_ma5_setter, "逐只 Stock.ma5 = 最新价"),
+    Case("check_sell", _setup_checked_stocks, _tick_check_sell, "逐只 Stock.check_sell_conditions"),
+    Case("strategy", _setup_strategy, _tick_strategy, "逐只 PriceRangeStrategy.calc_ma5 + is_in_range"),
+    Case("signal_engines", _setup_engines, _tick_engines, "SellSignalEngine + BandSignalEngine 向量化计算"),
+    Case("observer_tick", _setup_observer, _tick_observer, "StockObserver 完整 tick(含回放快照)"),
+]
+
+
+def _advance(state):
+    provider = state["provider"]
+    provider.clock.advance(1)
+    state["snapshot"] = provider.get_realtime_snapshot(provider.history.codes)
+
+
+def run_case(case, n_codes, ticks=100, warmup=5, memory_ticks=5):
+    """
+    运行一个用例，返回统计结果 dict：各分位数耗时(ms)、建立被测对象的耗时、tick 内存峰值、进程最大常驻内存
+    """
+    provider = make_provider(n_codes)
+    gc.collect()
+    start = time.perf_counter()
+    state = case.setup(provider)
+    setup_seconds = time.perf_counter() - start
+
+    timings = []
+    for i in range(warmup + ticks):
+        _advance(state)
+        start = time.perf_counter()
+        case.tick(state)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed)
+
+    # 单独统计 tick 内存峰值(tracemalloc 会拖慢计时，故不与上面的计时同时进行)
+    tracemalloc.start()
+    peak = 0
+    for _ in range(memory_ticks):
+        _advance(state)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        case.tick(state)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    timings = np.array(timings) * 1000
+    return {
+        "case": case.name,
+        "symbols": n_codes,
+        "ticks": ticks,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p90_ms": float(np.percentile(timings, 90)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "max_ms": float(timings.max()),
+        "per_symbol_us": float(np.median(timings) * 1000 / n_codes),
+        "setup_s": setup_seconds,
+        "tick_peak_kb": peak / 2 ** 10,
+        # Linux 下 ru_maxrss 单位为 KB
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10 if resource else None,
+    }
+
+
+def run_all(sizes=DEFAULT_SIZES, ticks=100, only=None):
+    """运行全部(或 only 指定的)用例，返回结果 DataFrame"""
+    rows = []
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        for n in sizes:
+            # 逐只计算的用例在大规模下每个 tick 很慢，按规模减少 tick 数
+            n_ticks = max(10, ticks * 100 // max(n, 100))
+            result = run_case(case, n, ticks=n_ticks)
+            print(f"{case.name:<16}{n:>6} 只  p50 {result['p50_ms']:9.3f}ms  p99 {result['p99_ms']:9.3f}ms  "
+                  f"峰值 {result['tick_peak_kb']:9.1f}KB")
+            rows.append(result)
+    return pd.DataFrame(rows)
+
+
+def compare(results, baseline, threshold=1.2):
+    """与基线比较 p50，返回 变慢超过 threshold 倍的用例"""
+    merged = results.merge(baseline, on=["case", "symbols"], suffixes=("", "_base"))
+    merged["ratio"] = merged["p50_ms"] / merged["p50_ms_base"]
+    return merged.loc[merged["ratio"] > threshold, ["case", "symbols", "p50_ms_base", "p50_ms", "ratio"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="观察程序热点路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="股票数量")
+    parser.add_argument("--ticks", type=int, default=100, help="100只股票时的计时 tick 数，规模越大越少")
+    parser.add_argument("--only", nargs="+", default=None, help="只运行这些用例：" + ", ".join(c.name for c in CASES))
+    parser.add_argument("--output", default=None, help="结果保存为 JSON")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 基线比较")
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()  # 基准测试中不输出提醒日志
+
+    results = run_all(args.sizes, args.ticks, args.only)
+    print(results.round(3).to_string(index=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results.to_dict(orient="records"), f, ensure_ascii=False, indent=1)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = pd.DataFrame(json.load(f))
+        slower = compare(results, baseline)
+        if slower.empty:
+            print("与基线相比没有明显变慢的用例")
+        else:
+            print("变慢的用例：")
+            print(slower.round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# bulk_sync.py
+"""
+全市场日K线批量同步工具(替代 test.py 中逐只串行下载 + 固定 sleep 的做法)：
+  - 有界线程池并发下载，令牌桶限制整体请求速率
+  - data/_manifest.json 记录每只股票已同步到的最后日期，中断后重新运行只下载缺失的日期区间
+  - 全量数据先写临时文件再原子替换；增量数据只追加新行，写入失败时截断回原长度，进程中途退出不会留下半截 CSV
+  - 只有网络错误才重试；没有数据(停牌、退市)直接视为没有新数据
+  - 前复权数据在除权后会整体变化：增量下载时与本地最后一行收盘价比对，不一致则整只重新下载
+  - 15:00 之前当天的K线尚未收盘，不写入(与 kline_store 一致)，收盘后再次运行时补上
+CSV 格式与 test.py 原有输出一致(efinance 中文表头)，可直接被 history_data / backtest 读取。
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time as dtime
+
+import pandas as pd
+
+from MA5Observer.data_provider.storage import read_json, write_json
+from MA5Observer.history_data import DEFAULT_DATA_DIR
+
+# 全量下载的起始日期
+FULL_HISTORY_BEGIN = "20070101"
+# 收盘时间，此前当天的日K线仍在变化
+MARKET_CLOSE = dtime(15, 0)
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器：平均每秒 rate 个请求，允许最多 capacity 个的突发
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _read_csv_tail(path):
+    """读取 CSV 表头与最后一行，返回 (表头列表, 最后一行字段列表)，文件不存在或没有数据行时返回 (None, None)"""
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").strip().split(",")
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lines = [line for line in f.read().decode("utf-8", errors="ignore").splitlines() if line.strip()]
+    if not lines or lines[-1].split(",") == header:
+        return header, None
+    return header, lines[-1].split(",")
+
+
+class BulkSyncer:
+    """
+    日K线批量同步器
+    """
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, max_workers=8, rate=5.0, max_retries=3):
+        """
+        :param data_dir: CSV 目录
+        :param max_workers: 并发下载线程数
+        :param rate: 每秒最多发起的请求数
+        :param max_retries: 单只股票下载失败时的重试次数(指数退避)
+        """
+        self.data_dir = data_dir
+        self.max_workers = max_workers
+        self.limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.manifest_path = os.path.join(data_dir, "_manifest.json")
+        self.manifest = read_json(self.manifest_path, default={})
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+
+    def _fetch(self, code, beg):
+        """
+        限速 + 重试地下载 beg 之后已收盘的日K线(前复权)；
+        只有网络错误(OSError，含 requests 的异常)才按指数退避重试，其他异常直接抛出；
+        不使用 suppress_error，否则网络失败会被当成没有新数据。返回空结果表示没有新数据
+        """
+        import efinance as ef
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                df = ef.stock.get_quote_history(
+                    stock_codes=code,
+                    beg=beg,
+                    end='20500101',
+                    klt=101,  # 101 -> 日 K
+                    fqt=1,  # 1 -> 前复权
+                )
+                break
+            except OSError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(2 ** attempt)
+        if df is None or df.empty:
+            return pd.DataFrame()
+        now = datetime.now()
+        if now.time() < MARKET_CLOSE:
+            df = df[df["日期"] < now.strftime("%Y-%m-%d")]
+        return df
+
+    def sync_code(self, code):
+        """
+        同步单只股票，返回新增的行数
+        """
+        path = os.path.join(self.data_dir, f"{code}.csv")
+        header, last_row = _read_csv_tail(path)
+        if last_row is None:
+            df = self._fetch(code, FULL_HISTORY_BEGIN)
+            if df.empty:
+                return 0
+            self._replace(path, df)
+            self._mark(code, df["日期"].iloc[-1])
+            return len(df)
+
+        date_col, close_col = header.index("日期"), header.index("收盘")
+        last_date = self.manifest.get(code) or last_row[date_col]
+        if last_row[date_col] != last_date:
+            # manifest 与文件不一致(例如上次写文件后未来得及保存 manifest)，以文件为准
+            last_date = last_row[date_col]
+        if last_date >= datetime.now().strftime("%Y-%m-%d"):
+            return 0
+
+        df = self._fetch(code, last_date.replace("-", ""))
+        if df.empty:
+            return 0
+        overlap = df[df["日期"] == last_date]
+        if not overlap.empty and abs(float(overlap["收盘"].iloc[0]) - float(last_row[close_col])) > 1e-6:
+            # 发生除权调整，前复权历史整体变化，整只重新下载
+            df = self._fetch(code, FULL_HISTORY_BEGIN)
+            if df.empty:
+                return 0
+            self._replace(path, df)
+            self._mark(code, df["日期"].iloc[-1])
+            return len(df)
+
+        new = df[df["日期"] > last_date]
+        if new.empty:
+            self._mark(code, last_date)
+            return 0
+        self._append(path, new[header])
+        self._mark(code, new["日期"].iloc[-1])
+        return len(new)
+
+    def _replace(self, path, df):
+        """原子写入整个 CSV"""
+        tmp = f"{path}.tmp"
+        df.to_csv(tmp, index=False, encoding='utf-8')
+        os.replace(tmp, path)
+
+    def _append(self, path, df):
+        """只把新行追加到文件末尾；写入失败时截断回原长度"""
+        data = df.to_csv(index=False, header=False, lineterminator="\n").encode("utf-8")
+        with open(path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                # 保证原文件以换行结尾
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            try:
+                f.write(data)
+                f.flush()
+            except BaseException:
+                f.truncate(size)
+                raise
+
+    def _mark(self, code, last_date):
+        """记录同步进度，每隔几秒落盘一次 manifest"""
+        with self._lock:
+            self.manifest[code] = last_date
+            if time.monotonic() - self._last_flush > 5:
+                self.flush()
+
+    def flush(self):
+        """保存 manifest"""
+        with self._lock:
+            write_json(self.manifest, self.manifest_path)
+            self._last_flush = time.monotonic()
+
+    def sync(self, codes):
+        """
+        并发同步一组股票，返回 (新增行数合计, {失败代码: 错误信息})
+        """
+        from tqdm import tqdm
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        total, errors = 0, {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.sync_code, code): code for code in codes}
+                for future in tqdm(as_completed(futures), total=len(futures), desc="同步进度"):
+                    code = futures[future]
+                    try:
+                        total += future.result()
+                    except Exception as e:
+                        errors[code] = str(e)
+        finally:
+            self.flush()
+        return total, errors
+
+
+def list_market_codes():
+    """获取沪深两市全部 A 股代码"""
+    import efinance as ef
+
+    df_all_stocks = ef.stock.get_realtime_quotes(['沪A', '深A'])
+    return df_all_stocks['股票代码'].unique().tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全市场日K线增量同步")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="CSV 目录")
+    parser.add_argument("--workers", type=int, default=8, help="并发下载线程数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒最多请求数")
+    parser.add_argument("codes", nargs="*", help="只同步这些代码，默认全市场")
+    args = parser.parse_args()
+
+    codes = args.codes or list_market_codes()
+    print(f"共 {len(codes)} 只股票，开始同步日K数据...")
+    syncer = BulkSyncer(args.data, max_workers=args.workers, rate=args.rate)
+    total, errors = syncer.sync(codes)
+    for code, error in errors.items():
+        print(f"下载 {code} 时出现错误: {error}")
+    print(f"同步完成，新增 {total} 行，失败 {len(errors)} 只。")
+
+
+if __name__ == '__main__':
+    main()
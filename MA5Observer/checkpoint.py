@@ -0,0 +1,159 @@
+# checkpoint.py
+"""
+盘中状态检查点：进程崩溃后重启时恢复当日 tick、卖点冷却时间与区间提醒时间，不重复提醒。
+
+每个交易日、每个分区(单进程观察或某个分片)一个只追加的二进制日志 cache/checkpoints/<交易日>/<分区>.log：
+    文件头  MAGIC
+    记录    <B8sI> 类型 / 股票代码 / 浮点数个数 n，之后为 n 个 float64
+      TICKS        新增的 tick，每条按 TickBuffer.COLUMNS 顺序 6 个值
+      SELL_TIMES   各卖点上次触发时间，顺序同 SELL_SIGNALS
+      BAND_ALERT   区间上次提醒时间(nan 表示已离开区间)
+每次写检查点只追加自上次以来新增的 tick 和有变化的时间戳，一次 write 写入；
+进程在写入中途退出时，读取会忽略末尾不完整的记录。
+"""
+import glob
+import os
+import shutil
+import struct
+from collections import defaultdict
+
+import numpy as np
+
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR
+from MA5Observer.tick_buffer import TickBuffer
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(DEFAULT_CACHE_DIR, "checkpoints")
+
+MAGIC = b"MA5CKPT1"
+_HEADER = struct.Struct("<B8sI")
+TICKS, SELL_TIMES, BAND_ALERT = 1, 2, 3
+
+
+def _record(kind, code, values):
+    values = np.ascontiguousarray(values, dtype="<f8")
+    return _HEADER.pack(kind, code.encode("ascii"), values.size) + values.tobytes()
+
+
+def _parse(data):
+    """解析日志内容，返回 (记录列表, 最后一条完整记录的结束位置)"""
+    if not data.startswith(MAGIC):
+        return [], 0
+    records = []
+    offset = len(MAGIC)
+    while offset + _HEADER.size <= len(data):
+        kind, code, n = _HEADER.unpack_from(data, offset)
+        end = offset + _HEADER.size + 8 * n
+        if end > len(data):
+            break
+        records.append((kind, code.rstrip(b"\0").decode("ascii"),
+                        np.frombuffer(data, dtype="<f8", count=n, offset=offset + _HEADER.size)))
+        offset = end
+    return records, offset
+
+
+def read_log(path):
+    """逐条读取日志，返回 [(类型, 股票代码, float64 数组)]，末尾不完整的记录被忽略"""
+    with open(path, "rb") as f:
+        return _parse(f.read())[0]
+
+
+class SessionCheckpoint:
+    """
+    一个分区的当日检查点。load() 合并当日所有分区的日志(分片数变化后也能恢复)，write() 追加增量
+    """
+
+    def __init__(self, trade_date, part="observer", directory=DEFAULT_CHECKPOINT_DIR):
+        self.trade_date = trade_date
+        self.directory = os.path.join(directory, trade_date)
+        self.path = os.path.join(self.directory, f"{part}.log")
+        self._file = None
+        self._tick_counts = {}  # 股票代码 -> 已写入的 tick 条数
+        self._sell_times = {}  # 股票代码 -> 已写入的卖点时间
+        self._band_alert = {}  # 股票代码 -> 已写入的区间提醒时间
+        # 之前交易日的检查点已没有用处
+        for old in glob.glob(os.path.join(directory, "*")):
+            if os.path.basename(old) != trade_date:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def load(self):
+        """
+        读取当日全部分区，返回 (ticks, sell_times, band_alert)：
+        {代码: {列名: 数组}} / {代码: 数组} / {代码: 时间戳}，同一代码的时间戳以较新的记录为准
+        """
+        ticks = defaultdict(list)
+        sell_times = {}
+        band_alert = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.log")), key=os.path.getmtime):
+            for kind, code, values in read_log(path):
+                if kind == TICKS:
+                    ticks[code].append(values.reshape(-1, len(TickBuffer.COLUMNS)))
+                elif kind == SELL_TIMES:
+                    sell_times[code] = values
+                elif kind == BAND_ALERT:
+                    band_alert[code] = float(values[0])
+        merged = {}
+        for code, chunks in ticks.items():
+            rows = np.concatenate(chunks)
+            rows = rows[np.argsort(rows[:, 0], kind="stable")]
+            merged[code] = {name: rows[:, i] for i, name in enumerate(TickBuffer.COLUMNS)}
+        return merged, sell_times, band_alert
+
+    def mark_written(self, ticks, sell_times, band_alert):
+        """恢复后调用：已在日志中的数据不再重复写入"""
+        self._tick_counts = {code: len(columns["price"]) for code, columns in ticks.items()}
+        self._sell_times = {code: tuple(values) for code, values in sell_times.items()}
+        self._band_alert = dict(band_alert)
+
+    def write(self, stocks, band_codes, band_alert):
+        """
+        追加增量：stocks 中新增的 tick 与变化的卖点时间，band_codes/band_alert 中变化的区间提醒时间
+        :return: 写入的字节数
+        """
+        chunks = []
+        for stock in stocks:
+            code = stock.stock_code
+            written = self._tick_counts.get(code, 0)
+            if len(stock.ticks) < written:
+                written = 0  # 被移除后又重新加入的持仓，从头写入
+            if len(stock.ticks) > written:
+                columns = stock.ticks.columns()
+                rows = np.column_stack([columns[name][written:] for name in TickBuffer.COLUMNS])
+                chunks.append(_record(TICKS, code, rows))
+                self._tick_counts[code] = len(stock.ticks)
+            times = tuple(stock.signal_times.tolist())
+            if self._sell_times.get(code) != times:
+                chunks.append(_record(SELL_TIMES, code, times))
+                self._sell_times[code] = times
+        for code, value in zip(band_codes, band_alert.tolist()):
+            previous = self._band_alert.get(code, np.nan)
+            if value != previous and not (np.isnan(value) and np.isnan(previous)):
+                chunks.append(_record(BAND_ALERT, code, [value]))
+                self._band_alert[code] = value
+        if not chunks:
+            return 0
+        if self._file is None:
+            self._open()
+        data = b"".join(chunks)
+        self._file.write(data)
+        self._file.flush()
+        return len(data)
+
+    def _open(self):
+        """打开日志准备追加；上次写入中途退出留下的不完整记录先截掉"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            return
+        with open(self.path, "rb") as f:
+            _, end = _parse(f.read())
+        if end < self._file.tell():
+            self._file.truncate(end)
+            self._file.seek(end)
+            if end == 0:
+                self._file.write(MAGIC)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,68 @@
+# clock.py
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """
+    系统时钟。数据提供者、Stock、调度器都通过 data_provider.clock 取当前时间，
+    回放时替换为 VirtualClock 即可让整个观察流程运行在虚拟时间上。
+    """
+
+    speed = 1.0
+
+    def now(self):
+        """当前时间 datetime"""
+        return datetime.now()
+
+    def time(self):
+        """当前时间戳(秒)"""
+        return time.time()
+
+    def to_real(self, seconds):
+        """虚拟时间的时长换算为实际需要等待的秒数"""
+        return seconds
+
+
+class VirtualClock(SystemClock):
+    """
+    虚拟时钟：从 start 开始，按 speed 倍速随实际时间流逝；speed=0 时时间静止，只随 advance() 前进
+    (逐 tick 确定性回放、压测时使用)。
+    """
+
+    def __init__(self, start, speed=1.0):
+        """
+        :param start: 起始时间 datetime
+        :param speed: 相对实际时间的倍速
+        """
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._offset = 0.0  # advance() 累计前进的秒数
+
+    def elapsed(self):
+        """从 start 起经过的虚拟秒数"""
+        return (time.monotonic() - self._origin) * self.speed + self._offset
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed())
+
+    def time(self):
+        return self.start.timestamp() + self.elapsed()
+
+    def advance(self, seconds):
+        """虚拟时间直接前进 seconds 秒"""
+        self._offset += seconds
+
+    def set(self, moment):
+        """把虚拟时间设为 moment(datetime)"""
+        self._offset += (moment - self.now()).total_seconds()
+
+    def to_real(self, seconds):
+        if self.speed <= 0:
+            return 0.0
+        return seconds / self.speed
+
+
+# 默认使用的系统时钟
+system_clock = SystemClock()
@@ -0,0 +1,32 @@
+# data_provider 包
+"""
+数据源注册表：按名称延迟加载数据源。
+adata / akshare 导入都很慢(akshare 尤其如此)，这里只记录模块路径，实际使用某个数据源时才导入对应模块和第三方库；
+判断第三方库是否安装只查找模块(importlib.util.find_spec)，不导入。
+"""
+import importlib
+import importlib.util
+
+# 数据源名称 -> (模块, 类名, 依赖的第三方库)
+PROVIDERS = {
+    "adata": ("MA5Observer.data_provider.data_provider", "AdataProvider", "adata"),
+    "akshare": ("MA5Observer.data_provider.akshare_provider", "AkshareProvider", "akshare"),
+    "replay": ("MA5Observer.data_provider.replay_provider", "ReplayProvider", None),
+}
+
+
+def is_available(name):
+    """数据源依赖的第三方库是否已安装(不导入)"""
+    dependency = PROVIDERS[name][2]
+    return dependency is None or importlib.util.find_spec(dependency) is not None
+
+
+def get_provider_class(name):
+    """导入并返回数据源类"""
+    module, cls, _ = PROVIDERS[name]
+    return getattr(importlib.import_module(module), cls)
+
+
+def create_provider(name, **kwargs):
+    """按名称创建数据源实例"""
+    return get_provider_class(name)(**kwargs)
@@ -1,16 +1,138 @@
 # akshare_provider.py
 import akshare as ak
+import os
+import threading
+import time
+
 import pandas as pd
 from datetime import datetime, timedelta
 
-class AkshareProvider:
+from MA5Observer.data_provider.base import DataProvider
+from MA5Observer.data_provider.reference_cache import ReferenceDataCache
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR
+from MA5Observer.metrics import metrics
+
+
+def _fetch_trade_calendar(year):
+    """新浪历史交易日 -> 与 adata 交易日历相同格式(trade_date, trade_status)的指定年份日历"""
+    with metrics.span("upstream_call_seconds", api="akshare.tool_trade_date_hist_sina"):
+        df = ak.tool_trade_date_hist_sina()
+    dates = pd.to_datetime(df["trade_date"]).dt.strftime("%Y-%m-%d")
+    dates = dates[dates.str.startswith(str(year))]
+    return pd.DataFrame({"trade_date": dates.values, "trade_status": 1})
+
+
+def _fetch_all_code():
+    """沪深京 A 股代码表 -> stock_code, short_name"""
+    with metrics.span("upstream_call_seconds", api="akshare.stock_info_a_code_name"):
+        df = ak.stock_info_a_code_name()
+    return df.rename(columns={"code": "stock_code", "name": "short_name"})[["stock_code", "short_name"]]
+
+
+# 进程内共享的 akshare 交易日历/代码表缓存，与 adata 的缓存分开存放，任一数据源故障时另一个仍可用
+shared_reference_cache = ReferenceDataCache(calendar_fetcher=_fetch_trade_calendar, code_fetcher=_fetch_all_code,
+                                            cache_dir=os.path.join(DEFAULT_CACHE_DIR, "akshare"))
+
+# stock_zh_a_spot_em 表头 -> 实时行情统一列名
+SPOT_COLUMNS = {
+    "代码": "stock_code",
+    "名称": "short_name",
+    "最新价": "price",
+    "涨跌额": "change",
+    "涨跌幅": "change_pct",
+    "成交量": "volume",
+    "成交额": "amount",
+}
+
+
+def _fetch_spot():
+    """下载全市场实时行情，返回统一列名的 DataFrame(成交量单位由手换算为股)"""
+    with metrics.span("upstream_call_seconds", api="akshare.stock_zh_a_spot_em"):
+        df = ak.stock_zh_a_spot_em()
+    df = df.rename(columns=SPOT_COLUMNS)[list(SPOT_COLUMNS.values())]
+    for col in ["price", "change", "change_pct", "volume", "amount"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["volume"] = df["volume"] * 100
+    return df.reset_index(drop=True)
+
+
+class SpotSnapshotCache:
+    """
+    全市场实时行情快照缓存(stock_zh_a_spot_em 一次返回5000多行，只能整体下载)：
+      - 距上次下载不超过 max_age 秒时直接使用缓存，同一个 tick 内的所有查询只下载一次
+      - 多个线程同时发现缓存过期时只有一个线程下载，其余线程等待后直接使用其结果
+      - 下载后建立 股票代码 -> 行号 的字典索引，按代码查询为 O(1)，不再逐行比较
+      - 每次下载的结果(索引、价格、简称、快照)作为一个不可变元组整体替换，
+        查询只取一次引用，刷新中途读到的索引与数据一定来自同一次下载(各次下载的行顺序不同)
+    """
+
+    def __init__(self, fetcher, max_age=1.0):
+        """
+        :param fetcher: fetcher() -> 全市场行情 DataFrame(统一列名)
+        :param max_age: 快照有效期(秒)
+        """
+        self.fetcher = fetcher
+        self.max_age = max_age
+        self._data = None  # (stock_code -> 行号, 价格数组, 简称数组, 快照 DataFrame)
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _ensure_fresh(self):
+        """返回未过期的 (索引, 价格, 简称, 快照)，过期时先重新下载"""
+        if time.monotonic() - self._loaded_at <= self.max_age:
+            return self._data
+        with self._lock:
+            # 等锁期间其他线程可能已经下载完成
+            if time.monotonic() - self._loaded_at <= self.max_age:
+                return self._data
+            df = self.fetcher()
+            self._data = ({code: i for i, code in enumerate(df["stock_code"])},
+                          df["price"].to_numpy(), df["short_name"].to_numpy(), df)
+            self._loaded_at = time.monotonic()
+            return self._data
+
+    def frame(self):
+        """全市场快照"""
+        return self._ensure_fresh()[3]
+
+    def rows(self, codes):
+        """按 codes 顺序返回这些股票的行情(不在快照中的代码跳过)"""
+        index, _, _, frame = self._ensure_fresh()
+        positions = [index[code] for code in codes if code in index]
+        return frame.iloc[positions].reset_index(drop=True)
+
+    def lookup(self, stock_code):
+        """单只股票的 (最新价, 股票简称)，不在快照中时返回 None"""
+        index, prices, names, _ = self._ensure_fresh()
+        i = index.get(stock_code)
+        if i is None:
+            return None
+        return float(prices[i]), names[i]
+
+    def invalidate(self):
+        """丢弃缓存，下次查询重新下载"""
+        self._loaded_at = float("-inf")
+
+
+# 进程内共享的全市场快照缓存，所有 AkshareProvider 实例共用
+shared_spot_cache = SpotSnapshotCache(_fetch_spot)
+
+
+class AkshareProvider(DataProvider):
     """
     利用 akshare 获取股票行情、历史K线等信息的提供者。
-    与原 AdataProvider 类似，对外提供相同的函数接口，用于与主程序衔接。
+    与 AdataProvider 实现同一个 DataProvider 接口，可单独使用，也可与其组合(CompositeProvider)做故障切换。
     """
 
-    def __init__(self):
-        pass
+    name = "akshare"
+
+    def __init__(self, reference_cache=None, spot_cache=None):
+        """
+        :param reference_cache: 交易日历/代码表缓存，默认使用进程内共享的 akshare 缓存
+        :param spot_cache: 全市场实时行情缓存，默认使用进程内共享的 shared_spot_cache(有效期1秒)
+        """
+        self.reference_cache = reference_cache or shared_reference_cache
+        self.spot_cache = spot_cache or shared_spot_cache
 
     def _convert_to_akshare_symbol(self, stock_code):
         """
@@ -49,16 +171,16 @@ class AkshareProvider:
         else:
             end_date = end_date.replace("-", "")
 
-        ak_symbol = self._convert_to_akshare_symbol(stock_code)
-
-        # 使用 ak.stock_zh_a_hist 接口获取不复权数据：period='daily', adjust=''
-        df = ak.stock_zh_a_hist(
-            symbol=ak_symbol,
-            period="daily",
-            start_date=start_date,
-            end_date=end_date,
-            adjust=""
-        )
+        # 使用 ak.stock_zh_a_hist 接口获取前复权数据(与 AdataProvider 一致)：period='daily', adjust='qfq'
+        # 该接口的 symbol 为不带交易所前缀的6位代码
+        with metrics.span("upstream_call_seconds", api="akshare.stock_zh_a_hist"):
+            df = ak.stock_zh_a_hist(
+                symbol=stock_code,
+                period="daily",
+                start_date=start_date,
+                end_date=end_date,
+                adjust="qfq"
+            )
 
         if df.empty:
             return pd.DataFrame()
@@ -85,9 +207,9 @@ class AkshareProvider:
         # 增加 stock_code 字段，方便后续使用
         df["stock_code"] = stock_code
 
-        # 转换日期格式为 YYYY-MM-DD
-        # 有时候 akshare 返回的日期就是字符串 YYYY-MM-DD，可根据实际情况决定是否需要转换
-        # df["trade_date"] = pd.to_datetime(df["trade_date"], format="%Y-%m-%d").dt.date
+        # 日期统一为 'YYYY-MM-DD' 字符串(stock_zh_a_hist 返回 datetime.date)，与 AdataProvider 一致，
+        # 调用方按字符串比较交易日
+        df["trade_date"] = pd.to_datetime(df["trade_date"]).dt.strftime("%Y-%m-%d")
 
         # 统一字段顺序(可自定义)
         cols = [
@@ -98,29 +220,21 @@ class AkshareProvider:
 
         return df
 
+    def get_realtime(self, stock_code):
+        """
+        获取股票或列表的实时行情，字段与 AdataProvider.get_realtime 一致：
+        stock_code short_name price change change_pct volume amount
+        stock_zh_a_spot_em 只能拉取全市场行情，这里从全市场快照缓存中按代码索引取出需要的股票。
+        """
+        codes = [stock_code] if isinstance(stock_code, str) else list(stock_code)
+        return self.spot_cache.rows(codes)
+
     def get_realtime_price(self, stock_code):
         """
-        获取单只股票的最新价格。
-        akshare 实时数据可以通过 stock_zh_a_spot_em() 拿到全市场行情，然后筛选出对应股票。
-        也可以改用其他更快速的接口——示例仅演示最简做法。
+        获取单只股票的 (最新价, 股票简称)，从全市场快照缓存中 O(1) 查找，查不到时返回 None
         """
-        # 全市场行情
-        df_spot = ak.stock_zh_a_spot_em()
-        # stock_zh_a_spot_em 返回字段一般包括：
-        #   ["代码","名称","最新价","涨跌幅","涨跌额","成交量","成交额","振幅","最高","最低","今开","昨收","量比","换手率","市盈率-动态","市净率","总市值","流通市值","涨速","5分钟涨跌","60日涨跌幅","年初至今涨跌幅"]
-        # 我们需要在 代码==stock_code 的那一行找到 "最新价"
-        # 但要注意 df_spot 里的 "代码" 可能是纯数字(带不带市场?)，此处需要匹配。
-        # 如果 df_spot 的 "代码" 列是 6 位数字，我们就做如下匹配：
-        row = df_spot[df_spot["代码"] == stock_code]
-        # 如果代码不匹配，则可能要做更多解析，比如 '000001.SZ' 之类；可根据实际需要调整
-
-        if row.empty:
-            # 未找到说明不在列表或者代码有差异
-            return None
+        return self.spot_cache.lookup(stock_code)
 
-        # 取“最新价”
-        current_price = float(row["最新价"].values[0])
-        return current_price
 
 if __name__ == '__main__':
     # 测试数据提供者
@@ -130,4 +244,5 @@ if __name__ == '__main__':
     print(df.head())
     # 获取实时价格
     price = provider.get_realtime_price("000001")
-    print(price)
\ No newline at end of file
+    print(price)
+    print(provider.get_realtime_snapshot(["000001", "600000"]))
\ No newline at end of file
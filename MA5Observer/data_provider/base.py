@@ -0,0 +1,161 @@
+# base.py
+from abc import ABC, abstractmethod
+from datetime import datetime, time as dtime
+
+import pandas as pd
+
+from MA5Observer.clock import system_clock
+
+# 实时行情快照的列(索引为 stock_code)
+SNAPSHOT_COLUMNS = ['short_name', 'price', 'change', 'change_pct', 'volume', 'amount']
+# 快照中需要转为浮点数的列
+SNAPSHOT_NUMERIC_COLUMNS = ['price', 'change', 'change_pct', 'volume', 'amount']
+
+
+def empty_snapshot():
+    """空的实时行情快照"""
+    return pd.DataFrame(columns=SNAPSHOT_COLUMNS, index=pd.Index([], name='stock_code'))
+
+
+def normalize_snapshot(frames):
+    """
+    把一批或多批 get_realtime 的结果合并为快照：以 stock_code 为索引、数值列为浮点数、重复代码保留最后一条
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return empty_snapshot()
+    snapshot = pd.concat(frames, ignore_index=True)
+    for col in SNAPSHOT_NUMERIC_COLUMNS:
+        if col in snapshot.columns:
+            snapshot[col] = pd.to_numeric(snapshot[col], errors='coerce')
+    return snapshot.drop_duplicates('stock_code', keep='last').set_index('stock_code')
+
+
+class DataProvider(ABC):
+    """
+    数据提供者接口，主程序(Stock / StockObserver / ObserverScheduler)只依赖这里列出的方法。
+    子类需实现历史K线与实时行情；交易日历、交易时段相关的方法基于 self.reference_cache(ReferenceDataCache)统一实现。
+    当前时间一律取自 self.clock，回放数据源可替换为虚拟时钟。
+    """
+
+    # 交易时段：上午(含 9:15 开始的盘前竞价)与下午
+    TRADING_SESSIONS = ((dtime(9, 15), dtime(11, 30)), (dtime(13, 0), dtime(15, 0)))
+
+    # 数据源名称，用于日志与统计
+    name = "base"
+
+    reference_cache = None
+
+    clock = system_clock
+
+    @abstractmethod
+    def get_history_k_data(self, stock_code, start_date=None, end_date=None):
+        """
+        单只股票的日K线 DataFrame，字段至少包含 trade_date、open、close、high、low
+        """
+
+    @abstractmethod
+    def get_realtime(self, stock_code):
+        """
+        一只或一组股票的实时行情 DataFrame，字段：stock_code short_name price change change_pct volume amount
+        """
+
+    def get_realtime_snapshot(self, stock_codes):
+        """
+        一组股票的实时行情快照，以 stock_code 为索引，价格、成交量等字段为浮点数
+        """
+        codes = list(dict.fromkeys(stock_codes))
+        if not codes:
+            return empty_snapshot()
+        return normalize_snapshot(self.get_realtime(codes))
+
+    def get_realtime_price(self, stock_code):
+        """
+        单只股票的 (最新价, 股票简称)，查不到时返回 None
+        """
+        snapshot = self.get_realtime_snapshot([stock_code])
+        if stock_code not in snapshot.index:
+            return None
+        row = snapshot.loc[stock_code]
+        return float(row['price']), row['short_name']
+
+    def get_trade_calendar(self, year=None):
+        """
+        获取指定年份的交易日历(默认当年)，走参考数据缓存
+        """
+        if year is None:
+            year = self.clock.now().year
+        return self.reference_cache.get_trade_calendar(year)
+
+    def get_yesterday_trade_date(self):
+        """
+        收盘后，今日即为昨日
+        获取上一个的交易日期
+        """
+        now = self.clock.now()
+        today = now.strftime('%Y-%m-%d')
+        # 判断当天是否是交易日，时间为15:00之后
+        if self.reference_cache.is_trade_day(today) and now.hour >= 15:
+            return today
+        # 如果不是交易日，或者是交易日但时间小于15:00，取今天之前最近的一个交易日
+        else:
+            return self.reference_cache.previous_trade_date(today)
+
+    def get_recent_trade_dates(self, n, before=None):
+        """
+        获取 before(默认今天，不含当天)之前最近的 n 个交易日，升序
+        """
+        if before is None:
+            before = self.clock.now().strftime("%Y-%m-%d")
+        return self.reference_cache.trade_dates_before(before, n)
+
+    def get_stock_name(self, stock_code):
+        """
+        按股票代码查询股票简称
+        """
+        return self.reference_cache.get_stock_name(stock_code)
+
+    def get_all_code_info(self):
+        """
+        获取所有股票代码信息(stock_code short_name ...)，走参考数据缓存
+        """
+        return self.reference_cache.get_all_code_info()
+
+    def is_market_open(self, now=None):
+        """
+        判断是否在交易时段内(包括盘前竞价)
+        """
+        now = now or self.clock.now()
+        # 如果当前日期不是交易日，返回 False
+        if not self.reference_cache.is_trade_day(now.strftime("%Y-%m-%d")):
+            return False
+        return self.current_session_end(now) is not None
+
+    def current_session_end(self, now=None):
+        """
+        当前所处交易时段的结束时间；不在交易时段内时返回 None(不判断是否为交易日)
+        """
+        now = now or self.clock.now()
+        current_time = now.time()
+        for start, end in self.TRADING_SESSIONS:
+            if start <= current_time <= end:
+                return datetime.combine(now.date(), end)
+        return None
+
+    def next_market_open(self, now=None):
+        """
+        now 之后最近一个交易时段的开始时间(按交易日历跳过周末和节假日)；
+        交易日历中没有之后的交易日(下一年日历尚未发布、回放数据已到末尾)时返回 None，不按自然日推算
+        """
+        now = now or self.clock.now()
+        today = now.strftime("%Y-%m-%d")
+        if self.reference_cache.is_trade_day(today):
+            for start, _ in self.TRADING_SESSIONS:
+                if now.time() < start:
+                    return datetime.combine(now.date(), start)
+        next_date = self.reference_cache.next_trade_date(today)
+        if next_date is None:
+            return None
+        return datetime.combine(datetime.strptime(next_date, "%Y-%m-%d").date(), self.TRADING_SESSIONS[0][0])
@@ -0,0 +1,248 @@
+# composite_provider.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+from loguru import logger
+
+from MA5Observer.data_provider.base import DataProvider, empty_snapshot
+from MA5Observer.metrics import metrics
+
+
+class SourceStats:
+    """
+    单个数据源的健康统计：耗时与错误率的指数滑动平均、连续失败次数、熔断截止时间、在途请求数
+    """
+
+    __slots__ = ("name", "latency", "error_rate", "requests", "errors", "consecutive_errors",
+                 "down_until", "inflight", "measured_at")
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = None  # 成功请求耗时的 EWMA(秒)
+        self.error_rate = 0.0  # 失败率的 EWMA
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.down_until = 0.0
+        self.inflight = 0
+        self.measured_at = 0.0  # 最近一次记录耗时的时间
+
+    def is_healthy(self, now):
+        return now >= self.down_until
+
+
+class CompositeProvider(DataProvider):
+    """
+    组合多个数据源(如 adata + akshare)的数据提供者：
+      - 实时行情快照：按健康度与延迟排序，先向最快的数据源发请求，
+        超过对冲等待时间仍未返回时再向下一个数据源发同样的请求，取最先返回的覆盖全部代码的结果，
+        只返回了部分代码时缺少的代码向下一个数据源补取；
+        hedge_delay=0 时同时向全部数据源发请求(竞速)
+      - 历史K线等其余请求：按同样的顺序依次尝试，失败时自动切换到下一个数据源
+      - 每个数据源记录耗时与错误率，连续失败 max_failures 次后熔断 cooldown 秒，期间只在其余数据源都不可用时才使用
+    交易日历、交易时段判断使用第一个数据源的参考数据缓存。
+    """
+
+    name = "composite"
+
+    def __init__(self, providers, hedge_delay=None, min_hedge_delay=0.05, timeout=5.0,
+                 max_failures=3, cooldown=30.0, max_inflight_per_source=2, alpha=0.2, probe_interval=60.0):
+        """
+        :param providers: DataProvider 列表，顺序即初始优先级
+        :param hedge_delay: 对冲等待时间(秒)；None 表示按最快数据源的平均耗时自动计算(2倍)，0 表示竞速
+        :param min_hedge_delay: 自动计算时的最小对冲等待时间
+        :param timeout: 一次快照请求的总超时
+        :param max_failures: 连续失败多少次后熔断
+        :param cooldown: 熔断时长(秒)
+        :param max_inflight_per_source: 单个数据源同时在途的请求上限，慢数据源的请求堆积时不再向其发新请求
+        :param alpha: EWMA 平滑系数
+        :param probe_interval: 数据源超过这么久没有耗时样本时排到最前重新测量(仍有对冲兜底)，避免一次慢请求后再也不被使用
+        """
+        if not providers:
+            raise ValueError("至少需要一个数据源")
+        self.providers = list(providers)
+        self.reference_cache = self.providers[0].reference_cache
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.max_inflight_per_source = max_inflight_per_source
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self.stats = [SourceStats(getattr(p, "name", type(p).__name__)) for p in self.providers]
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.providers) * max_inflight_per_source,
+                                            thread_name_prefix="composite")
+
+    def _ranked(self):
+        """数据源下标按 (是否熔断, 平均耗时, 初始顺序) 排序，耗时样本过旧的数据源视为耗时未知排在前面"""
+        now = time.monotonic()
+
+        def key(i):
+            s = self.stats[i]
+            stale = s.latency is None or now - s.measured_at > self.probe_interval
+            return (not s.is_healthy(now), 0.0 if stale else s.latency, i)
+
+        return sorted(range(len(self.providers)), key=key)
+
+    def _record(self, i, elapsed, ok):
+        """记录一次请求结果，更新 EWMA 与熔断状态；elapsed 为 None 时不计入耗时"""
+        s = self.stats[i]
+        with self._lock:
+            s.requests += 1
+            s.error_rate += self.alpha * ((0.0 if ok else 1.0) - s.error_rate)
+            if ok and elapsed is not None:
+                s.latency = elapsed if s.latency is None else s.latency + self.alpha * (elapsed - s.latency)
+                s.measured_at = time.monotonic()
+            if ok:
+                if s.consecutive_errors >= self.max_failures:
+                    logger.info(f"数据源 {s.name} 已恢复")
+                s.consecutive_errors = 0
+                s.down_until = 0.0
+            else:
+                s.errors += 1
+                s.consecutive_errors += 1
+                if s.consecutive_errors >= self.max_failures:
+                    s.down_until = time.monotonic() + self.cooldown
+                    if s.consecutive_errors == self.max_failures:
+                        logger.warning(f"数据源 {s.name} 连续失败 {s.consecutive_errors} 次，熔断 {self.cooldown:.0f} 秒")
+
+    def _timed_call(self, i, method, *args):
+        """
+        在数据源 i 上调用 method 并记录结果；抛出异常或返回空结果都记为失败。
+        只有实时行情快照的耗时参与排序，历史K线等请求的耗时不计入
+        """
+        start = time.perf_counter()
+        timed = method == "get_realtime_snapshot"
+        try:
+            with metrics.span("provider_call_seconds", source=self.stats[i].name, method=method):
+                result = getattr(self.providers[i], method)(*args)
+        except Exception:
+            self._record(i, None, False)
+            raise
+        finally:
+            with self._lock:
+                self.stats[i].inflight -= 1
+        ok = result is not None and not (isinstance(result, pd.DataFrame) and result.empty)
+        self._record(i, time.perf_counter() - start if timed else None, ok)
+        return result
+
+    def _submit(self, i, method, *args):
+        with self._lock:
+            self.stats[i].inflight += 1
+        return self._executor.submit(self._timed_call, i, method, *args)
+
+    def _current_hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        latencies = [s.latency for s in self.stats if s.latency is not None]
+        return max(2 * min(latencies), self.min_hedge_delay) if latencies else self.min_hedge_delay
+
+    def get_realtime_snapshot(self, stock_codes):
+        """
+        对冲请求实时行情快照，返回最先到达的覆盖全部代码的结果。
+        数据源只返回了部分代码(如 adata 某一批请求失败)时，缺少的代码立即向下一个数据源补取并合并；
+        全部数据源都试过或超时后返回已合并的部分结果，一个都没有时返回空快照
+        """
+        codes = list(dict.fromkeys(stock_codes))
+        if not codes:
+            return empty_snapshot()
+        # 在途请求已达上限的数据源本次跳过(除非全部都达上限)
+        order = [i for i in self._ranked() if self.stats[i].inflight < self.max_inflight_per_source] or self._ranked()
+        deadline = time.monotonic() + self.timeout
+        pending = {}
+        launched = 0
+        merged = None
+        missing = codes
+
+        def launch():
+            nonlocal launched
+            i = order[launched]
+            launched += 1
+            pending[self._submit(i, "get_realtime_snapshot", missing)] = i
+
+        launch()
+        if self.hedge_delay == 0:
+            while launched < len(order):
+                launch()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            delay = self._current_hedge_delay() if launched < len(order) else remaining
+            done, _ = wait(pending, timeout=min(delay, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"数据源 {self.stats[i].name} 获取实时行情失败: {e}")
+                    continue
+                if result is None or result.empty:
+                    continue
+                merged = result if merged is None else pd.concat([merged, result[~result.index.isin(merged.index)]])
+                missing = [code for code in codes if code not in merged.index]
+                if not missing:
+                    return merged
+                metrics.inc("snapshot_partial_total", source=self.stats[i].name)
+            # 超过对冲等待时间仍无完整结果，或已有请求失败/只返回部分代码：向下一个数据源发请求
+            if launched < len(order):
+                launch()
+        if merged is not None:
+            logger.warning(f"实时行情缺少 {len(missing)} 只({missing[0]}...)，返回其余 {len(merged)} 只")
+            return merged
+        logger.warning(f"全部数据源获取实时行情失败或超时({len(codes)}只)")
+        return empty_snapshot()
+
+    def _failover(self, method, *args):
+        """按排序依次在各数据源上调用 method，返回第一个非空结果；全部失败时抛出最后一个异常"""
+        error = None
+        for i in self._ranked():
+            with self._lock:
+                self.stats[i].inflight += 1
+            try:
+                result = self._timed_call(i, method, *args)
+            except Exception as e:
+                logger.warning(f"数据源 {self.stats[i].name} 调用 {method} 失败: {e}")
+                error = e
+                continue
+            if result is not None and not (isinstance(result, pd.DataFrame) and result.empty):
+                return result
+        if error is not None:
+            raise error
+        return result
+
+    def get_history_k_data(self, stock_code, start_date=None, end_date=None):
+        return self._failover("get_history_k_data", stock_code, start_date, end_date)
+
+    def get_realtime(self, stock_code):
+        codes = [stock_code] if isinstance(stock_code, str) else stock_code
+        return self.get_realtime_snapshot(codes).reset_index()
+
+    def source_stats(self):
+        """各数据源的统计信息 DataFrame"""
+        now = time.monotonic()
+        with self._lock:
+            rows = [{
+                "source": s.name,
+                "latency_ms": s.latency * 1000 if s.latency is not None else None,
+                "error_rate": s.error_rate,
+                "requests": s.requests,
+                "errors": s.errors,
+                "healthy": s.is_healthy(now),
+                "inflight": s.inflight,
+            } for s in self.stats]
+        return pd.DataFrame(rows).set_index("source")
+
+
+if __name__ == '__main__':
+    from MA5Observer.data_provider.akshare_provider import AkshareProvider
+    from MA5Observer.data_provider.data_provider import AdataProvider
+
+    provider = CompositeProvider([AdataProvider(), AkshareProvider()])
+    for _ in range(5):
+        print(provider.get_realtime_snapshot(["000001", "600000"]))
+    print(provider.source_stats())
@@ -1,18 +1,59 @@
 # data_provider.py
+from concurrent.futures import ThreadPoolExecutor
+
 import adata
-import pandas as pd
-from datetime import datetime, timedelta, time as dtime
+from datetime import datetime, timedelta
+from loguru import logger
+
+from MA5Observer.data_provider.base import DataProvider, empty_snapshot, normalize_snapshot
+from MA5Observer.data_provider.kline_store import KLineStore
+from MA5Observer.data_provider.reference_cache import ReferenceDataCache
+from MA5Observer.metrics import metrics
+
+
+def _fetch_trade_calendar(year):
+    with metrics.span("upstream_call_seconds", api="adata.trade_calendar"):
+        return adata.stock.info.trade_calendar(year=year)
+
+
+def _fetch_all_code():
+    with metrics.span("upstream_call_seconds", api="adata.all_code"):
+        return adata.stock.info.all_code()
 
-class AdataProvider:
+
+# 进程内共享的交易日历/股票代码表缓存，所有 AdataProvider 实例共用
+shared_reference_cache = ReferenceDataCache(
+    calendar_fetcher=_fetch_trade_calendar,
+    code_fetcher=_fetch_all_code,
+)
+
+class AdataProvider(DataProvider):
     """
     利用 adata 库获取股票行情、历史K线等信息的提供者。
-    可以在此处扩展或更换数据源，只需保证对外提供的函数签名/返回格式一致。
+    可以在此处扩展或更换数据源，只需实现 DataProvider 接口。
     """
 
-    def __init__(self):
-        self.all_info = self.get_all_code_info()
+    name = "adata"
+
+    # list_market_current 单次请求的股票数量上限，超出时分批并发请求
+    realtime_batch_size = 100
+    # 分批请求实时行情时的并发线程数
+    realtime_max_workers = 8
 
-        pass
+    def __init__(self, use_local_store=True, cache_dir=None, reference_cache=None):
+        """
+        :param use_local_store: 历史K线是否走本地K线库(只增量下载缺失区间)
+        :param cache_dir: 本地缓存根目录，默认 MA5Observer/cache
+        :param reference_cache: 交易日历/代码表缓存，默认使用进程内共享的 shared_reference_cache
+        """
+        self.reference_cache = reference_cache or shared_reference_cache
+        self.all_info = self.get_all_code_info()
+        self._realtime_executor = None
+        self.kline_store = None
+        if use_local_store:
+            self.kline_store = KLineStore(self.download_history_k_data,
+                                          latest_trade_date=self.get_yesterday_trade_date,
+                                          cache_dir=cache_dir)
 
     def get_history_k_data(self, stock_code, start_date=None, end_date=None):
         """
@@ -38,6 +79,16 @@ class AdataProvider:
 | turnover_ratio | decimal | 换手率(%)      |
 | pre_close      | decimal | 昨收(元)       |
 
+        启用本地K线库时，只下载本地最后一根K线之后缺失的区间，其余从本地读取；
+        此时只返回已收盘交易日的K线，不含盘中未完成的当日K线。
+        """
+        if self.kline_store is not None:
+            return self.kline_store.get(stock_code, start_date, end_date)
+        return self.download_history_k_data(stock_code, start_date, end_date)
+
+    def download_history_k_data(self, stock_code, start_date=None, end_date=None):
+        """
+        直接从 adata 下载单只股票的日K线(不经过本地K线库)
         """
         if start_date is None:
             # 默认回溯一段时间，比如1年
@@ -47,13 +98,14 @@ class AdataProvider:
         if end_date is None:
             end_date = datetime.now().strftime("%Y-%m-%d")
 
-        df = adata.stock.market.get_market(
-            stock_code=stock_code,
-            start_date=start_date,
-            end_date=end_date,
-            k_type=1,         # 1=日K线
-            adjust_type=1     # 1=前复权
-        )
+        with metrics.span("upstream_call_seconds", api="adata.get_market"):
+            df = adata.stock.market.get_market(
+                stock_code=stock_code,
+                start_date=start_date,
+                end_date=end_date,
+                k_type=1,         # 1=日K线
+                adjust_type=1     # 1=前复权
+            )
         return df
 
     def get_realtime_price(self, stock_code):
@@ -62,7 +114,8 @@ class AdataProvider:
         如果需要五档行情、分时行情等，可在这里扩展。
         """
         # 这里调用多只股票实时行情的接口，传入单只也OK
-        df = adata.stock.market.list_market_current(code_list=[stock_code])
+        with metrics.span("upstream_call_seconds", api="adata.list_market_current"):
+            df = adata.stock.market.list_market_current(code_list=[stock_code])
         # 返回DataFrame格式:
         # ['stock_code','short_name','price','change','change_pct','volume','amount']
         if df.empty:
@@ -82,87 +135,45 @@ class AdataProvider:
         :param stock_code:
         :return:
         """
-        return adata.stock.market.list_market_current(code_list=stock_code)
-
-    def get_trade_calendar(self, year=2025):
-        """
-        获取指定年份的交易日历
-        """
-        return adata.stock.info.trade_calendar(year=year)
+        with metrics.span("upstream_call_seconds", api="adata.list_market_current"):
+            return adata.stock.market.list_market_current(code_list=stock_code)
 
-    def get_yesterday_trade_date(self):
+    def get_realtime_snapshot(self, stock_codes):
         """
-        收盘后，今日即为昨日
-        获取上一个的交易日期
-        """
-        today = pd.Timestamp.now().strftime('%Y-%m-%d')
-        trade_calendar = self.get_trade_calendar()
-        # 判断当天是否是交易日，时间为15:00之后
-        if trade_calendar.loc[trade_calendar['trade_date'] == today, 'trade_status'].values[0] == 1 and  pd.Timestamp.now().hour >= 15:
-            return today
-        # 如果不是交易日，或者是交易日但时间小于15:00
-        else:
-            # 获取比今天小的交易日历中trade_status==1 的第一个作为昨天的日期
-            # 先筛选出比今天小的日期，再筛选出trade_status==1的日期，再取第一个
-            yesterday = trade_calendar[trade_calendar['trade_date'] < today]
-            yesterday = yesterday[yesterday['trade_status'] == 1]
-            yesterday = yesterday['trade_date'].iloc[-1]
-            return yesterday
-    def get_all_code_info(self):
-        """
-        获取所有股票代码信息
+        一次性获取一组股票的实时行情快照(每个tick只调用一次)
+        - 按 realtime_batch_size 分批，多批时并发请求 list_market_current
+        - 合并为一个以 stock_code 为索引的 DataFrame，价格、成交量等字段已转为浮点数
+        某一批请求失败时只记录告警，返回其余批次的数据，不影响整个tick。
         # 结果示例
-     stock_code short_name exchange   list_date
-0        000001       平安银行       SZ  1991-04-03
-1        000002      万  科Ａ       SZ  1991-01-29
-2        000003      PT金田A       SZ         NaN
-...         ...        ...      ...         ...
-5637     900955       退市海B       SH         NaN
-5638     900956       东贝B股       SH         NaN
-5639     900957       凌云Ｂ股       SH  2000-07-28
+                   short_name  price  change  change_pct       volume        amount
+stock_code
+000001           平安银行  11.34   -0.06       -0.53   42348200.0   479720000.0
+000795            英洛华   8.10    0.53        7.00  140166000.0  1098610000.0
         """
+        codes = list(dict.fromkeys(stock_codes))  # 去重并保持顺序
+        if not codes:
+            return empty_snapshot()
+
+        size = self.realtime_batch_size
+        batches = [codes[i:i + size] for i in range(0, len(codes), size)]
+        if len(batches) == 1:
+            frames = [self._fetch_realtime_batch(batches[0])]
+        else:
+            if self._realtime_executor is None:
+                self._realtime_executor = ThreadPoolExecutor(max_workers=self.realtime_max_workers,
+                                                             thread_name_prefix="realtime")
+            frames = list(self._realtime_executor.map(self._fetch_realtime_batch, batches))
+
+        return normalize_snapshot(frames)
+
+    def _fetch_realtime_batch(self, codes):
+        """请求一批股票的实时行情，失败时返回 None"""
+        try:
+            return self.get_realtime(codes)
+        except Exception as e:
+            logger.warning(f"获取实时行情失败({len(codes)}只, {codes[0]}...): {e}")
+            return None
 
-        return adata.stock.info.all_code()
-
-    def is_market_open(self,):
-        """
-        判断是否在交易时段内(包括盘前竞价)
-        """
-        now = datetime.now()
-        current_time = now.time()
-
-        morning_open = dtime(9, 30)
-        morning_close = dtime(11, 30)
-        afternoon_open = dtime(13, 0)
-        afternoon_close = dtime(15, 0)
-        pre_market_open = dtime(9, 15)  # 盘前竞价开始时间
-
-        # 获取当前年份的交易日历
-        year = now.year
-        trade_calendar = adata.stock.info.trade_calendar(year=year)
-        trade_dates = trade_calendar['trade_date'].astype(str).tolist()
-
-        # 当前日期
-        current_date = now.strftime("%Y-%m-%d")
-
-        # 如果当前日期不是交易日，返回 False
-        if current_date not in trade_dates:
-            return False
-
-        # 盘前竞价
-        if pre_market_open <= current_time <= morning_open:
-            return True
-        # 上午时段
-        if morning_open <= current_time <= morning_close:
-            return True
-        # 下午时段
-        if afternoon_open <= current_time <= afternoon_close:
-            return True
-        # 在盘前竞价和交易时段内
-        if pre_market_open <= current_time <= afternoon_close:
-            return True
-
-        return True
 
 if __name__ == '__main__':
     # # 测试数据提供者
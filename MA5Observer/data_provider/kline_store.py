@@ -0,0 +1,110 @@
+# kline_store.py
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from MA5Observer.data_provider.storage import (DEFAULT_CACHE_DIR, frame_path, read_frame, write_frame,
+                                               read_json, write_json)
+
+# 需要统一转换为浮点数的K线字段
+NUMERIC_COLUMNS = ["open", "close", "high", "low", "volume", "amount",
+                   "change", "change_pct", "turnover_ratio", "pre_close"]
+
+
+class KLineStore:
+    """
+    本地日K线库：每只股票一个列式文件 cache/kline/<stock_code>.parquet
+    - 本地已有数据时，只向数据源请求最后一根K线之后缺失的日期区间并追加
+    - 本地数据已覆盖到最近一个已收盘交易日时，完全不发网络请求
+    - 只保存已收盘交易日的K线，盘中未完成的当日K线不落盘
+    前复权数据在除权除息后会整体变动，追加时会用最后一根已存K线做校验，不一致则整只重新下载。
+    """
+
+    def __init__(self, fetcher, latest_trade_date, cache_dir=None, history_days=365):
+        """
+        :param fetcher: fetcher(stock_code, start_date, end_date) -> DataFrame，从数据源下载日K线
+        :param latest_trade_date: 无参函数，返回最近一个已收盘的交易日 'YYYY-MM-DD'
+        :param cache_dir: 缓存根目录，默认 MA5Observer/cache
+        :param history_days: 未指定开始日期时默认回溯的天数
+        """
+        self.fetcher = fetcher
+        self.latest_trade_date = latest_trade_date
+        self.directory = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "kline")
+        self.history_days = history_days
+        self._manifest_path = os.path.join(self.directory, "manifest.json")
+        # 每只股票本地数据覆盖的起始日期，用于判断是否需要向前补数据
+        self._manifest = read_json(self._manifest_path, default={})
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def get(self, stock_code, start_date=None, end_date=None):
+        """返回 [start_date, end_date] 区间的日K线，按 trade_date 升序"""
+        if start_date is None:
+            start_date = (datetime.now() - timedelta(days=self.history_days)).strftime("%Y-%m-%d")
+        if end_date is None:
+            end_date = datetime.now().strftime("%Y-%m-%d")
+
+        df = self._load(stock_code)
+        covered_from = self._manifest.get(stock_code)
+        if df is None or df.empty or covered_from is None or start_date < covered_from:
+            df = self._download(stock_code, start_date)
+        else:
+            last_date = df["trade_date"].iloc[-1]
+            if last_date < min(end_date, self.latest_trade_date()):
+                df = self._append(stock_code, df, last_date)
+
+        mask = (df["trade_date"] >= start_date) & (df["trade_date"] <= end_date)
+        return df[mask].reset_index(drop=True)
+
+    def _download(self, stock_code, start_date):
+        """从 start_date 起整段下载并落盘"""
+        df = self._fetch(stock_code, start_date)
+        self._save(stock_code, df, covered_from=start_date)
+        return df
+
+    def _append(self, stock_code, df, last_date):
+        """从最后一根已存K线开始增量下载，校验复权后追加"""
+        new = self._fetch(stock_code, last_date)
+        if new.empty:
+            return df
+        overlap = new[new["trade_date"] == last_date]
+        if not overlap.empty and abs(overlap["close"].iloc[0] - df["close"].iloc[-1]) > 1e-6:
+            # 最后一根K线价格不一致，说明发生了除权调整，整只重新下载
+            return self._download(stock_code, self._manifest[stock_code])
+        new = new[new["trade_date"] > last_date]
+        if new.empty:
+            return df
+        df = pd.concat([df, new], ignore_index=True)
+        self._save(stock_code, df, covered_from=self._manifest[stock_code])
+        return df
+
+    def _fetch(self, stock_code, start_date):
+        """下载并规范化字段类型，只保留已收盘交易日的K线"""
+        end_date = datetime.now().strftime("%Y-%m-%d")
+        df = self.fetcher(stock_code, start_date, end_date)
+        if df is None or df.empty:
+            return pd.DataFrame(columns=["stock_code", "trade_date"] + NUMERIC_COLUMNS)
+        df = df.copy()
+        df["trade_date"] = pd.to_datetime(df["trade_date"]).dt.strftime("%Y-%m-%d")
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        df = df[df["trade_date"] <= self.latest_trade_date()]
+        return df.sort_values("trade_date").reset_index(drop=True)
+
+    def _load(self, stock_code):
+        df = self._frames.get(stock_code)
+        if df is None:
+            df = read_frame(frame_path(self.directory, stock_code))
+            if df is not None:
+                self._frames[stock_code] = df
+        return df
+
+    def _save(self, stock_code, df, covered_from):
+        write_frame(df, frame_path(self.directory, stock_code))
+        with self._lock:
+            self._frames[stock_code] = df
+            self._manifest[stock_code] = covered_from
+            write_json(self._manifest, self._manifest_path)
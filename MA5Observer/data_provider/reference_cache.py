@@ -0,0 +1,135 @@
+# reference_cache.py
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from loguru import logger
+
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR, frame_path, read_frame, write_frame
+
+
+class ReferenceDataCache:
+    """
+    交易日历、全部股票代码表等参考数据的进程级缓存。
+    - 每张表在进程内只加载一次，超过 ttl 才重新加载
+    - 加载时优先读取本地缓存文件(cache/reference)，文件过期才请求数据源，请求失败时继续使用过期数据
+    - 交易日判断、上一交易日等查询走预先排好序的交易日索引，不再扫描 DataFrame
+    """
+
+    def __init__(self, calendar_fetcher, code_fetcher, cache_dir=None, ttl=24 * 3600, persist=True):
+        """
+        :param calendar_fetcher: calendar_fetcher(year) -> DataFrame，字段含 trade_date、trade_status
+        :param code_fetcher: code_fetcher() -> DataFrame，字段含 stock_code、short_name
+        :param cache_dir: 缓存根目录，默认 MA5Observer/cache
+        :param ttl: 缓存有效期(秒)，默认1天
+        :param persist: 为 False 时只缓存在内存中，不读写本地缓存文件(回放等数据源本身就在本地时使用)
+        """
+        self.calendar_fetcher = calendar_fetcher
+        self.code_fetcher = code_fetcher
+        self.directory = os.path.join(cache_dir or DEFAULT_CACHE_DIR, "reference")
+        self.ttl = ttl
+        self.persist = persist
+        self._tables = {}  # 表名 -> (加载时间, DataFrame)
+        self._calendar_years = {}  # 年份 -> 该年交易日列表
+        self._trade_days = []  # 已加载年份的全部交易日，升序
+        self._trade_day_set = set()
+        self._code_names = {}  # stock_code -> short_name
+        self._failed_years = {}  # 年份 -> 上次加载失败的时间，ttl 内不再重试
+        self._lock = threading.RLock()
+
+    def _get_table(self, name, fetcher):
+        """按 内存 -> 本地文件 -> 数据源 的顺序取表，返回 (DataFrame, 是否为新加载)"""
+        with self._lock:
+            now = time.time()
+            entry = self._tables.get(name)
+            if entry is not None and now - entry[0] < self.ttl:
+                return entry[1], False
+
+            path = frame_path(self.directory, name)
+            df = read_frame(path) if self.persist else None
+            if df is not None and now - os.path.getmtime(path) < self.ttl:
+                loaded_at = os.path.getmtime(path)
+            else:
+                try:
+                    fresh = fetcher()
+                    if self.persist:
+                        write_frame(fresh, path)
+                    df = fresh
+                except Exception as e:
+                    if df is None and entry is None:
+                        raise
+                    df = df if df is not None else entry[1]
+                    logger.warning(f"刷新参考数据 {name} 失败，继续使用缓存: {e}")
+                loaded_at = now
+            self._tables[name] = (loaded_at, df)
+            return df, True
+
+    def get_trade_calendar(self, year):
+        """获取指定年份的交易日历"""
+        df, reloaded = self._get_table(f"trade_calendar_{year}", lambda: self.calendar_fetcher(year))
+        if reloaded or year not in self._calendar_years:
+            with self._lock:
+                days = df.loc[df["trade_status"].astype(int) == 1, "trade_date"].astype(str)
+                self._calendar_years[year] = days.tolist()
+                self._trade_days = sorted({d for ds in self._calendar_years.values() for d in ds})
+                self._trade_day_set = set(self._trade_days)
+        return df
+
+    def get_all_code_info(self):
+        """获取全部股票代码表"""
+        df, reloaded = self._get_table("all_code", self.code_fetcher)
+        if reloaded or not self._code_names:
+            with self._lock:
+                self._code_names = dict(zip(df["stock_code"], df["short_name"]))
+        return df
+
+    def get_stock_name(self, stock_code):
+        """按股票代码查简称，找不到时返回 None"""
+        self.get_all_code_info()
+        return self._code_names.get(stock_code)
+
+    def _ensure_calendar(self, date):
+        """确保 date 所在年份及前一年的交易日历已加载，跨年查询上一交易日时需要"""
+        year = int(date[:4])
+        self.get_trade_calendar(year)
+        if time.time() - self._failed_years.get(year - 1, 0) < self.ttl:
+            return
+        try:
+            self.get_trade_calendar(year - 1)
+        except Exception as e:
+            self._failed_years[year - 1] = time.time()
+            logger.warning(f"获取 {year - 1} 年交易日历失败: {e}")
+
+    def is_trade_day(self, date):
+        """判断 'YYYY-MM-DD' 是否为交易日"""
+        self._ensure_calendar(date)
+        return date in self._trade_day_set
+
+    def trade_dates_before(self, date, n):
+        """返回 date 之前(不含 date)最近的 n 个交易日，升序"""
+        self._ensure_calendar(date)
+        index = bisect_left(self._trade_days, date)
+        return self._trade_days[max(index - n, 0):index]
+
+    def previous_trade_date(self, date):
+        """返回 date 之前(不含 date)最近的一个交易日"""
+        dates = self.trade_dates_before(date, 1)
+        return dates[0] if dates else None
+
+    def next_trade_date(self, date):
+        """返回 date 之后(不含 date)最近的一个交易日；下一年交易日历不可用时返回 None"""
+        self._ensure_calendar(date)
+        index = bisect_right(self._trade_days, date)
+        if index == len(self._trade_days):
+            year = int(date[:4]) + 1
+            if time.time() - self._failed_years.get(year, 0) < self.ttl:
+                return None
+            try:
+                self.get_trade_calendar(year)
+            except Exception as e:
+                self._failed_years[year] = time.time()
+                logger.warning(f"获取 {year} 年交易日历失败: {e}")
+                return None
+            index = bisect_right(self._trade_days, date)
+        return self._trade_days[index] if index < len(self._trade_days) else None
@@ -0,0 +1,306 @@
+# replay_provider.py
+"""
+本地回放数据源，不访问网络，用于在非交易时间确定性地运行整个观察流程(main / Stock / 策略)并做压测：
+  - 历史K线、交易日历、代码表都来自 data/*.csv(经 history_data 以 mmap 二进制格式加载)
+  - 实时行情二选一：
+      1. tick 日志回放：每只股票取 trade_time 不晚于当前虚拟时间的最后一条 tick
+      2. 由回放日的日K线合成盘中价格：开盘价 -> 最高/最低价 -> 收盘价的折线，叠加确定性的小幅波动
+  - 时间取自 VirtualClock，可按倍速运行，也可静止后逐 tick 手动前进
+
+用法：
+    python -m MA5Observer.data_provider.replay_provider --date 2024-06-03 --ticks 300
+"""
+import argparse
+import glob
+import math
+import os
+import time
+from datetime import datetime, time as dtime
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.clock import VirtualClock
+from MA5Observer.data_provider.base import DataProvider
+from MA5Observer.data_provider.reference_cache import ReferenceDataCache
+from MA5Observer.history_data import DEFAULT_DATA_DIR, load_history, read_csv_names
+
+# 连续竞价时段(分钟)：9:30-11:30、13:00-15:00
+_MORNING = (9 * 60 + 30, 11 * 60 + 30)
+_AFTERNOON = (13 * 60, 15 * 60)
+_SESSION_MINUTES = (_MORNING[1] - _MORNING[0]) + (_AFTERNOON[1] - _AFTERNOON[0])
+
+
+def session_fraction(moment):
+    """moment 在当日连续竞价时段中所处的位置(0~1)：9:30 前为 0，午休期间停在上午收盘，15:00 后为 1"""
+    minutes = moment.hour * 60 + moment.minute + (moment.second + moment.microsecond / 1e6) / 60
+    morning = min(max(minutes - _MORNING[0], 0), _MORNING[1] - _MORNING[0])
+    afternoon = min(max(minutes - _AFTERNOON[0], 0), _AFTERNOON[1] - _AFTERNOON[0])
+    return (morning + afternoon) / _SESSION_MINUTES
+
+
+def _epoch_seconds(values):
+    """trade_time 列转为时间戳(秒)；datetime 按本地时间解释，与 TickBuffer.to_frame 相反"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+    utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+    naive = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")
+    return naive.astype(np.int64) / 1e9 - utc_offset
+
+
+class SyntheticDay:
+    """
+    由一个交易日的日K线合成全部股票的盘中价格路径(向量化)。
+    路径为 开盘 -> 第一个极值 -> 第二个极值 -> 收盘 的折线：阴线先到最高价，阳线先到最低价；
+    极值出现的时刻与波动的相位由以日期为种子的随机数生成，同一天的回放结果完全一致。
+    当日没有K线(停牌)的股票价格保持昨收。
+    """
+
+    def __init__(self, history, date, seed=None, noise=0.002):
+        """
+        :param history: HistoryArrays
+        :param date: 'YYYY-MM-DD'
+        :param noise: 叠加波动的幅度(相对开盘价)
+        """
+        self.date = date
+        c = history.columns
+        day = np.datetime64(date, "D")
+        n = len(history)
+        rows = np.full(n, -1, dtype=np.int64)  # 当日K线所在行，-1 表示没有
+        prev = np.full(n, -1, dtype=np.int64)  # 前一根K线所在行
+        dates = c["trade_date"]
+        for i in range(n):
+            lo, hi = history.offsets[i], history.offsets[i + 1]
+            k = lo + np.searchsorted(dates[lo:hi], day)
+            if k < hi and dates[k] == day:
+                rows[i] = k
+            if k > lo:
+                prev[i] = k - 1
+        has_bar = rows >= 0
+        self.valid = has_bar | (prev >= 0)
+        self.prev_close = np.where(prev >= 0, c["close"][np.maximum(prev, 0)], np.nan)
+
+        def pick(name):
+            return np.where(has_bar, c[name][np.maximum(rows, 0)], self.prev_close)
+
+        self.open, self.close = pick("open"), pick("close")
+        self.high, self.low = pick("high"), pick("low")
+        # efinance 日K线成交量单位为手，换算为股
+        self.volume = np.where(has_bar, c["volume"][np.maximum(rows, 0)] * 100, 0.0)
+        self.amount = np.where(has_bar, c["amount"][np.maximum(rows, 0)], 0.0)
+
+        rng = np.random.default_rng(int(date.replace("-", "")) if seed is None else seed)
+        self.t1 = rng.uniform(0.05, 0.5, n)
+        self.t2 = rng.uniform(self.t1 + 0.05, 0.95)
+        high_first = self.close < self.open
+        self.first = np.where(high_first, self.high, self.low)
+        self.second = np.where(high_first, self.low, self.high)
+        self.cycles = rng.uniform(5, 40, n)
+        self.phase = rng.uniform(0, 2 * np.pi, n)
+        self.noise = noise
+
+    def prices(self, rows, fraction):
+        """rows 行股票在时段位置 fraction(0~1)的价格"""
+        o, c = self.open[rows], self.close[rows]
+        a, b = self.first[rows], self.second[rows]
+        t1, t2 = self.t1[rows], self.t2[rows]
+        f = fraction
+        price = np.where(
+            f <= t1, o + (a - o) * f / t1,
+            np.where(f <= t2, a + (b - a) * (f - t1) / (t2 - t1), b + (c - b) * (f - t2) / (1 - t2)))
+        wobble = self.noise * o * math.sin(math.pi * f) * np.sin(2 * np.pi * self.cycles[rows] * f + self.phase[rows])
+        return np.round(np.clip(price + wobble, self.low[rows], self.high[rows]), 2)
+
+
+class TickTape:
+    """
+    录制的 tick 日志，字段 stock_code trade_time price change change_pct volume amount [short_name]，
+    trade_time 可以是时间戳(秒)或本地时间。按 (stock_code, trade_time) 排序后，每只股票按时间二分查找。
+    """
+
+    COLUMNS = ["price", "change", "change_pct", "volume", "amount"]
+
+    def __init__(self, ticks):
+        ticks = ticks.assign(stock_code=ticks["stock_code"].astype(str),
+                             trade_time=_epoch_seconds(ticks["trade_time"]))
+        ticks = ticks.sort_values(["stock_code", "trade_time"], kind="stable").reset_index(drop=True)
+        codes = ticks["stock_code"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+        ends = np.r_[starts[1:], len(codes)]
+        self._ranges = {codes[s]: (s, e) for s, e in zip(starts, ends)}
+        self.times = ticks["trade_time"].to_numpy(dtype=np.float64)
+        self.values = {name: ticks[name].to_numpy(dtype=np.float64) for name in self.COLUMNS}
+        self.names = dict(zip(ticks["stock_code"], ticks["short_name"])) if "short_name" in ticks else {}
+
+    @classmethod
+    def from_file(cls, path):
+        """读取 CSV / Parquet / pickle 格式的 tick 日志，或 TickRecorder 录制的某个交易日目录/文件"""
+        if os.path.isdir(path) or path.endswith(".log"):
+            from MA5Observer.tick_recorder import read_tick_files
+            paths = sorted(glob.glob(os.path.join(path, "*.log"))) if os.path.isdir(path) else [path]
+            return cls(read_tick_files(paths))
+        if path.endswith(".csv"):
+            return cls(pd.read_csv(path, dtype={"stock_code": str}))
+        if path.endswith(".parquet"):
+            return cls(pd.read_parquet(path))
+        return cls(pd.read_pickle(path))
+
+    @property
+    def codes(self):
+        return list(self._ranges)
+
+    def start_time(self):
+        """最早一条 tick 的本地时间"""
+        return datetime.fromtimestamp(self.times.min())
+
+    def lookup(self, codes, timestamp):
+        """每只股票 trade_time 不晚于 timestamp 的最后一条 tick，返回 (股票代码列表, 行号数组)"""
+        found, rows = [], []
+        for code in codes:
+            span = self._ranges.get(code)
+            if span is None:
+                continue
+            k = span[0] + np.searchsorted(self.times[span[0]:span[1]], timestamp, side="right") - 1
+            if k >= span[0]:
+                found.append(code)
+                rows.append(k)
+        return found, np.asarray(rows, dtype=np.int64)
+
+
+class ReplayProvider(DataProvider):
+    """
+    本地回放数据源，实现与 AdataProvider 相同的 DataProvider 接口，时间取自 self.clock(VirtualClock)。
+    历史K线只返回回放时刻之前已收盘的交易日，不会看到未来数据。
+    """
+
+    name = "replay"
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, replay_date=None, clock=None, speed=1.0,
+                 tick_log=None, history=None, seed=None):
+        """
+        :param data_dir: 日K线 CSV 目录
+        :param replay_date: 回放日期 'YYYY-MM-DD'，默认取 tick 日志的日期，没有 tick 日志时取历史数据的最后一天
+        :param clock: 虚拟时钟，默认从回放日 9:15 开始按 speed 倍速运行
+        :param tick_log: tick 日志路径或 DataFrame，不指定时由日K线合成盘中价格
+        :param history: 已加载的 HistoryArrays，不指定时从 data_dir 加载
+        :param seed: 合成盘中价格的随机种子，默认按日期
+        """
+        self.history = history if history is not None else load_history(data_dir)
+        self._index = {code: i for i, code in enumerate(self.history.codes)}
+        self.names = read_csv_names(data_dir, self.history.codes)
+        if isinstance(tick_log, str):
+            self.tape = TickTape.from_file(tick_log)
+        else:
+            self.tape = TickTape(tick_log) if tick_log is not None else None
+        if self.tape is not None:
+            self.names = {**self.tape.names, **self.names}
+
+        dates = self.history.columns["trade_date"]
+        self.trade_dates = sorted(str(d) for d in np.unique(dates)) if len(dates) else []
+        if replay_date is None:
+            if self.tape is not None:
+                replay_date = self.tape.start_time().strftime("%Y-%m-%d")
+            elif self.trade_dates:
+                replay_date = self.trade_dates[-1]
+            else:
+                raise ValueError("没有可回放的历史数据")
+        self.replay_date = replay_date
+        if replay_date not in self.trade_dates:
+            # tick 日志的日期可能晚于日K线的最后一天
+            self.trade_dates = sorted(self.trade_dates + [replay_date])
+
+        start = datetime.combine(datetime.strptime(replay_date, "%Y-%m-%d").date(), self.TRADING_SESSIONS[0][0])
+        self.clock = clock or VirtualClock(start, speed)
+        self.seed = seed
+        self._day = None
+        self.reference_cache = ReferenceDataCache(self._fetch_calendar, self._fetch_all_code, persist=False)
+
+    def _fetch_calendar(self, year):
+        days = [d for d in self.trade_dates if d.startswith(str(year))]
+        return pd.DataFrame({"trade_date": days, "trade_status": 1})
+
+    def _fetch_all_code(self):
+        codes = list(dict.fromkeys(self.history.codes + (self.tape.codes if self.tape is not None else [])))
+        return pd.DataFrame({"stock_code": codes, "short_name": [self.names.get(code, code) for code in codes]})
+
+    def get_history_k_data(self, stock_code, start_date=None, end_date=None):
+        """
+        单只股票的日K线，只包含回放时刻已收盘的交易日(15:00 之后含当天)
+        """
+        if stock_code not in self._index:
+            return pd.DataFrame()
+        df = self.history.to_frame(stock_code)
+        df["trade_date"] = df["trade_date"].dt.strftime("%Y-%m-%d")
+        cutoff = self.get_yesterday_trade_date()
+        mask = df["trade_date"] <= cutoff if cutoff else df["trade_date"] < self.clock.now().strftime("%Y-%m-%d")
+        if start_date is not None:
+            mask &= df["trade_date"] >= start_date
+        if end_date is not None:
+            mask &= df["trade_date"] <= end_date
+        return df[mask].reset_index(drop=True)
+
+    def _synthetic_day(self, date):
+        if self._day is None or self._day.date != date:
+            self._day = SyntheticDay(self.history, date, seed=self.seed)
+        return self._day
+
+    def get_realtime(self, stock_code):
+        """
+        回放时刻的实时行情，字段与 AdataProvider.get_realtime 一致：
+        stock_code short_name price change change_pct volume amount
+        """
+        codes = [stock_code] if isinstance(stock_code, str) else list(stock_code)
+        if self.tape is not None:
+            found, rows = self.tape.lookup(codes, self.clock.time())
+            frame = pd.DataFrame({name: values[rows] for name, values in self.tape.values.items()})
+            frame.insert(0, "stock_code", found)
+            frame.insert(1, "short_name", [self.names.get(code, code) for code in found])
+            return frame
+
+        now = self.clock.now()
+        today = now.strftime("%Y-%m-%d")
+        if self.reference_cache.is_trade_day(today):
+            day, fraction = self._synthetic_day(today), session_fraction(now)
+        else:
+            # 非交易日停留在上一交易日收盘
+            day, fraction = self._synthetic_day(self.reference_cache.previous_trade_date(today)), 1.0
+        found = [code for code in codes if code in self._index and day.valid[self._index[code]]]
+        rows = np.array([self._index[code] for code in found], dtype=np.int64)
+        price = day.prices(rows, fraction)
+        prev_close = day.prev_close[rows]
+        change = np.round(price - prev_close, 2)
+        return pd.DataFrame({
+            "stock_code": found,
+            "short_name": [self.names.get(code, code) for code in found],
+            "price": price,
+            "change": change,
+            "change_pct": np.round(change / prev_close * 100, 2),
+            "volume": np.round(day.volume[rows] * fraction, -2),
+            "amount": day.amount[rows] * fraction,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放数据源演示：按虚拟时间逐 tick 输出合成行情")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="日K线 CSV 目录")
+    parser.add_argument("--date", default=None, help="回放日期 YYYY-MM-DD，默认最后一个交易日")
+    parser.add_argument("--tick-log", default=None, help="tick 日志文件")
+    parser.add_argument("--ticks", type=int, default=5, help="回放的 tick 数")
+    parser.add_argument("--interval", type=float, default=60.0, help="每个 tick 虚拟时间前进的秒数")
+    args = parser.parse_args()
+
+    provider = ReplayProvider(args.data, replay_date=args.date, tick_log=args.tick_log, speed=0)
+    provider.clock.set(datetime.combine(provider.clock.now().date(), dtime(9, 30)))
+    codes = provider.history.codes
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        snapshot = provider.get_realtime_snapshot(codes)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{provider.clock.now():%Y-%m-%d %H:%M:%S} 开市={provider.is_market_open()} "
+              f"{len(snapshot)} 只, 耗时 {elapsed:.2f}ms")
+        print(snapshot.head(3).to_string())
+        provider.clock.advance(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# storage.py
+"""
+本地缓存文件的读写工具。
+安装了 pyarrow 时使用 Parquet 列式格式，否则退回 pandas pickle，两者对调用方透明。
+所有写入都先写临时文件再替换，进程中途退出也不会留下损坏的缓存。
+"""
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  Parquet 读写依赖
+except ImportError:
+    pyarrow = None
+
+# 本地缓存根目录(历史K线、交易日历等)，默认位于 MA5Observer/cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+FRAME_SUFFIX = ".parquet" if pyarrow is not None else ".pkl"
+
+
+def frame_path(directory, name):
+    """缓存表格文件路径，后缀取决于可用的存储格式"""
+    return os.path.join(directory, name + FRAME_SUFFIX)
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def write_frame(df, path):
+    """原子写入 DataFrame"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp_path(path)
+    if pyarrow is not None:
+        df.to_parquet(tmp, index=False)
+    else:
+        df.reset_index(drop=True).to_pickle(tmp, compression=None)
+    os.replace(tmp, path)
+
+
+def read_frame(path):
+    """读取 DataFrame，文件不存在或损坏时返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        if pyarrow is not None:
+            return pd.read_parquet(path)
+        return pd.read_pickle(path, compression=None)
+    except Exception:
+        return None
+
+
+def write_json(obj, path):
+    """原子写入 JSON"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_json(path, default=None):
+    """读取 JSON，文件不存在或损坏时返回 default"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
@@ -0,0 +1,234 @@
+# history_data.py
+"""
+data/ 目录下日K线历史数据(efinance 导出的中文表头 CSV，每只股票一个文件)的加载工具。
+字段统一重命名为数据提供者使用的英文列名，并可把多只股票拼接成列式数组供向量化计算。
+
+CSV 可一次性转换为二进制列式目录(默认 MA5Observer/cache/history)：
+    codes.npy / offsets.npy  代码索引，第 i 只股票位于 offsets[i]:offsets[i + 1]
+    <列名>.npy              每列一个定长类型数组(trade_date 为 datetime64[D]，其余 float64)
+加载时以 mmap 方式打开，不解析文本也不复制数据，多个进程共享同一份页缓存。
+
+用法：
+    python -m MA5Observer.history_data --data data --out MA5Observer/cache/history
+"""
+import argparse
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR
+
+# efinance 日K线表头 -> 统一列名(与 AdataProvider / AkshareProvider 一致)
+EFINANCE_COLUMNS = {
+    "股票名称": "short_name",
+    "股票代码": "stock_code",
+    "日期": "trade_date",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+    "振幅": "amplitude",
+    "涨跌幅": "change_pct",
+    "涨跌额": "change",
+    "换手率": "turnover_ratio",
+}
+
+# 参与向量化计算的数值列
+PRICE_COLUMNS = ("open", "close", "high", "low", "volume", "amount", "change", "change_pct", "turnover_ratio")
+
+# 仓库自带的历史数据目录
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# 二进制列式历史数据目录
+DEFAULT_BINARY_DIR = os.path.join(DEFAULT_CACHE_DIR, "history")
+
+
+def list_csv_codes(data_dir=DEFAULT_DATA_DIR):
+    """列出 data_dir 下所有 <股票代码>.csv 的代码，升序"""
+    paths = glob.glob(os.path.join(data_dir, "*.csv"))
+    return sorted(os.path.splitext(os.path.basename(path))[0] for path in paths)
+
+
+def read_csv_names(data_dir=DEFAULT_DATA_DIR, codes=None):
+    """只读取每个 CSV 的第一行数据，返回 {股票代码: 股票名称}"""
+    codes = list_csv_codes(data_dir) if codes is None else codes
+    names = {}
+    for code in codes:
+        path = os.path.join(data_dir, f"{code}.csv")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            header = f.readline().strip().split(",")
+            row = f.readline().strip().split(",")
+        if "股票名称" in header and len(row) == len(header):
+            names[code] = row[header.index("股票名称")]
+    return names
+
+
+def load_csv(path):
+    """读取单个 efinance 日K线 CSV，返回统一列名、按日期升序的 DataFrame"""
+    df = pd.read_csv(path, dtype={"股票代码": str}, encoding="utf-8")
+    df = df.rename(columns=EFINANCE_COLUMNS)
+    return df.sort_values("trade_date").reset_index(drop=True)
+
+
+class HistoryArrays:
+    """
+    多只股票日K线的列式数组：各列按股票首尾相接，
+    第 i 只股票的数据位于 offsets[i]:offsets[i + 1]，trade_date 为 datetime64[D]。
+    """
+
+    def __init__(self, codes, offsets, columns):
+        self.codes = list(codes)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.columns = columns
+        self._index = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self._index
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def get(self, code):
+        """返回单只股票的 {列名: 数组切片}(视图，不复制)"""
+        i = self._index[code]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+    def to_frame(self, code):
+        """返回单只股票的 DataFrame"""
+        frame = pd.DataFrame(self.get(code))
+        frame.insert(0, "stock_code", code)
+        return frame
+
+    def subset(self, start, end):
+        """第 start 到 end-1 只股票组成的 HistoryArrays(列为切片视图)"""
+        lo, hi = self.offsets[start], self.offsets[end]
+        columns = {name: column[lo:hi] for name, column in self.columns.items()}
+        return HistoryArrays(self.codes[start:end], self.offsets[start:end + 1] - lo, columns)
+
+    def position_in_code(self):
+        """每一行在所属股票内的序号(0 为该股票的第一根K线)"""
+        return np.arange(self.offsets[-1]) - np.repeat(self.offsets[:-1], self.lengths)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """由 {股票代码: DataFrame} 构造"""
+        codes = [code for code, df in frames.items() if df is not None and not df.empty]
+        lengths = [len(frames[code]) for code in codes]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        columns = {"trade_date": np.concatenate(
+            [pd.to_datetime(frames[code]["trade_date"]).to_numpy(dtype="datetime64[D]") for code in codes]
+        ) if codes else np.empty(0, dtype="datetime64[D]")}
+        for name in PRICE_COLUMNS:
+            columns[name] = np.concatenate(
+                [frames[code][name].to_numpy(dtype=np.float64) for code in codes]
+            ) if codes else np.empty(0, dtype=np.float64)
+        return cls(codes, offsets, columns)
+
+
+def _load_csv_batch(paths):
+    return {os.path.splitext(os.path.basename(path))[0]: load_csv(path) for path in paths}
+
+
+def load_csv_dir(data_dir=DEFAULT_DATA_DIR, codes=None, workers=None):
+    """
+    加载 data_dir 下的 CSV 为 HistoryArrays
+    :param codes: 只加载这些代码，默认全部
+    :param workers: 解析 CSV 的进程数，默认 CPU 核数；为 1 时在当前进程内解析
+    """
+    codes = list_csv_codes(data_dir) if codes is None else list(codes)
+    paths = [os.path.join(data_dir, f"{code}.csv") for code in codes]
+    paths = [path for path in paths if os.path.exists(path)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2 * workers:
+        frames = _load_csv_batch(paths)
+    else:
+        chunk = max(1, len(paths) // (workers * 4))
+        frames = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in executor.map(_load_csv_batch, [paths[i:i + chunk] for i in range(0, len(paths), chunk)]):
+                frames.update(batch)
+    return HistoryArrays.from_frames({code: frames[code] for code in codes if code in frames})
+
+
+def save_arrays(history, out_dir=DEFAULT_BINARY_DIR):
+    """
+    把 HistoryArrays 保存为二进制列式目录。先写入临时目录再整体替换，读者不会看到写了一半的数据
+    """
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "codes.npy"), np.array(history.codes, dtype="U"))
+    np.save(os.path.join(tmp, "offsets.npy"), history.offsets)
+    for name, column in history.columns.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(column))
+    old = f"{out_dir}.{os.getpid()}.old"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def load_arrays(directory=DEFAULT_BINARY_DIR, mmap=True):
+    """
+    加载二进制列式目录为 HistoryArrays
+    :param mmap: 为 True 时各列以只读 mmap 打开，按需换页，不占用额外内存
+    """
+    mode = "r" if mmap else None
+    codes = np.load(os.path.join(directory, "codes.npy")).tolist()
+    offsets = np.load(os.path.join(directory, "offsets.npy"))
+    columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+               for name in ("trade_date",) + PRICE_COLUMNS}
+    return HistoryArrays(codes, offsets, columns)
+
+
+def convert_csv_dir(data_dir=DEFAULT_DATA_DIR, out_dir=DEFAULT_BINARY_DIR, workers=None):
+    """把 data_dir 下的全部 CSV 转换为二进制列式目录，返回 HistoryArrays"""
+    history = load_csv_dir(data_dir, workers=workers)
+    save_arrays(history, out_dir)
+    return history
+
+
+def load_history(data_dir=DEFAULT_DATA_DIR, binary_dir=DEFAULT_BINARY_DIR, workers=None):
+    """
+    优先以 mmap 加载二进制历史数据；二进制目录不存在或比任一 CSV 旧时先重新转换
+    """
+    codes_path = os.path.join(binary_dir, "codes.npy")
+    csv_paths = glob.glob(os.path.join(data_dir, "*.csv"))
+    newest_csv = max((os.path.getmtime(path) for path in csv_paths), default=0)
+    if not os.path.exists(codes_path) or os.path.getmtime(codes_path) < newest_csv:
+        convert_csv_dir(data_dir, binary_dir, workers=workers)
+    return load_arrays(binary_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 data/*.csv 转换为 mmap 二进制列式格式")
+    parser.add_argument("--data", default=DEFAULT_DATA_DIR, help="日K线 CSV 目录")
+    parser.add_argument("--out", default=DEFAULT_BINARY_DIR, help="二进制输出目录")
+    parser.add_argument("--workers", type=int, default=None, help="解析 CSV 的进程数")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    history = convert_csv_dir(args.data, args.out, workers=args.workers)
+    print(f"已转换 {len(history)} 只股票, {history.offsets[-1]} 行, 耗时 {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    load_arrays(args.out)
+    print(f"mmap 加载耗时 {(time.perf_counter() - start) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# indicator.py
+from array import array
+import math
+
+
+class IndicatorState:
+    """
+    单只股票的增量均线状态：
+      - 环形缓冲区保存最近 N 个已收盘交易日的收盘价(N = 最大均线周期)
+      - 对每个均线周期 w 维护最近 (w-1) 个收盘价之和，当日价格变动时 MA_w = (和 + 当日价) / w
+      - 同时保存昨日开高低收，供卖点判断使用
+    盘中每次更新当日临时收盘价只做常数次浮点运算，不分配 DataFrame/列表。
+    """
+    __slots__ = ("windows", "capacity", "_closes", "_head", "_count", "_sums", "_values", "today_close",
+                 "yesterday_open", "yesterday_high", "yesterday_low", "yesterday_close")
+
+    def __init__(self, closes=(), windows=(5, 10, 20)):
+        """
+        :param closes: 已收盘交易日的收盘价序列(从旧到新)
+        :param windows: 需要维护的均线周期
+        """
+        self.windows = tuple(sorted(set(windows)))
+        self.capacity = self.windows[-1]
+        self._closes = array("d", [0.0] * self.capacity)
+        self._head = 0  # 下一个写入位置
+        self._count = 0  # 已保存的收盘价个数
+        self._sums = array("d", [0.0] * len(self.windows))  # 各周期最近 (w-1) 个收盘价之和
+        self._values = array("d", [math.nan] * len(self.windows))  # 各周期当前均线值
+        self.today_close = math.nan  # 当日临时收盘价(实时价)，未开盘时为 nan
+        self.yesterday_open = None
+        self.yesterday_high = None
+        self.yesterday_low = None
+        self.yesterday_close = None
+        for close in list(closes)[-self.capacity:]:
+            self.push_close(close)
+
+    def _at(self, age):
+        """取倒数第 age+1 个已收盘收盘价(age=0 为最近一个)"""
+        return self._closes[(self._head - 1 - age) % self.capacity]
+
+    def push_close(self, close):
+        """追加一个已收盘交易日的收盘价(初始化或收盘换日时调用)，同时清空当日临时价"""
+        close = float(close)
+        for i, w in enumerate(self.windows):
+            if w == 1:
+                continue
+            if self._count >= w - 1:
+                # 最旧的一个移出 (w-1) 窗口
+                self._sums[i] -= self._at(w - 2)
+            self._sums[i] += close
+        self._closes[self._head] = close
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.today_close = math.nan
+        self._refresh_history_values()
+
+    def close_day(self):
+        """收盘后把当日临时收盘价固化为历史收盘价"""
+        if not math.isnan(self.today_close):
+            self.push_close(self.today_close)
+
+    def _refresh_history_values(self):
+        """无当日价格时，均线取最近 w 个已收盘价的均值"""
+        for i, w in enumerate(self.windows):
+            if self._count >= w:
+                self._values[i] = (self._sums[i] + self._at(w - 1)) / w
+            else:
+                self._values[i] = math.nan
+
+    def update_today(self, price):
+        """更新当日临时收盘价，O(均线周期数) 重新计算各均线"""
+        price = float(price)
+        self.today_close = price
+        for i, w in enumerate(self.windows):
+            if self._count >= w - 1:
+                self._values[i] = (self._sums[i] + price) / w
+            else:
+                self._values[i] = math.nan
+
+    def set_yesterday(self, open_price, high, low, close):
+        """设置昨日开高低收"""
+        self.yesterday_open = float(open_price)
+        self.yesterday_high = float(high)
+        self.yesterday_low = float(low)
+        self.yesterday_close = float(close)
+
+    def ma(self, window):
+        """返回指定周期的均线，数据不足时返回 None"""
+        value = self._values[self.windows.index(window)]
+        return None if math.isnan(value) else value
+
+    def history_sum(self, window):
+        """最近 (window-1) 个已收盘价之和，可用于反推价格落入均线的临界值"""
+        return self._sums[self.windows.index(window)] if self._count >= window - 1 else None
@@ -1,19 +1,36 @@
 #main.py
+import argparse
+import asyncio
 import sys
-import threading
 import time
-from datetime import datetime, time as dtime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from loguru import logger
-import pandas as pd
-import sys
 # 获取父目录,绝对路径
 sys.path.append("..")
+# 启动计时从这里开始；--profile-startup 时在导入其余模块之前开始统计各个包的导入耗时
+from MA5Observer.startup import StartupProfile
+startup = StartupProfile(track_imports=__name__ == "__main__" and "--profile-startup" in sys.argv)
+
+from loguru import logger
 from MA5Observer.Stock import Stock
-from data_provider.data_provider import AdataProvider
-from strategy import PriceRangeStrategy
-from notifier import Notifier
-import adata
+from MA5Observer.checkpoint import DEFAULT_CHECKPOINT_DIR
+from MA5Observer.data_provider import PROVIDERS, create_provider, is_available
+from MA5Observer.metrics import start_http_server
+from MA5Observer.notifier import ConsoleSink, DesktopSink, FileSink, NotificationDispatcher, WebhookSink
+from MA5Observer.observer import StockObserver
+from MA5Observer.scheduler import ObserverScheduler
+from MA5Observer.sharded_observer import ShardedObserver, configure_logging
+from MA5Observer.tick_recorder import DEFAULT_TICK_DIR, TickRecorder
+from MA5Observer.trigger_table import DEFAULT_TRIGGER_DIR
+from MA5Observer.watchlist import WatchlistWatcher
+
+
+# 日志配置 [(sink, logger.add 的参数)]，分片观察的工作进程使用同一份
+LOG_HANDLERS = [
+    ("app.log", {"rotation": "1 week", "level": "DEBUG", "retention": "10 days"}),  # Log to file
+    ("stdout", {"level": "INFO"}),  # Print log to stdout for important info
+]
 
 
 def read_observed_stocks(filepath="observe.txt"):
@@ -27,204 +44,161 @@ def read_observed_stocks(filepath="observe.txt"):
     return list(stock_set)  # 转换为列表并返回
 
 
-def read_holding_stocks(filepath="holding.txt"):
-    holding_list = []
+def read_holding_stocks(filepath="holding.txt", data_provider=None, max_workers=8, profile=None):
+    """
+    读取持仓代码并初始化 Stock(各自读取历史K线，在线程池中并发进行，顺序与文件一致)；
+    profile 不为 None 时记录每只股票的初始化耗时
+    """
     holding_codes = []
 
-    data_provider = AdataProvider()
+    if data_provider is None:
+        data_provider = create_provider("adata")
     with open(filepath, "r", encoding="utf-8") as f:
         for line in f:
             code = line.strip()
             if code:
-                # stock_name = "SomeStockName"  # 你可以通过股票代码获取股票名称
-                holding_list.append(Stock(stock_code=code,data_provider=data_provider,is_held=True))
                 holding_codes.append(code)
+
+    def build(code):
+        start = time.perf_counter()
+        stock = Stock(stock_code=code, data_provider=data_provider, is_held=True)
+        if profile is not None:
+            profile.items("持仓股初始化", time.perf_counter() - start)
+        return stock
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stock-init") as executor:
+        holding_list = list(executor.map(build, holding_codes))
     return holding_list, holding_codes
 
-def is_market_open():
+def create_data_provider(args=None):
     """
-    判断是否在交易时段内(包括盘前竞价)
+    --source auto(默认)：adata 为首选数据源；akshare 可用时与其组合为 CompositeProvider，
+    实时行情对冲请求、取最快的有效结果，任一数据源故障时自动切换。
+    --source adata / akshare 只使用(也只导入)这一个数据源，启动更快。
+    指定 --replay 时改用本地回放数据源，按虚拟时间运行
     """
-    now = datetime.now()
-    current_time = now.time()
-
-    morning_open = dtime(9, 30)
-    morning_close = dtime(11, 30)
-    afternoon_open = dtime(13, 0)
-    afternoon_close = dtime(15, 0)
-    pre_market_open = dtime(9, 15)  # 盘前竞价开始时间
-
-    # 获取当前年份的交易日历
-    year = now.year
-    trade_calendar = adata.stock.info.trade_calendar(year=year)
-    trade_dates = trade_calendar['trade_date'].astype(str).tolist()
-
-    # 当前日期
-    current_date = now.strftime("%Y-%m-%d")
-
-    # 如果当前日期不是交易日，返回 False
-    if current_date not in trade_dates:
-        return False
-
-    # 盘前竞价
-    if pre_market_open <= current_time <= morning_open:
-        return True
-    # 上午时段
-    if morning_open <= current_time <= morning_close:
-        return True
-    # 下午时段
-    if afternoon_open <= current_time <= afternoon_close:
-        return True
-    # 在盘前竞价和交易时段内
-    if pre_market_open <= current_time <= afternoon_close:
-        return True
-
-    return True
+    if args is not None and args.replay is not None:
+        return create_provider("replay", replay_date=args.replay or None, speed=args.speed, tick_log=args.tick_log)
+    source = args.source if args is not None else "auto"
+    if source != "auto":
+        return create_provider(source)
+    names = [name for name in ("adata", "akshare") if is_available(name)]
+    if "akshare" not in names:
+        logger.warning("未安装 akshare，仅使用 adata 数据源")
+    providers = [create_provider(name) for name in names or ["adata"]]
+    if len(providers) == 1:
+        return providers[0]
+    from MA5Observer.data_provider.composite_provider import CompositeProvider
+    return CompositeProvider(providers)
+
+
+def create_dispatcher(args):
+    """按 --notify / --webhook 组装通知发送目标"""
+    names = [name.strip() for name in args.notify.split(",") if name.strip()]
+    sinks = []
+    if "desktop" in names:
+        sinks.append(DesktopSink())
+    if "console" in names:
+        sinks.append(ConsoleSink())
+    if "file" in names:
+        sinks.append(FileSink(args.notify_file))
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+    return NotificationDispatcher(sinks, window=args.notify_window, repeat_interval=args.notify_repeat)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MA5 观察程序")
+    parser.add_argument("--replay", nargs="?", const="", default=None, metavar="DATE",
+                        help="使用 data/ 下的历史数据回放指定交易日(YYYY-MM-DD)，默认最后一个交易日")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    parser.add_argument("--source", default="auto",
+                        choices=["auto"] + [name for name in PROVIDERS if name != "replay"],
+                        help="实时数据源，auto 为 adata 与 akshare(已安装时)组合")
+    parser.add_argument("--tick-log", default=None, help="回放录制的 tick 日志，而不是由日K线合成盘中价格")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在该端口提供 Prometheus 格式的耗时统计(/metrics)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="观察列表很大时按股票代码分片到多个工作进程计算，协调进程只请求一次行情")
+    parser.add_argument("--notify", default="desktop",
+                        help="通知发送目标，逗号分隔：desktop console file(提醒总会写入日志，console 只在需要单独输出时使用)")
+    parser.add_argument("--notify-file", default="alerts.jsonl", help="file 目标写入的文件")
+    parser.add_argument("--webhook", default=None, help="同时把通知 POST 到该 URL")
+    parser.add_argument("--notify-window", type=float, default=1.0,
+                        help="合并窗口(秒)，窗口内的多条提醒合并为一条通知")
+    parser.add_argument("--notify-repeat", type=float, default=60.0,
+                        help="同一股票同一信号的最短重复通知间隔(秒)，0 表示不限制")
+    parser.add_argument("--no-record", action="store_true",
+                        help="不录制行情快照(默认录制到 cache/ticks/<交易日>/，回放时不录制)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="输出启动耗时报告：各个包的导入耗时、数据源与参考数据加载、逐只持仓股初始化、到首个快照的时间")
+    return parser.parse_args()
 
 
 def main():
+    startup.mark("导入模块")
+    args = parse_args()
+    # Set up logging
+    configure_logging(LOG_HANDLERS)
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        logger.info(f"耗时统计: http://127.0.0.1:{args.metrics_port}/metrics")
+
+    # 所有模块共用一个数据提供者，交易日历和代码表只加载一次
+    with startup.stage("数据源初始化"):
+        data_provider = create_data_provider(args)
+    # 先加载交易日历，持仓股并发初始化时只读取
+    with startup.stage("交易日历"):
+        data_provider.get_yesterday_trade_date()
+    # 启动后修改 holding.txt / observe.txt 会被自动发现，只为新增的代码加载数据
+    watcher = WatchlistWatcher("holding.txt", "observe.txt")
     observe_codes = read_observed_stocks("observe.txt")
-    holding_stocks,holding_codes  = read_holding_stocks("holding.txt")
-
-    data_provider = AdataProvider()
     tolerance = 0.03
-    strategy = PriceRangeStrategy(tolerance=tolerance)
-    notifier = Notifier()
-
-    historical_data_dict = {}
-    last_alert_time = {}  # 用于记录最后提醒的时间
-
-    # Set up logging
-    logger.remove()  # Remove the default logger
-    logger.add("app.log", rotation="1 week", level="DEBUG", retention="10 days")  # Log to file
-    logger.add(sys.stdout, level="INFO")  # Print log to stdout for important info
-
-    # 获取今天的日期，再获取今天日期往前4天的交易日期
-    today = datetime.now().strftime("%Y-%m-%d")
-    trade_calendar = adata.stock.info.trade_calendar(year=int(today[:4]))
-    # 只取交易日的日期'trade_status'==1
-    trade_dates = trade_calendar[trade_calendar["trade_status"] == 1]["trade_date"].astype(str).tolist()
-    today_index = trade_dates.index(today)
-    last_4_trade_dates = trade_dates[today_index - 4:today_index]
-
-
-    for code in observe_codes:
-        df = data_provider.get_history_k_data(code)
-        df = df.tail(30).reset_index(drop=True)
+    # 盘中崩溃重启后从检查点恢复当日 tick 与提醒时间；回放不使用检查点
+    checkpoint_dir = None if args.replay is not None else DEFAULT_CHECKPOINT_DIR
+    # 回放时触发价格表只在内存中使用，不写入 cache/triggers(回放日期不是实盘的交易日)
+    trigger_dir = None if args.replay is not None else DEFAULT_TRIGGER_DIR
+
+    if args.workers > 1:
+        # 持仓股在各工作进程中构造，协调进程只需要代码
+        holding_codes = read_observed_stocks("holding.txt")
+        with startup.stage("启动工作进程"):
+            observer = ShardedObserver(data_provider, partial(create_data_provider, args), holding_codes,
+                                       observe_codes, tolerance=tolerance, workers=args.workers,
+                                       checkpoint_dir=checkpoint_dir, trigger_dir=trigger_dir,
+                                       log_handlers=LOG_HANDLERS)
+    else:
+        with startup.stage("持仓股初始化"):
+            holding_stocks, holding_codes = read_holding_stocks("holding.txt", data_provider, profile=startup)
+        with startup.stage("观察者初始化"):
+            observer = StockObserver(data_provider, holding_stocks, observe_codes, tolerance=tolerance,
+                                     checkpoint_dir=checkpoint_dir, trigger_dir=trigger_dir)
+    logger.info("历史数据准备完毕。开始进入观察模式...")
 
-        df = df.sort_values("trade_date")
-        last_4_close = df[df["trade_date"].isin(last_4_trade_dates)]["close"].tolist()
+    # 轮询到的快照压缩录制，盘后可用 tick_recorder.read_ticks 分析或 --tick-log cache/ticks/<交易日> 回放
+    recorder = None if args.replay is not None or args.no_record else TickRecorder(DEFAULT_TICK_DIR)
 
-        historical_data_dict[code] = last_4_close
-
-    logger.info("历史数据准备完毕。开始进入观察模式...")
+    # 行情、信号计算、通知发送、交易时段切换各自为独立的 asyncio 任务
+    dispatcher = create_dispatcher(args)
+    ready = time.perf_counter()
+    on_first_tick = None
+    if args.profile_startup:
+        logger.info(startup.report())
 
+        def on_first_tick():
+            logger.info(f"启动后 {startup.elapsed():.3f}s 处理完首个快照(进入调度后 {time.perf_counter() - ready:.3f}s)")
+    scheduler = ObserverScheduler(observer, dispatcher, watcher=watcher, recorder=recorder,
+                                  on_first_tick=on_first_tick)
     try:
-        while True:
-            if is_market_open():
-                #卖点监控
-                holding_df = data_provider.get_realtime(holding_codes)
-                for stock in holding_stocks:  # 遍历持仓股进行卖点监控
-                    stock.update_current(holding_df[holding_df["stock_code"] == stock.stock_code])
-                    # current_price = stock.current_price
-                    sell_flag,sell_msg =  stock.check_sell_conditions()
-                    # 检查卖点条件
-                    if sell_flag:
-                        # 卖出提醒
-                        logger.info(
-                            f"[SELL ALERT] {stock.stock_code} {stock.stock_name} 满足卖点条件, 当前价格: {current_price}, 卖出信号{sell_msg}")
-                        msg_title = f"股票 {stock.stock_name} 卖出提醒"
-                        msg_body = f"当前价: {current_price:.2f}, 卖出信号: {sell_msg}"
-                        threading.Thread(
-                            target=notifier.send_notification,
-                            args=(msg_title, msg_body)
-                        ).start()
-
-
-                # 买点监控
-                for code in observe_codes:
-                    current_price, stock_name = data_provider.get_realtime_price(code)
-                    if current_price is None:
-                        continue
-
-                    last_4_close = historical_data_dict[code]
-                    data_for_ma5 = last_4_close + [current_price]
-
-                    if len(data_for_ma5) < 5:
-                        continue
-
-                    ma5 = strategy.calc_ma5(data_for_ma5)
-                    if strategy.is_in_range(current_price, ma5):
-                        # 检查是否是5分钟内的重复提醒
-                        current_time = datetime.now()
-                        if code not in last_alert_time or (current_time - last_alert_time[code]).seconds > 10:
-                            # 计算价格距离MA5的百分比
-                            distance = (current_price - ma5) / current_price * 100
-
-                            logger.info(f"[ALERT] {code} {stock_name} 价格 {current_price:.2f} 距MA5 {distance:.2f}% 已进入区间 [{ma5:.2f}, {ma5 * (1+tolerance) :.2f}]")
-                            msg_title = f"股票 {stock_name} 触发策略"
-                            msg_body = f"当前价: {current_price:.2f}, MA5区间: [{ma5:.2f}, {ma5 * (1+tolerance):.2f}]"
-                            # logger.info(f"[ALERT] {msg_title} - {msg_body}")
-                            threading.Thread(
-                                target=notifier.send_notification,
-                                args=(msg_title, msg_body)
-                            ).start()
-                            last_alert_time[code] = current_time  # 更新最后提醒时间
-                    else:
-                        # 如果价格走出区间，移除提醒记录
-                        if code in last_alert_time:
-                            del last_alert_time[code]
-
-                    logger.debug(f"{datetime.now()} - {code} current: {current_price:.2f} - MA5: {ma5:.2f}")
-
-                time.sleep(1)
-            else:
-                # 非交易时间，计算最近5天的MA5
-                logger.info("现在不在交易时段，等待中...")
-                for code in observe_codes:
-                    # 获取过去5天的历史数据进行MA5计算
-                    df = data_provider.get_history_k_data(code)
-
-                    df = df.tail(5).reset_index(drop=True)
-                    df = df.sort_values("trade_date")
-                    close_list = df["close"].tolist()
-
-                    if len(close_list) >= 5:
-                        ma5 = strategy.calc_ma5(close_list)
-
-                        # 截取传入最近4天的收盘价，计算开盘价目标区间
-                        open_price = strategy.calc_open_price(close_list[:-1])
-                        logger.info(f"{code} - 非交易时间计算 MA5: {ma5:.2f} - 开盘价大于MA5的最低价格: {open_price:.2f}")
-                    else:
-                        logger.warning(f"{code} - 数据不足，无法计算MA5")
-                # 输出持仓股的今天最低价、最高价、开盘价、5日均线
-                for stock in holding_stocks:
-                    stock.update_current(data_provider.get_realtime(stock.stock_code))
-                    # 获取stock.k_day,再用昨日时间筛选获取昨日k线数据,来获取昨日最高价、最低价、开盘价
-                    yesterday_data = stock.k_day[stock.k_day["trade_date"] == stock.yesterday].iloc[0]
-                    highest_price_yesterday = yesterday_data["high"]
-                    open_price_yesterday = yesterday_data["open"]
-                    lowest_price_yesterday = yesterday_data["low"]
-                    logger.info(
-                        f"{stock.stock_code} {stock.stock_name} 昨日最高价: {highest_price_yesterday:.2f}, 昨日最低价: {lowest_price_yesterday:.2f}, 昨日开盘价: {open_price_yesterday:.2f}, 5日均线: {stock.ma5:.2f}")
-
-                # 根据交易时间判断到下一次交易日需要睡眠的大概时间，等待到下一个交易时间段
-                now = datetime.now()
-                current_time = now.time()
-                morning_open = dtime(9, 30)
-                afternoon_open = dtime(13, 0)
-                if current_time < morning_open:
-                    next_trade_time = datetime(now.year, now.month, now.day, 9, 30)
-                elif current_time < afternoon_open:
-                    next_trade_time = datetime(now.year, now.month, now.day, 13, 0)
-                else:
-                    next_trade_time = datetime(now.year, now.month, now.day, 9, 30) + timedelta(days=1)
-                sleep_seconds = (next_trade_time - now).seconds
-                logger.info(f"等待到下一个交易时间段，大约需要睡眠 {sleep_seconds} 秒")
-                time.sleep(sleep_seconds-1)
-
+        asyncio.run(scheduler.run())
     except KeyboardInterrupt:
         logger.info("\n手动结束观察。")
+    finally:
+        observer.close()
+        dispatcher.close()
+        if recorder is not None:
+            recorder.close()
 
 
 if __name__ == "__main__":
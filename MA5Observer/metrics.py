@@ -0,0 +1,223 @@
+# metrics.py
+"""
+进程内的轻量耗时统计：
+  - span(name, **labels)：计时上下文管理器，耗时计入对应的直方图，抛出异常时另计错误次数
+  - 直方图使用固定分桶(与 Prometheus 一致)，记录一次只有一次二分查找加一次加锁，常开的开销可以忽略
+  - 导出方式：render_prometheus() 生成 Prometheus 文本格式(可用 start_http_server 暴露 /metrics)，
+    summary() 生成一行摘要(自上次摘要以来的增量)供调度器定期写入日志
+"""
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 耗时分桶上界(秒)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def quantile(buckets, counts, q, maximum=None):
+    """由分桶计数按线性插值估算分位数；maximum 为已知的最大值，用于限定结果的上界"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(counts):
+        if seen + n >= rank and n:
+            lower = buckets[i - 1] if i > 0 else 0.0
+            upper = buckets[i] if i < len(buckets) else (maximum or buckets[-1])
+            value = lower + (upper - lower) * (rank - seen) / n
+            return min(value, maximum) if maximum else value
+        seen += n
+    return maximum or buckets[-1]
+
+
+class Histogram:
+    """固定分桶直方图，counts[i] 为落在 (buckets[i-1], buckets[i]] 的次数，最后一个为超出最大分桶的次数"""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按分桶线性插值估算分位数"""
+        return quantile(self.buckets, self.counts, q, self.max)
+
+
+class _Span:
+    """MetricsRegistry.span 返回的计时上下文(用类而不是生成器，减少每次计时的开销)"""
+
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry = self.registry
+        registry._observe_key((self.name, self.labels), time.perf_counter() - self.start)
+        if exc_type is not None:
+            registry._inc_key((self.name.replace("_seconds", "") + "_errors_total", self.labels), 1)
+        return False
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    直方图与计数器的注册表，键为 (指标名, 排序后的标签元组)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._last_summary = ({}, {})  # 上次 summary() 时的数据，用于计算增量
+
+    def _observe_key(self, key, value):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def _inc_key(self, key, value):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """记录一次耗时(秒)"""
+        self._observe_key((name, tuple(sorted(labels.items()))), value)
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        self._inc_key((name, tuple(sorted(labels.items()))), value)
+
+    def span(self, name, **labels):
+        """
+        计时 with 块，耗时计入 name 直方图；块内抛出异常时 name 去掉 _seconds 后缀加 _errors_total 计数
+        """
+        return _Span(self, name, tuple(sorted(labels.items())))
+
+    def timed(self, name, **labels):
+        """函数装饰器版本的 span"""
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._last_summary = ({}, {})
+
+    def _snapshot(self):
+        """加锁复制当前数据，导出时不阻塞记录"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.count, h.sum, h.max) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        return histograms, counters
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        histograms, counters = self._snapshot()
+        lines = []
+        typed = set()
+        for (name, labels), (counts, count, total, _) in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        一行摘要，只统计自上次调用 summary() 以来的增量：
+        每个直方图的 次数 / p50 / p99(毫秒)，以及有增加的计数器
+        """
+        histograms, counters = self._snapshot()
+        last_histograms, last_counters = self._last_summary
+        self._last_summary = (histograms, counters)
+        parts = []
+        for key, (counts, count, _, _) in sorted(histograms.items()):
+            name, labels = key
+            if key in last_histograms:
+                counts = [a - b for a, b in zip(counts, last_histograms[key][0])]
+                count -= last_histograms[key][1]
+            if not count:
+                continue
+            label = ",".join(str(v) for _, v in labels)
+            parts.append(f"{name.replace('_seconds', '')}[{label}] n={count} "
+                         f"p50={quantile(self.buckets, counts, 0.5) * 1000:.1f}ms "
+                         f"p99={quantile(self.buckets, counts, 0.99) * 1000:.1f}ms")
+        for key, value in sorted(counters.items()):
+            value -= last_counters.get(key, 0)
+            if value:
+                label = ",".join(str(v) for _, v in key[1])
+                parts.append(f"{key[0]}[{label}]={value}")
+        return "; ".join(parts)
+
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
+
+
+def start_http_server(port, registry=metrics, host="127.0.0.1"):
+    """在后台线程中启动 HTTP 服务，GET /metrics 返回 Prometheus 文本格式，返回 server(可调用 shutdown())"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -1,7 +1,18 @@
 # notifier.py
+import json
 import platform
-import os
-import asyncio
+import queue
+import subprocess
+import threading
+import time
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from loguru import logger
+
+from MA5Observer.metrics import metrics
 
 # 同时引入 toast 和 toast_async
 try:
@@ -10,6 +21,10 @@ except ImportError:
     toast = None
     toast_async = None
 
+# 一条待发送的提醒：股票代码、信号名称(用于去重/合并)、通知标题与内容
+Alert = namedtuple("Alert", ["stock_code", "signal", "title", "message"])
+
+
 class Notifier:
     """
     根据系统平台选择不同的通知方法:
@@ -49,11 +64,201 @@ class Notifier:
     def _mac_notify(self, title, message):
         """
         通过 AppleScript 的方式发送 Mac OS 通知。
-        也可以用 pync 等第三方库，这里只演示系统自带命令。
+        标题与内容作为 osascript 的参数传入脚本，不经过 shell，也不需要转义引号
+        """
+        script = ["on run argv", "display notification (item 2 of argv) with title (item 1 of argv)", "end run"]
+        args = ["osascript"]
+        for line in script:
+            args += ["-e", line]
+        subprocess.run(args + [title, message], check=False, timeout=10,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# ---------------------------
+# 通知发送目标：send(title, message, alerts)，alerts 为合并前的 Alert 列表
+# ---------------------------
+class DesktopSink:
+    """系统通知(Notifier)"""
+
+    name = "desktop"
+
+    def __init__(self, notifier=None):
+        self.notifier = notifier or Notifier()
+
+    def send(self, title, message, alerts):
+        self.notifier.send_notification(title, message)
+
+
+class ConsoleSink:
+    """写入日志"""
+
+    name = "console"
+
+    def send(self, title, message, alerts):
+        logger.info(f"[NOTIFY] {title} : {message}")
+
+
+class FileSink:
+    """每条提醒一行 JSON 追加到文件"""
+
+    name = "file"
+
+    def __init__(self, path="alerts.jsonl"):
+        self.path = path
+
+    def send(self, title, message, alerts):
+        now = datetime.now().isoformat(timespec="seconds")
+        lines = [json.dumps({"time": now, **alert._asdict()}, ensure_ascii=False) for alert in alerts]
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+class WebhookSink:
+    """POST JSON {title, message, alerts} 到 url"""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, message, alerts):
+        body = json.dumps({"title": title, "message": message, "alerts": [a._asdict() for a in alerts]},
+                          ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class NotificationDispatcher:
+    """
+    非阻塞的通知分发：
+      - submit() 只把提醒放入有界队列，队列满时丢弃
+      - 合并线程每隔 window 秒取出这段时间内的全部提醒：同一股票同一信号只保留最后一条，
+        多条时合并为一条汇总通知；同一股票同一信号 repeat_interval 秒内只发送一次
+        (信号引擎在价格停留在区间内时每隔几秒就会重复提醒，弹窗不必跟着重复)
+      - 每批通知交给固定数量的发送线程，逐个 sink 发送，慢的 sink(弹窗、webhook)不影响提醒的收集
+      - 每个 sink 同时最多一批在发送：发送未完成时到达的批次合并为一批等待，发送完成后立即发出，
+        等待发送的提醒数不会随 sink 变慢而无限增长
+    无论提醒多密集，占用的线程数固定为 1 + workers，同时运行的通知子进程不超过 workers 个。
+    """
+
+    def __init__(self, sinks=None, window=1.0, repeat_interval=60.0, queue_size=256, workers=2, max_lines=5):
+        """
+        :param sinks: 发送目标列表，默认 [DesktopSink()]
+        :param window: 合并窗口(秒)
+        :param repeat_interval: 同一股票同一信号的最短重复发送间隔(秒)，0 表示不限制
+        :param queue_size: 待合并提醒的队列容量
+        :param workers: 发送线程数
+        :param max_lines: 汇总通知中列出的提醒条数，其余只计数
         """
-        # 注意转义特殊字符
-        cmd = f"osascript -e 'display notification \"{message}\" with title \"{title}\"'"
-        os.system(cmd)
+        self.sinks = list(sinks) if sinks is not None else [DesktopSink()]
+        self.window = window
+        self.repeat_interval = repeat_interval
+        self.max_lines = max_lines
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last_sent = {}  # (股票代码, 信号) -> 上次发送的时间
+        self._sink_lock = threading.Lock()
+        self._busy = set()  # 正在发送的 sink 序号
+        self._waiting = {}  # sink 序号 -> 发送未完成期间到达、等待发送的提醒
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify")
+        self._thread = threading.Thread(target=self._run, name="notify-coalesce", daemon=True)
+        self._thread.start()
+
+    def submit(self, alert):
+        """提醒放入队列(不阻塞)，队列已满时丢弃并返回 False"""
+        try:
+            self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            metrics.inc("notify_dropped_total")
+            logger.warning(f"通知队列已满，丢弃提醒: {alert.title}")
+            return False
+
+    def close(self):
+        """发送队列中剩余的提醒，等待发送完成"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                break
+            batch = [alert]
+            deadline = time.monotonic() + self.window
+            closing = False
+            while True:
+                try:
+                    alert = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if alert is None:
+                    closing = True
+                    break
+                batch.append(alert)
+            self._dispatch(batch)
+            if closing:
+                break
+
+    def _dispatch(self, batch):
+        """去重、合并后交给发送线程"""
+        now = time.monotonic()
+        latest = {}
+        for alert in batch:
+            latest[(alert.stock_code, alert.signal)] = alert
+        alerts = []
+        for key, alert in latest.items():
+            if self.repeat_interval > 0:
+                last = self._last_sent.get(key)
+                if last is not None and now - last < self.repeat_interval:
+                    continue
+                self._last_sent[key] = now
+            alerts.append(alert)
+        metrics.inc("notify_suppressed_total", len(batch) - len(alerts))
+        if not alerts:
+            return
+        metrics.inc("notify_coalesced_total", len(alerts) - 1)
+        for i in range(len(self.sinks)):
+            with self._sink_lock:
+                if i in self._busy:
+                    # 上一批尚未发完，与等待中的提醒合并，同一股票同一信号保留最新一条
+                    metrics.inc("notify_deferred_total", len(alerts), sink=self.sinks[i].name)
+                    waiting = self._waiting.setdefault(i, {})
+                    for alert in alerts:
+                        waiting[(alert.stock_code, alert.signal)] = alert
+                    continue
+                self._busy.add(i)
+            self._executor.submit(self._send, i, alerts)
+
+    def _summary(self, alerts):
+        """一批提醒的通知标题与内容，多条时合并为汇总"""
+        if len(alerts) == 1:
+            return alerts[0].title, alerts[0].message
+        title = f"{len(alerts)} 条股票提醒"
+        lines = [f"{alert.title}: {alert.message}" for alert in alerts[:self.max_lines]]
+        if len(alerts) > self.max_lines:
+            lines.append(f"... 另有 {len(alerts) - self.max_lines} 条")
+        return title, "\n".join(lines)
+
+    def _send(self, i, alerts):
+        """向第 i 个 sink 发送一批提醒，随后发送期间合并等待的批次，直到没有等待的提醒"""
+        sink = self.sinks[i]
+        while True:
+            title, message = self._summary(alerts)
+            try:
+                with metrics.span("notify_seconds", sink=sink.name):
+                    sink.send(title, message, alerts)
+            except Exception as e:
+                logger.warning(f"发送通知失败({sink.name}): {e}")
+            with self._sink_lock:
+                waiting = self._waiting.pop(i, None)
+                if not waiting:
+                    self._busy.discard(i)
+                    return
+            alerts = list(waiting.values())
 
 
 # 以下为简单测试
@@ -0,0 +1,276 @@
+# observer.py
+import numpy as np
+from loguru import logger
+
+from MA5Observer.Stock import Stock
+from MA5Observer.bar_aggregator import BarAggregator
+from MA5Observer.checkpoint import SessionCheckpoint
+from MA5Observer.metrics import metrics
+from MA5Observer.notifier import Alert
+from MA5Observer.signal_engine import SellSignalEngine, BandSignalEngine
+from MA5Observer.strategy import PriceRangeStrategy
+from MA5Observer.trigger_table import build_trigger_table, load_trigger_table, save_trigger_table, session_date
+
+
+class StockObserver:
+    """
+    盘中观察逻辑(不含调度)：
+      - 持仓股：更新 tick 与均线状态，计算卖点
+      - 观察股：计算 MA5 区间买点
+    每个 tick 由调度器传入一次实时行情快照，返回需要发送的提醒列表。
+    非交易时间计算下一交易日的触发价格表(trigger_table)，开盘时载入信号引擎；指定 trigger_dir 时同时保存，
+    启动时已有当天的触发价格表则直接使用，不再逐只请求观察股的日K线。
+    持仓/观察列表变更时分两步增量更新：prepare_watchlist 在工作线程中只为新增代码准备数据，
+    apply_watchlist 在两个 tick 之间替换信号引擎，保留仍在列表中的股票的状态。
+    指定 checkpoint_dir 时启动时从当日检查点恢复 tick 与提醒时间，之后由调度器定期调用 save_checkpoint 追加增量。
+    每个快照同时更新全部观察代码的 1/5/15 分钟K线(self.bars)，收盘时收尾。
+    """
+
+    def __init__(self, data_provider, holding_stocks, observe_codes, tolerance=0.03, part="observer",
+                 checkpoint_dir=None, trigger_dir=None):
+        """
+        :param part: 触发价格表与检查点的分区名，多进程分片时每个分片各用一个
+        :param checkpoint_dir: 检查点目录，为 None 时不保存也不恢复(回放、基准测试)
+        :param trigger_dir: 触发价格表目录，为 None 时不读取也不保存(回放、基准测试)，算好的表只在内存中等待开盘载入
+        """
+        self.data_provider = data_provider
+        self.tolerance = tolerance
+        self.strategy = PriceRangeStrategy(tolerance=tolerance)
+        self.holding_stocks = list(holding_stocks)
+        self.observe_codes = list(observe_codes)
+        self.part = part
+        self.checkpoint_dir = checkpoint_dir
+        self.trigger_dir = trigger_dir
+        # 当前 tick 与检查点所属的交易日；交易日历中没有下一个交易日时为 None(不载入触发价格表、不使用检查点)
+        self.trade_date = session_date(data_provider)
+        # 持仓股上一次写入的 价格/成交量，未变化的持仓不再调用 update_current(TickBuffer 本来也不会记录)
+        self._holding_quotes = np.full((len(self.holding_stocks), 2), np.nan)
+        self._pending_triggers = None  # 非交易时间算好、等待下一交易日开盘载入的触发价格表
+
+        self.build_engines()
+        self.bars = BarAggregator(self.watch_codes)
+
+        self.checkpoint = None
+        if checkpoint_dir is not None and self.trade_date is not None:
+            self.checkpoint = SessionCheckpoint(self.trade_date, part, checkpoint_dir)
+            self.restore_checkpoint()
+
+    def build_engines(self):
+        """按当前交易日(有触发价格表时直接使用，否则读取观察股最近4个收盘价)创建持仓卖点与观察股买点的向量化计算引擎"""
+        triggers = self.load_triggers(self.trade_date)
+        missing = [code for code in self.observe_codes if triggers is None or code not in triggers.index]
+        self.historical_data_dict = self.load_last_4_close(missing)
+        self.sell_engine = SellSignalEngine(self.holding_stocks)
+        self.band_engine = BandSignalEngine({code: self.historical_data_dict.get(code, [])
+                                             for code in self.observe_codes}, tolerance=self.tolerance)
+        if triggers is not None:
+            self.apply_triggers(triggers)
+
+    def load_triggers(self, trade_date):
+        """读取 trade_date 已保存的触发价格表，没有保存过或不保存触发价格表时返回 None"""
+        if self.trigger_dir is None or trade_date is None:
+            return None
+        return load_trigger_table(trade_date, self.tolerance, self.trigger_dir)
+
+    @property
+    def holding_codes(self):
+        return [stock.stock_code for stock in self.holding_stocks]
+
+    @property
+    def watch_codes(self):
+        """持仓股与观察股合并去重，作为每个tick的快照请求列表"""
+        return list(dict.fromkeys(self.holding_codes + self.observe_codes))
+
+    def load_last_4_close(self, codes):
+        """获取每只观察股最近4个交易日的收盘价 {股票代码: [收盘价...]}"""
+        # 获取今天日期往前4天的交易日期
+        last_4_trade_dates = self.data_provider.get_recent_trade_dates(4)
+        historical_data_dict = {}
+        for code in codes:
+            df = self.data_provider.get_history_k_data(code)
+            df = df.tail(30).reset_index(drop=True)
+
+            df = df.sort_values("trade_date")
+            historical_data_dict[code] = df[df["trade_date"].isin(last_4_trade_dates)]["close"].tolist()
+        return historical_data_dict
+
+    def prepare_watchlist(self, holding_codes, observe_codes):
+        """
+        为新的持仓/观察列表准备数据(可在工作线程中调用，不修改当前状态)：
+        只为新增的持仓构造 Stock，只为新增的观察股读取最近4个收盘价(当天有触发价格表时直接使用)，
+        返回交给 apply_watchlist 的 (持仓 Stock 列表, 观察代码列表, {新增观察股: 收盘价列表}, 触发价格表)
+        """
+        current = {stock.stock_code: stock for stock in self.holding_stocks}
+        holding_stocks = [current.get(code) or Stock(stock_code=code, data_provider=self.data_provider, is_held=True)
+                          for code in dict.fromkeys(holding_codes)]
+        observe_codes = list(dict.fromkeys(observe_codes))
+        current_observe = set(self.observe_codes)
+        added = [code for code in observe_codes if code not in current_observe]
+        triggers = self.load_triggers(session_date(self.data_provider)) if added else None
+        missing = [code for code in added if triggers is None or code not in triggers.index]
+        return holding_stocks, observe_codes, self.load_last_4_close(missing), triggers
+
+    def apply_watchlist(self, prepared):
+        """
+        替换为 prepare_watchlist 准备好的列表(在调度器的事件循环中、两个 tick 之间调用，只做内存操作)：
+        重建信号引擎，仍在列表中的股票沿用原有阈值、卖点冷却与区间提醒时间，被移除的股票状态随旧引擎丢弃
+        """
+        holding_stocks, observe_codes, closes, triggers = prepared
+        sell_engine = SellSignalEngine(holding_stocks)
+        sell_engine.carry_over(self.sell_engine)
+        band_engine = BandSignalEngine({code: self.historical_data_dict.get(code, closes.get(code, []))
+                                        for code in observe_codes}, tolerance=self.tolerance)
+        if triggers is not None:
+            band_engine.load_triggers(triggers)
+        band_engine.carry_over(self.band_engine)
+        self.historical_data_dict = {code: self.historical_data_dict.get(code, closes.get(code, []))
+                                     for code in observe_codes}
+        self.holding_stocks = holding_stocks
+        self.observe_codes = observe_codes
+        self.sell_engine = sell_engine
+        self.band_engine = band_engine
+        bars = BarAggregator(self.watch_codes, periods=tuple(self.bars.periods), keep=self.bars.keep)
+        bars.carry_over(self.bars)
+        self.bars = bars
+        self._holding_quotes = np.full((len(holding_stocks), 2), np.nan)
+        logger.info(f"观察列表已更新: 持仓 {len(holding_stocks)} 只, 观察 {len(observe_codes)} 只")
+
+    def apply_triggers(self, table):
+        """把触发价格表(以 stock_code 为索引)载入卖点与买点引擎"""
+        self.sell_engine.load_triggers(table)
+        self.band_engine.load_triggers(table)
+        logger.debug(f"已载入 {len(table)} 只股票的触发价格")
+
+    def set_market_open(self, is_open):
+        """
+        交易时段开始/结束时由调度器调用，持仓股只在交易时段内记录 tick；
+        开盘时若有为当天算好的触发价格表则载入，首个 tick 直接与阈值比较；休市/收盘时未完成的K线收盘。
+        跨交易日后的首次开盘先换日(start_new_day)：均线与昨日数据前移、重建信号引擎，检查点切换到新交易日的日志
+        """
+        if not is_open:
+            self.bars.flush()
+        elif session_date(self.data_provider) != self.trade_date:
+            self.start_new_day(session_date(self.data_provider))
+        for stock in self.holding_stocks:
+            stock.isOpened = is_open
+        self._holding_quotes[:] = np.nan
+        pending = self._pending_triggers
+        if is_open and pending is not None:
+            if (pending["trade_date"] == self.data_provider.clock.now().strftime("%Y-%m-%d")).all():
+                self.apply_triggers(pending)
+            self._pending_triggers = None
+
+    def on_snapshot(self, snapshot):
+        """
+        处理一个 tick 的实时行情快照(以 stock_code 为索引)，返回需要发送的提醒列表
+        """
+        alerts = []
+        now = self.data_provider.clock.time()
+
+        #卖点监控：先更新价格或成交量有变化的持仓股的tick与均线状态，再计算越过阈值的持仓的卖点
+        with metrics.span("tick_stage_seconds", stage="update_holdings"):
+            quotes = snapshot[["price", "volume"]].reindex(self.holding_codes).to_numpy(dtype=np.float64)
+            changed = np.flatnonzero(~np.isnan(quotes[:, 0]) & ~(quotes == self._holding_quotes).all(axis=1))
+            for i in changed.tolist():
+                stock = self.holding_stocks[i]
+                stock.update_current(snapshot.loc[stock.stock_code])
+            self._holding_quotes[changed] = quotes[changed]
+        with metrics.span("tick_stage_seconds", stage="sell_signals"):
+            sell_rows = self.sell_engine.evaluate(snapshot, now)
+        for row in sell_rows.itertuples(index=False):
+            # 卖出提醒
+            logger.info(
+                f"[SELL ALERT] {row.stock_code} {row.short_name} 满足卖点条件, 当前价格: {row.price}, 卖出信号{row.message}")
+            alerts.append(Alert(row.stock_code, row.signal, f"股票 {row.short_name} 卖出提醒",
+                                f"当前价: {row.price:.2f}, 卖出信号: {row.message}"))
+
+        # 买点监控：一次性计算全部观察股的MA5区间，只处理需要提醒的行(同一只股票10秒内不重复提醒)
+        with metrics.span("tick_stage_seconds", stage="band_signals"):
+            band_rows = self.band_engine.evaluate(snapshot, now)
+        for row in band_rows.itertuples(index=False):
+            # 计算价格距离MA5的百分比
+            distance = (row.price - row.ma5) / row.price * 100
+
+            logger.info(f"[ALERT] {row.stock_code} {row.short_name} 价格 {row.price:.2f} 距MA5 {distance:.2f}% 已进入区间 [{row.ma5:.2f}, {row.upper:.2f}]")
+            alerts.append(Alert(row.stock_code, "ma5_band", f"股票 {row.short_name} 触发策略",
+                                f"当前价: {row.price:.2f}, MA5区间: [{row.ma5:.2f}, {row.upper:.2f}]"))
+
+        with metrics.span("tick_stage_seconds", stage="bars"):
+            self.bars.update(snapshot, now)
+
+        logger.debug(f"快照 {len(snapshot)} 只, 持仓 {len(self.holding_stocks)} 只, 观察 {len(self.observe_codes)} 只, 提醒 {len(alerts)} 条")
+        return alerts
+
+    def start_new_day(self, trade_date):
+        """
+        换日：上一交易日的检查点写完后关闭；持仓股的均线状态与昨日开高低收前移到新交易日(并清空 tick)，
+        按新的昨日数据与最近4个收盘价重建信号引擎和K线；打开(并恢复)新交易日的检查点
+        """
+        logger.info(f"交易日由 {self.trade_date} 切换到 {trade_date}")
+        if self.checkpoint is not None:
+            self.save_checkpoint()
+            self.checkpoint.close()
+        for stock in self.holding_stocks:
+            stock.start_new_day(trade_date)
+        self.trade_date = trade_date
+        self.build_engines()
+        self.bars = BarAggregator(self.watch_codes, periods=tuple(self.bars.periods), keep=self.bars.keep)
+        if self.checkpoint_dir is not None:
+            self.checkpoint = SessionCheckpoint(trade_date, self.part, self.checkpoint_dir)
+            self.restore_checkpoint()
+
+    def restore_checkpoint(self):
+        """从当日检查点恢复持仓股的 tick 与卖点冷却时间、观察股的区间提醒时间"""
+        ticks, sell_times, band_alert = self.checkpoint.load()
+        for stock in self.holding_stocks:
+            if stock.stock_code in ticks:
+                stock.restore_ticks(ticks[stock.stock_code])
+            if stock.stock_code in sell_times:
+                # signal_times 是卖点引擎 last_times 的视图，原地赋值
+                stock.signal_times[:] = sell_times[stock.stock_code]
+        for i, code in enumerate(self.band_engine.codes):
+            if code in band_alert:
+                self.band_engine.last_alert[i] = band_alert[code]
+        self.checkpoint.mark_written(ticks, sell_times, band_alert)
+        if ticks or sell_times or band_alert:
+            logger.info(f"已从检查点恢复 {len(ticks)} 只股票的 tick、{len(sell_times) + len(band_alert)} 个提醒时间")
+
+    def save_checkpoint(self):
+        """把自上次以来新增的 tick 与变化的提醒时间追加到检查点(调度器在两个 tick 之间调用)"""
+        if self.checkpoint is None:
+            return
+        with metrics.span("checkpoint_seconds"):
+            self.checkpoint.write(self.holding_stocks, self.band_engine.codes, self.band_engine.last_alert)
+
+    def close(self):
+        """写入最后一次检查点并关闭"""
+        if self.checkpoint is not None:
+            self.save_checkpoint()
+            self.checkpoint.close()
+
+    def off_hours_report(self):
+        """
+        非交易时间：计算并保存下一交易日的触发价格表，
+        输出观察股的MA5与目标开盘价、持仓股的昨日高开低与5日均线
+        """
+        trade_date = session_date(self.data_provider)
+        if trade_date is None:
+            logger.warning("交易日历中没有下一个交易日，不计算触发价格表")
+        else:
+            table = build_trigger_table(self.data_provider, self.watch_codes, trade_date, self.tolerance)
+            if self.trigger_dir is not None:
+                save_trigger_table(table, trade_date, self.part, self.trigger_dir)
+            self._pending_triggers = table.set_index("stock_code")
+            for code in self.observe_codes:
+                if code in self._pending_triggers.index:
+                    row = self._pending_triggers.loc[code]
+                    logger.info(f"{code} - 非交易时间计算 MA5: {row.ma5:.2f} - {trade_date} 开盘价大于MA5的最低价格: "
+                                f"{row.breakeven:.2f}, 区间上沿: {row.band_upper:.2f}")
+                else:
+                    logger.warning(f"{code} - 数据不足，无法计算MA5")
+        # 输出持仓股的昨日最低价、最高价、开盘价、5日均线
+        for stock in self.holding_stocks:
+            ma5 = stock.ma5
+            ma5_text = f"{ma5:.2f}" if ma5 is not None else "数据不足"
+            logger.info(
+                f"{stock.stock_code} {stock.stock_name} 昨日最高价: {stock.highest_price_yesterday:.2f}, 昨日最低价: {stock.lowest_price_yesterday:.2f}, 昨日开盘价: {stock.open_price_yesterday:.2f}, 5日均线: {ma5_text}")
@@ -0,0 +1,214 @@
+# scheduler.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from MA5Observer.clock import VirtualClock
+from MA5Observer.metrics import metrics
+
+# 交易日历中没有下一个交易日时(下一年日历尚未发布)重新查询的间隔(秒，实际时间)
+CALENDAR_RETRY_SECONDS = 3600
+
+
+class ObserverScheduler:
+    """
+    基于 asyncio 的观察调度核心，各环节为独立任务，互不阻塞：
+      - 交易时段任务：按交易日历计算时段开始/结束时间并定时切换，休市时执行一次非交易时间报告；
+        交易日历中没有下一个交易日时，回放(虚拟时钟)结束运行，实盘每隔一段时间重新查询
+      - 行情任务：交易时段内按固定节拍(绝对时间对齐，不随处理耗时漂移)发起快照请求，
+        请求在线程池中执行，慢请求不会推迟下一拍；同时在途的请求数有上限，过期的快照直接丢弃
+      - 信号任务：只处理最新的一份快照，计算出的提醒交给 NotificationDispatcher(有界队列，满时丢弃并告警)，
+        由它的固定线程合并、去重后发送，慢通知不阻塞事件循环
+      - 统计任务：每隔 metrics_interval 秒把各环节的耗时统计(metrics.summary)写入日志
+      - 列表任务：每隔 watch_interval 秒检查持仓/观察列表文件，变更时在线程池中为新增代码准备数据，
+        再在两个 tick 之间替换观察者的列表，不中断行情与信号任务
+      - 检查点任务：交易时段内每隔 checkpoint_interval 秒把观察者的盘中状态增量写入检查点
+      - 指定 recorder 时每份取到的快照交给 TickRecorder 录制(只入队，压缩与写入在录制器的后台线程中)
+    """
+
+    def __init__(self, observer, dispatcher, interval=1.0, max_inflight_fetches=2, metrics_interval=60.0,
+                 watcher=None, watch_interval=2.0, checkpoint_interval=5.0, recorder=None, on_first_tick=None):
+        """
+        :param observer: StockObserver
+        :param dispatcher: NotificationDispatcher
+        :param interval: 行情节拍(秒，按数据提供者的时钟计，回放时实际间隔为 interval / 倍速)
+        :param max_inflight_fetches: 同时在途的快照请求上限
+        :param metrics_interval: 耗时统计写入日志的间隔(秒，实际时间)，为 0 时不输出
+        :param watcher: WatchlistWatcher，为 None 时不检查列表文件
+        :param watch_interval: 检查列表文件的间隔(秒，实际时间)
+        :param checkpoint_interval: 写检查点的间隔(秒，实际时间)，为 0 时不写
+        :param recorder: TickRecorder，为 None 时不录制行情
+        :param on_first_tick: 处理完第一份快照后调用一次(启动耗时分析)
+        """
+        self.observer = observer
+        self.data_provider = observer.data_provider
+        self.clock = self.data_provider.clock
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self.max_inflight_fetches = max_inflight_fetches
+        self.metrics_interval = metrics_interval
+        self.watcher = watcher
+        self.watch_interval = watch_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.recorder = recorder
+        self.on_first_tick = on_first_tick
+        # 行情请求、交易日历计算与列表更新专用线程池，与通知发送线程分开
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight_fetches + 2, thread_name_prefix="fetch")
+        self._inflight = 0
+        self._fetch_tasks = set()  # 在途的快照请求任务(事件循环只保留弱引用，需在此持有)
+        self._latest_seq = 0  # 最近发起的快照请求序号
+        self._delivered_seq = 0  # 最近交给信号任务的快照序号
+        self._session_started = False  # 交易时段任务是否已完成首次判断
+
+    async def _call(self, func, *args):
+        """在专用线程池中执行阻塞调用"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def run(self):
+        """启动全部任务，直到被取消或回放结束"""
+        self._market_open = asyncio.Event()
+        self._snapshots = asyncio.Queue(maxsize=1)
+        tasks = [asyncio.create_task(self._session_loop(), name="session"),
+                 asyncio.create_task(self._fetch_loop(), name="fetch"),
+                 asyncio.create_task(self._evaluate_loop(), name="evaluate")]
+        if self.metrics_interval:
+            tasks.append(asyncio.create_task(self._metrics_loop(), name="metrics"))
+        if self.watcher is not None:
+            tasks.append(asyncio.create_task(self._watch_loop(), name="watchlist"))
+        if self.checkpoint_interval:
+            tasks.append(asyncio.create_task(self._checkpoint_loop(), name="checkpoint"))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # 任务异常时抛出
+        finally:
+            for task in tasks + list(self._fetch_tasks):
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _session_loop(self):
+        """按交易日历在交易时段开始/结束时切换状态"""
+        while True:
+            if await self._call(self.data_provider.is_market_open):
+                if not self._market_open.is_set():
+                    logger.info("进入交易时段，开始观察...")
+                    self.observer.set_market_open(True)
+                    self._market_open.set()
+                wake_at = self.data_provider.current_session_end()
+            else:
+                if self._market_open.is_set() or not self._session_started:
+                    self._market_open.clear()
+                    self.observer.set_market_open(False)
+                    logger.info("现在不在交易时段，等待中...")
+                    await self._call(self.observer.off_hours_report)
+                wake_at = await self._call(self.data_provider.next_market_open)
+                if wake_at is None:
+                    if isinstance(self.clock, VirtualClock):
+                        logger.info("回放数据中没有下一个交易日，回放结束")
+                        return
+                    logger.warning(f"交易日历中没有下一个交易日，{CALENDAR_RETRY_SECONDS}s 后重新查询")
+                    self._session_started = True
+                    await asyncio.sleep(CALENDAR_RETRY_SECONDS)
+                    continue
+                logger.info(f"等待到下一个交易时段 {wake_at:%Y-%m-%d %H:%M}")
+            self._session_started = True
+            # 在边界时刻稍后醒来(时段结束时间本身仍算交易时段)
+            await asyncio.sleep(self.clock.to_real(max((wake_at - self.clock.now()).total_seconds() + 0.1, 0.5)))
+
+    async def _fetch_loop(self):
+        """交易时段内按固定节拍发起快照请求"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            if not self._market_open.is_set():
+                await self._market_open.wait()
+                next_tick = loop.time()
+            if self._inflight < self.max_inflight_fetches:
+                self._latest_seq += 1
+                task = asyncio.create_task(self._fetch(self._latest_seq))
+                self._fetch_tasks.add(task)
+                task.add_done_callback(self._fetch_tasks.discard)
+            else:
+                metrics.inc("snapshot_skipped_total")
+                logger.warning(f"已有 {self._inflight} 个快照请求未返回，跳过本次节拍")
+            next_tick += self.clock.to_real(self.interval)
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # 落后超过一拍时重新对齐，不补发积压的节拍
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, seq):
+        self._inflight += 1
+        try:
+            with metrics.span("snapshot_fetch_seconds"):
+                snapshot = await self._call(self.data_provider.get_realtime_snapshot, self.observer.watch_codes)
+        except Exception as e:
+            logger.warning(f"获取实时行情快照失败: {e}")
+            return
+        finally:
+            self._inflight -= 1
+        if self.recorder is not None:
+            self.recorder.record(snapshot, self.clock.time())
+        if seq < self._delivered_seq:
+            metrics.inc("snapshot_stale_total")
+            return  # 比已处理的快照更旧
+        self._delivered_seq = seq
+        if self._snapshots.full():
+            metrics.inc("snapshot_stale_total")
+            self._snapshots.get_nowait()  # 信号计算跟不上时只保留最新快照
+        self._snapshots.put_nowait(snapshot)
+
+    async def _evaluate_loop(self):
+        """计算信号并把提醒交给通知分发"""
+        while True:
+            snapshot = await self._snapshots.get()
+            try:
+                with metrics.span("tick_seconds"):
+                    if getattr(self.observer, "blocking", False):
+                        # 分片观察要等待工作进程的结果，放到线程池中，不阻塞行情等其他任务
+                        alerts = await self._call(self.observer.on_snapshot, snapshot)
+                    else:
+                        alerts = self.observer.on_snapshot(snapshot)
+            except Exception as e:
+                logger.exception(f"信号计算失败: {e}")
+                continue
+            for alert in alerts:
+                self.dispatcher.submit(alert)
+            if self.on_first_tick is not None:
+                callback, self.on_first_tick = self.on_first_tick, None
+                callback()
+
+    async def _metrics_loop(self):
+        """定期把耗时统计写入日志"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            summary = metrics.summary()
+            if summary:
+                logger.info(f"[METRICS] {summary}")
+
+    async def _watch_loop(self):
+        """列表文件变更时增量更新观察者：数据准备在线程池中进行，替换在事件循环中进行(与信号计算互斥)"""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                codes = await self._call(self.watcher.poll)
+                if codes is None:
+                    continue
+                with metrics.span("watchlist_reload_seconds"):
+                    prepared = await self._call(self.observer.prepare_watchlist, *codes)
+                    self.observer.apply_watchlist(prepared)
+            except Exception as e:
+                logger.exception(f"更新观察列表失败: {e}")
+
+    async def _checkpoint_loop(self):
+        """交易时段内定期写检查点(增量很小，直接在事件循环中写入，与信号计算互斥)"""
+        while True:
+            await self._market_open.wait()
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                self.observer.save_checkpoint()
+            except Exception as e:
+                logger.warning(f"写检查点失败: {e}")
@@ -0,0 +1,141 @@
+# screener.py
+"""
+全市场 MA5 区间选股：不依赖 observe.txt，每轮用一次全市场实时快照找出所有落入 MA5 区间的股票。
+  - 启动时从本地日K线(history_data 的 mmap 二进制格式)向量化算出每只股票前4个交易日的收盘价之和 S4，
+    数据不全或不是最新的股票剔除；不再逐只请求历史K线
+  - 区间判断与 PriceRangeStrategy.is_in_range 相同，换算为价格阈值 [S4 / 4, S4 * (1 + t) / (4 - t)]
+    (见 signal_engine.band_thresholds)，每轮只是一次数组比较
+  - 数据源为 akshare 时 get_realtime_snapshot 来自一次 stock_zh_a_spot_em 全市场请求(带缓存与代码索引)
+
+用法：
+    python -m MA5Observer.screener --interval 3
+    python -m MA5Observer.screener --replay 2024-12-27 --passes 5
+"""
+import argparse
+import time
+from datetime import datetime, time as dtime
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from MA5Observer.data_provider import create_provider, is_available
+from MA5Observer.history_data import load_history
+from MA5Observer.signal_engine import band_thresholds
+from MA5Observer.trigger_table import session_date
+
+
+def last4_sums(history, before, latest=None):
+    """
+    每只股票在 before(不含)之前最近4根日K线的收盘价之和
+    :param history: HistoryArrays，各股票内按日期升序
+    :param before: 交易日 YYYY-MM-DD
+    :param latest: 最近一根K线必须是这一天(before 的上一个交易日)，否则视为数据不是最新，结果为 nan
+    :return: 与 history.codes 对齐的 S4 数组，不足4根的为 nan
+    """
+    dates = history.columns["trade_date"]
+    close = history.columns["close"]
+    # 日期升序，before 之前的K线是每只股票的前缀，用累计和求每只股票满足条件的条数
+    cumulative = np.concatenate(([0], np.cumsum(dates < np.datetime64(before, "D"))))
+    count = cumulative[history.offsets[1:]] - cumulative[history.offsets[:-1]]
+    end = history.offsets[:-1] + count
+    s4 = np.full(len(history), np.nan)
+    ok = count >= 4
+    if latest is not None:
+        ok &= dates[np.maximum(end - 1, 0)] == np.datetime64(latest, "D")
+    rows = end[ok]
+    s4[ok] = close[rows - 4] + close[rows - 3] + close[rows - 2] + close[rows - 1]
+    return s4
+
+
+class MarketScreener:
+    """
+    全市场 MA5 区间扫描。scan() 返回当前位于区间内的全部股票，entered 列标记本轮新进入区间的股票
+    """
+
+    def __init__(self, data_provider, history=None, tolerance=0.03, trade_date=None):
+        """
+        :param history: HistoryArrays，默认加载 data/ 下的全部历史数据
+        :param trade_date: 扫描的交易日，默认当前(或下一个)交易时段所在的交易日
+        """
+        self.data_provider = data_provider
+        self.tolerance = tolerance
+        self.trade_date = trade_date or session_date(data_provider)
+        if self.trade_date is None:
+            raise ValueError("交易日历中没有下一个交易日，请用 trade_date 指定扫描的交易日")
+        history = history if history is not None else load_history()
+        previous = data_provider.get_recent_trade_dates(1, before=self.trade_date)
+        s4 = last4_sums(history, self.trade_date, previous[-1] if previous else None)
+        valid = ~np.isnan(s4)
+        self.codes = [code for code, ok in zip(history.codes, valid) if ok]
+        self.last4_sum = s4[valid]
+        self.lower, self.upper = band_thresholds(self.last4_sum, tolerance)
+        self.in_band = np.zeros(len(self.codes), dtype=bool)
+        logger.info(f"{self.trade_date} 可扫描 {len(self.codes)} 只股票(共 {len(history)} 只，"
+                    f"{len(history) - len(self.codes)} 只历史数据不足或不是最新)")
+
+    def scan(self, snapshot=None):
+        """
+        扫描一轮：snapshot 为以 stock_code 为索引的实时行情快照，默认向数据提供者请求全部可扫描的股票
+        :return: DataFrame stock_code short_name price ma5 upper distance_pct entered，按距 MA5 由近到远排序
+        """
+        if snapshot is None:
+            snapshot = self.data_provider.get_realtime_snapshot(self.codes)
+        positions = snapshot.index.get_indexer(self.codes)
+        found = positions >= 0
+        price = np.full(len(self.codes), np.nan)
+        price[found] = snapshot["price"].to_numpy(dtype=np.float64)[positions[found]]
+        in_band = (price >= self.lower) & (price <= self.upper)
+        entered = in_band & ~self.in_band
+        self.in_band = in_band
+
+        rows = np.flatnonzero(in_band)
+        ma5 = (self.last4_sum[rows] + price[rows]) / 5
+        result = pd.DataFrame({
+            "stock_code": [self.codes[i] for i in rows],
+            "short_name": snapshot["short_name"].to_numpy()[positions[rows]],
+            "price": price[rows],
+            "ma5": ma5,
+            "upper": ma5 * (1 + self.tolerance),
+            "distance_pct": (price[rows] - ma5) / price[rows] * 100,
+            "entered": entered[rows],
+        })
+        return result.sort_values("distance_pct", kind="stable").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全市场 MA5 区间选股")
+    parser.add_argument("--tolerance", type=float, default=0.03, help="MA5 区间上沿比例")
+    parser.add_argument("--interval", type=float, default=3.0, help="每轮扫描间隔(秒)")
+    parser.add_argument("--passes", type=int, default=0, help="扫描轮数，0 表示一直运行")
+    parser.add_argument("--replay", nargs="?", const="", default=None, metavar="DATE",
+                        help="用 data/ 下的历史数据回放指定交易日，默认最后一个交易日")
+    args = parser.parse_args()
+
+    history = load_history()
+    if args.replay is not None:
+        provider = create_provider("replay", replay_date=args.replay or None, history=history, speed=0)
+        provider.clock.set(datetime.combine(provider.clock.now().date(), dtime(9, 30)))
+    else:
+        provider = create_provider("akshare" if is_available("akshare") else "adata")
+
+    screener = MarketScreener(provider, history, tolerance=args.tolerance)
+    done = 0
+    while not args.passes or done < args.passes:
+        start = time.perf_counter()
+        result = screener.scan()
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"{provider.clock.now():%H:%M:%S} 区间内 {len(result)} 只, 新进入 {int(result['entered'].sum())} 只, "
+                    f"耗时 {elapsed:.1f}ms")
+        for row in result[result["entered"]].itertuples(index=False):
+            logger.info(f"[SCREEN] {row.stock_code} {row.short_name} 价格 {row.price:.2f} 距MA5 {row.distance_pct:.2f}% "
+                        f"已进入区间 [{row.ma5:.2f}, {row.upper:.2f}]")
+        done += 1
+        if args.replay is not None:
+            provider.clock.advance(args.interval)
+        else:
+            time.sleep(max(args.interval - elapsed / 1000, 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+# sharded_observer.py
+"""
+多进程分片观察(全市场等超大观察列表)：
+  - 股票代码按 crc32 分到 N 个工作进程，每个进程各自持有分到的 Stock、均线状态与信号引擎(一个 StockObserver)
+  - 协调进程(ObserverScheduler 所在进程)只请求一次实时行情快照，把价格等数值列写入共享内存，
+    再通知各工作进程处理本分片；工作进程直接从共享内存读取，不经过进程间序列化
+  - 各进程返回的提醒在协调进程合并后原样返回；重复提醒的抑制由各分片的信号引擎负责
+  - 列表变更时协调进程按新的代码列表创建新的共享内存，各工作进程在后台线程中为本分片新增的代码准备数据，
+    准备好后在两个 tick 之间替换(StockObserver.prepare_watchlist / apply_watchlist)
+
+ShardedObserver 与 StockObserver 接口相同，可直接交给 ObserverScheduler 调度；
+on_snapshot 会等待各工作进程的结果，调度器在线程池中调用(blocking = True)，不阻塞事件循环。
+"""
+import multiprocessing as mp
+import queue
+import signal
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from MA5Observer.clock import VirtualClock
+from MA5Observer.metrics import metrics
+from MA5Observer.notifier import Alert
+
+# 共享内存中每只股票的数值列，顺序即列序
+SHARED_COLUMNS = ("price", "change", "change_pct", "volume", "amount")
+# 共享内存头部：快照序号、快照时间戳
+_HEADER_SIZE = 2
+
+
+def shard_of(code, n_shards):
+    """股票代码所属分片(与进程、Python 版本无关的稳定哈希)"""
+    return zlib.crc32(code.encode("ascii")) % n_shards
+
+
+class SharedSnapshot:
+    """
+    共享内存中的行情快照：float64 头部[序号, 时间戳] + (股票数 x 列数) 的数值矩阵。
+    行号由固定的代码列表决定，协调进程创建，工作进程按名称挂载。
+    """
+
+    def __init__(self, codes, name=None):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        size = 8 * (_HEADER_SIZE + len(self.codes) * len(SHARED_COLUMNS))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 8))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((_HEADER_SIZE,), dtype=np.float64, buffer=self.shm.buf)
+        self.values = np.ndarray((len(self.codes), len(SHARED_COLUMNS)), dtype=np.float64,
+                                 buffer=self.shm.buf, offset=8 * _HEADER_SIZE)
+        if self.owner:
+            self.header[:] = 0
+            self.values[:] = np.nan
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, snapshot, seq, timestamp):
+        """
+        写入一份快照(以 stock_code 为索引)，不在快照中的股票为 nan。
+        写入期间序号置为 -1，读取方据此(及前后两次序号是否一致)识别写了一半的数据
+        """
+        frame = snapshot.reindex(self.codes)
+        self.header[0] = -1
+        for j, column in enumerate(SHARED_COLUMNS):
+            if column in frame.columns:
+                self.values[:, j] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                self.values[:, j] = np.nan
+        self.header[0] = seq
+        self.header[1] = timestamp
+
+    def rows(self, codes):
+        """codes 在共享内存中的行号，不在其中的代码为 -1"""
+        return np.array([self.index.get(code, -1) for code in codes], dtype=np.int64)
+
+    def read(self, rows):
+        """
+        读取 rows 行(-1 行为 nan)，返回 (序号, 时间戳, 数值矩阵副本)；
+        复制期间协调进程正在写入或写入了新的快照时序号返回 -1
+        """
+        seq, timestamp = int(self.header[0]), float(self.header[1])
+        values = self.values[rows]
+        values[rows < 0] = np.nan
+        if int(self.header[0]) != seq:
+            return -1, timestamp, values
+        return seq, timestamp, values
+
+    def close(self):
+        # 先释放 numpy 视图，否则关闭共享内存时会报 BufferError
+        self.header = self.values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _sync_clock(clock, timestamp):
+    """回放时让工作进程的虚拟时钟与协调进程一致"""
+    if isinstance(clock, VirtualClock):
+        clock.set(datetime.fromtimestamp(timestamp))
+
+
+def configure_logging(handlers):
+    """
+    按 [(sink, add 的参数)] 配置 loguru，sink 为 "stdout" / "stderr" 时输出到标准输出 / 标准错误。
+    主进程与工作进程使用同一份配置(spawn 启动的工作进程不继承主进程的 loguru 配置)
+    """
+    logger.remove()
+    for sink, options in handlers:
+        logger.add({"stdout": sys.stdout, "stderr": sys.stderr}.get(sink, sink), **options)
+
+
+def _worker_main(shard, provider_factory, holding_codes, observe_codes, tolerance, checkpoint_dir, trigger_dir,
+                 shm_name, shared_codes, names, commands, results, log_handlers=None):
+    """
+    工作进程入口：按 log_handlers 配置日志，构造本分片的 StockObserver，按命令处理快照
+    命令：("tick", 序号) / ("open", 是否开市) / ("report",) / ("checkpoint",) / ("stop",)
+         ("watchlist", 共享内存名, 共享代码列表, 持仓代码, 观察代码, {代码: 名称})
+    返回：初始化 ("ready", 分片) / ("error", 分片, 信息)；
+         每个 tick 命令都回复一条带序号的结果 ("alerts", 分片, 序号, [Alert...], 耗时) /
+         ("skipped", 分片, 序号)(共享内存已被更新的快照覆盖) / ("error", 分片, 序号, 信息)；
+         其他命令只在失败时回复 ("failed", 分片, 命令, 信息)，协调进程不把它计为 tick 的结果
+    """
+    from MA5Observer.Stock import Stock
+    from MA5Observer.observer import StockObserver
+
+    # Ctrl+C 只由主进程处理，工作进程收到 stop 命令后写完检查点再退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if log_handlers is not None:
+        # 日志文件的轮转与清理只由主进程负责，避免多个进程同时轮转同一个文件
+        configure_logging([(sink, {k: v for k, v in options.items() if k not in ("rotation", "retention")})
+                           for sink, options in log_handlers])
+    shared = None
+    try:
+        provider = provider_factory()
+        stocks = [Stock(stock_code=code, data_provider=provider, is_held=True) for code in holding_codes]
+        observer = StockObserver(provider, stocks, observe_codes, tolerance=tolerance, part=f"shard-{shard}",
+                                 checkpoint_dir=checkpoint_dir, trigger_dir=trigger_dir)
+        shared = SharedSnapshot(shared_codes, name=shm_name)
+        codes = observer.watch_codes
+        rows = shared.rows(codes)
+        short_names = [names.get(code) for code in codes]
+        results.put(("ready", shard))
+    except Exception as e:
+        results.put(("error", shard, f"初始化失败: {e}"))
+        return
+
+    # 列表变更时在后台线程中准备新增代码的数据，不阻塞本分片的 tick
+    preparer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"watchlist-{shard}")
+    prepared = None
+    while True:
+        command = commands.get()
+        if command[0] == "stop":
+            break
+        try:
+            if prepared is not None and prepared.done():
+                future, prepared = prepared, None
+                observer.apply_watchlist(future.result())
+                codes = observer.watch_codes
+                rows = shared.rows(codes)
+                short_names = [names.get(code) for code in codes]
+            if command[0] == "open":
+                observer.set_market_open(command[1])
+            elif command[0] == "report":
+                observer.off_hours_report()
+            elif command[0] == "checkpoint":
+                observer.save_checkpoint()
+            elif command[0] == "watchlist":
+                _, shm_name, shared_codes, holding_codes, observe_codes, new_names = command
+                shared.close()
+                shared = SharedSnapshot(shared_codes, name=shm_name)
+                rows = shared.rows(codes)
+                names.update(new_names)
+                prepared = preparer.submit(observer.prepare_watchlist, holding_codes, observe_codes)
+            elif command[0] == "tick":
+                start = time.perf_counter()
+                seq, timestamp, values = shared.read(rows)
+                if seq != command[1]:
+                    # 共享内存已被更新的快照覆盖(或正在写入)，跳过过期的 tick
+                    results.put(("skipped", shard, command[1]))
+                    continue
+                _sync_clock(provider.clock, timestamp)
+                valid = ~np.isnan(values[:, 0])
+                snapshot = pd.DataFrame(values[valid], columns=SHARED_COLUMNS,
+                                        index=pd.Index([c for c, ok in zip(codes, valid) if ok], name="stock_code"))
+                snapshot.insert(0, "short_name", [n for n, ok in zip(short_names, valid) if ok])
+                alerts = observer.on_snapshot(snapshot)
+                results.put(("alerts", shard, seq, [tuple(a) for a in alerts], time.perf_counter() - start))
+        except Exception as e:
+            if command[0] == "tick":
+                results.put(("error", shard, command[1], str(e)))
+            else:
+                results.put(("failed", shard, command[0], str(e)))
+    preparer.shutdown(wait=False, cancel_futures=True)
+    observer.close()
+    shared.close()
+
+
+class ShardedObserver:
+    """
+    多进程分片观察的协调者，接口与 StockObserver 相同
+    (watch_codes / set_market_open / on_snapshot / off_hours_report / prepare_watchlist / apply_watchlist /
+     save_checkpoint / close)
+    """
+
+    # on_snapshot 会阻塞等待工作进程，调度器应在线程池中调用
+    blocking = True
+
+    def __init__(self, data_provider, provider_factory, holding_codes, observe_codes, tolerance=0.03,
+                 workers=None, tick_timeout=5.0, mp_context="spawn", checkpoint_dir=None, trigger_dir=None,
+                 log_handlers=None):
+        """
+        :param data_provider: 协调进程使用的数据提供者(请求快照、交易日历、时钟)
+        :param provider_factory: 可 pickle 的无参可调用对象，在每个工作进程中创建数据提供者
+        :param workers: 工作进程数，默认 CPU 核数
+        :param tick_timeout: 等待各工作进程处理完一个 tick 的最长时间(秒)，超时的结果在下一个 tick 合并
+        :param checkpoint_dir: 检查点目录，各工作进程分别保存、启动时合并恢复
+        :param trigger_dir: 触发价格表目录，各工作进程分别保存自己的分区；为 None 时不读取也不保存
+        :param log_handlers: 工作进程的日志配置 [(sink, logger.add 的参数)]，见 configure_logging
+        """
+        self.data_provider = data_provider
+        self.holding_codes = list(dict.fromkeys(holding_codes))
+        self.observe_codes = list(dict.fromkeys(observe_codes))
+        self.watch_codes = list(dict.fromkeys(self.holding_codes + self.observe_codes))
+        self.tolerance = tolerance
+        self.tick_timeout = tick_timeout
+        self.n_workers = max(1, min(workers or mp.cpu_count() or 1, len(self.watch_codes) or 1))
+        self._seq = 0
+        # on_snapshot 在线程池中执行，写共享内存与替换共享内存(apply_watchlist)互斥
+        self._publish_lock = threading.Lock()
+
+        self.shared = SharedSnapshot(self.watch_codes)
+        self.names = {code: data_provider.get_stock_name(code) for code in self.watch_codes}
+        context = mp.get_context(mp_context)
+        self._results = context.Queue()
+        self._commands = []
+        self._processes = []
+        for shard in range(self.n_workers):
+            holdings, observes = self._shard_codes(shard, self.holding_codes, self.observe_codes)
+            commands = context.Queue()
+            process = context.Process(
+                target=_worker_main, name=f"observer-shard-{shard}", daemon=True,
+                args=(shard, provider_factory, holdings, observes, tolerance, checkpoint_dir, trigger_dir,
+                      self.shared.name, self.watch_codes, {c: self.names[c] for c in holdings + observes}, commands,
+                      self._results, log_handlers))
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+
+        ready = 0
+        while ready < self.n_workers:
+            message = self._results.get()
+            if message[0] == "error":
+                self.close()
+                raise RuntimeError(f"分片 {message[1]} {message[2]}")
+            ready += 1
+        logger.info(f"{self.n_workers} 个工作进程已就绪，共 {len(self.watch_codes)} 只股票")
+
+    def _shard_codes(self, shard, holding_codes, observe_codes):
+        """分到 shard 的 (持仓代码, 观察代码)"""
+        return ([c for c in holding_codes if shard_of(c, self.n_workers) == shard],
+                [c for c in observe_codes if shard_of(c, self.n_workers) == shard])
+
+    def prepare_watchlist(self, holding_codes, observe_codes):
+        """为新的列表创建共享内存并查询新增代码的名称(可在工作线程中调用)，返回交给 apply_watchlist 的数据"""
+        holding_codes = list(dict.fromkeys(holding_codes))
+        observe_codes = list(dict.fromkeys(observe_codes))
+        watch_codes = list(dict.fromkeys(holding_codes + observe_codes))
+        names = {code: self.names.get(code) or self.data_provider.get_stock_name(code) for code in watch_codes}
+        return holding_codes, observe_codes, watch_codes, names, SharedSnapshot(watch_codes)
+
+    def apply_watchlist(self, prepared):
+        """切换到新的共享内存并把各分片的新列表发给工作进程，工作进程在后台准备好后自行替换"""
+        holding_codes, observe_codes, watch_codes, names, shared = prepared
+        with self._publish_lock:
+            old = self.shared
+            self.holding_codes, self.observe_codes, self.watch_codes = holding_codes, observe_codes, watch_codes
+            self.shared = shared
+            for shard, commands in enumerate(self._commands):
+                holdings, observes = self._shard_codes(shard, holding_codes, observe_codes)
+                commands.put(("watchlist", shared.name, watch_codes, holdings, observes,
+                              {c: names[c] for c in holdings + observes if c not in self.names}))
+            self.names = names
+        # 工作进程已映射的旧共享内存在其关闭前仍然有效，这里只删除名称
+        old.close()
+
+    def _broadcast(self, command):
+        for commands in self._commands:
+            commands.put(command)
+
+    def set_market_open(self, is_open):
+        self._broadcast(("open", is_open))
+
+    def off_hours_report(self):
+        self._broadcast(("report",))
+
+    def save_checkpoint(self):
+        self._broadcast(("checkpoint",))
+
+    def on_snapshot(self, snapshot):
+        """
+        把快照写入共享内存并通知所有工作进程，等待本 tick 的结果(最多 tick_timeout 秒)，返回合并后的提醒
+        """
+        with self._publish_lock:
+            self._seq += 1
+            current = self._seq
+            now = self.data_provider.clock.time()
+            self.shared.publish(snapshot, current, now)
+            self._broadcast(("tick", current))
+
+        # 按序号匹配回复：每个分片对本 tick 回复一次；更早 tick 的迟到提醒一并合并
+        alerts = []
+        waiting = set(range(self.n_workers))
+        deadline = time.monotonic() + self.tick_timeout
+        while waiting:
+            try:
+                message = self._results.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                logger.warning(f"{len(waiting)} 个工作进程未在 {self.tick_timeout}s 内处理完快照 {current}")
+                break
+            kind, shard = message[0], message[1]
+            if kind == "failed":
+                logger.warning(f"分片 {shard} 执行 {message[2]} 失败: {message[3]}")
+                continue
+            seq = message[2]
+            if kind == "alerts":
+                metrics.observe("shard_tick_seconds", message[4], shard=shard)
+                alerts.extend(Alert(*a) for a in message[3])
+            elif kind == "skipped":
+                metrics.inc("shard_tick_skipped_total", shard=shard)
+            elif kind == "error":
+                logger.warning(f"分片 {shard} 处理快照 {seq} 失败: {message[3]}")
+            if seq == current:
+                waiting.discard(shard)
+        return alerts
+
+    def close(self):
+        """通知工作进程退出并释放共享内存"""
+        self._broadcast(("stop",))
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.shared.close()
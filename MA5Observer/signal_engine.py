@@ -0,0 +1,290 @@
+# signal_engine.py
+"""
+整个持仓/观察列表的向量化信号计算。
+每个 tick 把实时行情快照按代码对齐成数组，一次 NumPy 运算算出所有股票的卖点和 MA5 区间信号，只返回触发的行。
+MA5 区间和"跌破5日均线"都可以换算成只与最近4个收盘价之和 S4 有关的价格阈值(见 band_thresholds)，
+阈值在构造时(或由 trigger_table 载入时)算好，盘中每个 tick 只做价格与阈值数组的比较。
+ThresholdIndex 记录每只股票上一次的价格与各判断条件，价格没有变化的股票不重新判断，
+条件没有翻转且不处于触发状态的股票不进入规则计算，每个 tick 的计算量与价格越过阈值的股票数成正比。
+Stock.check_sell_conditions 使用同一套卖点判断的标量版本(first_sell_signal)；band_thresholds 是
+PriceRangeStrategy.is_in_range 的 [MA5, MA5 * (1 + t)] 区间以当前价代入 MA5 后的等价换算。
+"""
+import heapq
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+# 卖点名称与提示文案，顺序即判断优先级：同一只股票同时满足多个卖点时只提示排在前面且不在冷却期内的那个
+SELL_SIGNALS = (
+    ("highest_price_break", "突破上一日最高价"),
+    ("open_price_break", "突破上一日开盘价"),
+    ("lowest_price_break", "开盘价跌破上一日最低价，同时跌破5日均线，坚决卖出"),
+    ("ma5_break", "盘中跌破5日均线，同时跌破上一日最低价，坚决卖出"),
+)
+
+
+def sell_conditions(price, high, open_price, low, ma5):
+    """各卖点的价格条件(不含冷却)，形状 (N, 4) 的布尔数组，顺序同 SELL_SIGNALS；任一输入缺失的行全为 False"""
+    valid = ~(np.isnan(price) | np.isnan(ma5) | np.isnan(high) | np.isnan(open_price) | np.isnan(low))
+    below = (price < low) & (price < ma5)
+    return np.column_stack((price > high, price > open_price, below, below)) & valid[:, None]
+
+
+def evaluate_sell_signals(price, high, open_price, low, ma5, last_times, now, interval):
+    """
+    计算一组股票的卖点信号
+    :param price, high, open_price, low, ma5: 形状 (N,) 的数组，缺失值为 nan
+    :param last_times: 形状 (N, 4) 的各卖点上次触发时间戳，触发的卖点会被原地更新为 now
+    :param now: 当前时间戳(秒)
+    :param interval: 同一卖点的最小提醒间隔(秒)，标量或形状 (N,) 的数组
+    :return: (触发行号, 触发的卖点序号) 两个数组
+    """
+    conditions = sell_conditions(price, high, open_price, low, ma5)
+    cooled = (now - last_times) > np.reshape(interval, (-1, 1))
+    ready = conditions & cooled
+    rows = np.flatnonzero(ready.any(axis=1))
+    which = ready[rows].argmax(axis=1)
+    last_times[rows, which] = now
+    return rows, which
+
+
+def first_sell_signal(price, high, open_price, low, ma5, last_times, now, interval):
+    """
+    单只股票的卖点信号，与 evaluate_sell_signals 的一行等价(逐只调用时不必构造数组)
+    :param last_times: 长度 4 的各卖点上次触发时间戳，触发的卖点会被原地更新为 now
+    :return: 触发的卖点序号，没有触发时为 None
+    """
+    if any(math.isnan(x) for x in (price, high, open_price, low, ma5)):
+        return None
+    below = price < low and price < ma5
+    for i, condition in enumerate((price > high, price > open_price, below, below)):
+        if condition and now - last_times[i] > interval:
+            last_times[i] = now
+            return i
+    return None
+
+
+def band_thresholds(last4_sum, tolerance):
+    """
+    把 MA5 区间换算为价格阈值(以当前价 p 作为当日收盘价，MA5 = (S4 + p) / 5)：
+      p >= MA5                  <=>  p >= S4 / 4                       (盈亏平衡价，也是跌破5日均线的临界价)
+      p <= MA5 * (1 + t)        <=>  p <= S4 * (1 + t) / (4 - t)       (区间上沿)
+    :return: (下沿数组, 上沿数组)
+    """
+    last4_sum = np.asarray(last4_sum, dtype=np.float64)
+    return last4_sum / 4, last4_sum * (1 + tolerance) / (4 - tolerance)
+
+
+def _snapshot_prices(snapshot, codes):
+    """按 codes 顺序从快照中取出价格数组，缺失的代码为 nan"""
+    return snapshot["price"].reindex(codes).to_numpy(dtype=np.float64)
+
+
+def common_rows(codes, previous_codes):
+    """两个代码列表中共有代码的行号：(在 codes 中的行号, 在 previous_codes 中的行号)"""
+    previous = {code: i for i, code in enumerate(previous_codes)}
+    pairs = [(i, previous[code]) for i, code in enumerate(codes) if code in previous]
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    new, old = zip(*pairs)
+    return np.array(new, dtype=np.int64), np.array(old, dtype=np.int64)
+
+
+class ThresholdIndex:
+    """
+    价格越过阈值的增量检测。
+    每只股票保存上一次的价格与各判断条件(价格与昨日高开低、MA5 临界价、区间上下沿的比较结果)：
+      - 与上一个快照相比价格没变的股票不重新判断条件
+      - 价格变化的股票只重新判断条件，条件有翻转(越过了某个阈值)才进入规则计算
+      - 仍有条件成立的股票(armed)按规则给出的下次可提醒时间放入小顶堆，到期时再进入规则计算
+    缺失的价格(nan)视为全部条件不成立。阈值改变后需调用 reset()。
+    """
+
+    def __init__(self, n, n_conditions):
+        self.last_price = np.full(n, np.nan)
+        self.state = np.zeros((n, n_conditions), dtype=bool)
+        self.armed = set()  # 有条件成立的行号
+        self.due = np.full(n, np.nan)  # armed 行的下次可提醒时间
+        self._heap = []  # (下次可提醒时间, 行号)，过期的项在出堆时丢弃
+
+    def reset(self):
+        """阈值改变后调用：下一个快照中所有有价格的股票都重新判断"""
+        self.last_price[:] = np.nan
+        self.state[:] = False
+        self.armed.clear()
+        self.due[:] = np.nan
+        self._heap.clear()
+
+    def update(self, price, conditions, now):
+        """
+        :param price: 按行号排列的最新价格数组
+        :param conditions: conditions(rows) 返回这些行的条件矩阵 (len(rows), n_conditions)
+        :param now: 当前时间戳，下次可提醒时间早于 now 的 armed 行到期
+        :return: 本 tick 需要做规则计算的行号(升序数组)：越过阈值的行 + 到期的 armed 行
+        """
+        last = self.last_price
+        changed = np.flatnonzero(~((price == last) | (np.isnan(price) & np.isnan(last))))
+        rows = set()
+        if len(changed):
+            last[changed] = price[changed]
+            new = conditions(changed)
+            flipped = (new != self.state[changed]).any(axis=1)
+            self.state[changed[flipped]] = new[flipped]
+            for row, active in zip(changed[flipped].tolist(), new[flipped].any(axis=1).tolist()):
+                rows.add(row)
+                if active:
+                    self.armed.add(row)
+                else:
+                    self.armed.discard(row)
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            due, row = heapq.heappop(heap)
+            if row in self.armed and self.due[row] == due:
+                rows.add(row)
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def schedule(self, rows, due):
+        """规则计算后登记 rows 中仍有条件成立的行的下次可提醒时间"""
+        for row, t in zip(rows.tolist(), due.tolist()):
+            if row in self.armed:
+                self.due[row] = t
+                heapq.heappush(self._heap, (t, row))
+
+
+class SellSignalEngine:
+    """
+    持仓股卖点的向量化计算。
+    昨日高开低、最近4个收盘价之和(及由其算出的跌破5日均线临界价)与各卖点上次触发时间按持仓顺序保存在数组中，
+    每个 Stock 的 signal_times 是 last_times 对应行的视图，逐只调用 check_sell_conditions 时共用同一份冷却状态。
+    """
+
+    def __init__(self, stocks):
+        self.stocks = list(stocks)
+        self.codes = [stock.stock_code for stock in self.stocks]
+        n = len(self.stocks)
+        self.high = np.full(n, np.nan)
+        self.open = np.full(n, np.nan)
+        self.low = np.full(n, np.nan)
+        self.last4_sum = np.full(n, np.nan)
+        self.interval = np.array([stock.time_interval for stock in self.stocks], dtype=np.float64)
+        self.last_times = np.zeros((n, len(SELL_SIGNALS)))
+        for i, stock in enumerate(self.stocks):
+            state = stock.indicators
+            for array, value in ((self.high, state.yesterday_high), (self.open, state.yesterday_open),
+                                 (self.low, state.yesterday_low), (self.last4_sum, state.history_sum(5))):
+                if value is not None:
+                    array[i] = value
+            self.last_times[i] = stock.signal_times
+            stock.signal_times = self.last_times[i]
+        self.breakeven = self.last4_sum / 4
+        self.index = ThresholdIndex(n, len(SELL_SIGNALS))
+
+    def _conditions(self, price, rows):
+        return sell_conditions(price[rows], self.high[rows], self.open[rows], self.low[rows], self.breakeven[rows])
+
+    def load_triggers(self, table):
+        """用触发价格表(以 stock_code 为索引)中的阈值替换对应持仓的昨日高开低与 S4，表中没有的持仓保持不变"""
+        rows = table.reindex(self.codes)
+        found = rows["last4_sum"].notna().to_numpy()
+        for array, column in ((self.high, "yesterday_high"), (self.open, "yesterday_open"),
+                              (self.low, "yesterday_low"), (self.last4_sum, "last4_sum"),
+                              (self.breakeven, "breakeven")):
+            array[found] = rows[column].to_numpy(dtype=np.float64)[found]
+        self.index.reset()
+
+    def carry_over(self, previous):
+        """持仓列表变更后，从旧引擎复制仍在列表中的持仓的阈值(可能来自触发价格表)；冷却状态随 Stock.signal_times 保留"""
+        new, old = common_rows(self.codes, previous.codes)
+        for name in ("high", "open", "low", "last4_sum", "breakeven"):
+            getattr(self, name)[new] = getattr(previous, name)[old]
+
+    def evaluate(self, snapshot, now=None):
+        """
+        计算全部持仓的卖点，返回触发的行：stock_code short_name price ma5 signal message
+        """
+        now = time.time() if now is None else now
+        price = _snapshot_prices(snapshot, self.codes)
+        candidates = self.index.update(price, lambda rows: self._conditions(price, rows), now)
+        # price < MA5 与 price < S4 / 4 等价，直接与临界价比较，MA5 只对触发的行计算
+        last_times = self.last_times[candidates]
+        hit, which = evaluate_sell_signals(price[candidates], self.high[candidates], self.open[candidates],
+                                           self.low[candidates], self.breakeven[candidates],
+                                           last_times, now, self.interval[candidates])
+        self.last_times[candidates] = last_times
+        # 仍成立的卖点中最早冷却结束的时间，即该股票下次需要计算的时间
+        cooldown_end = np.where(self.index.state[candidates], last_times + self.interval[candidates, None], np.inf)
+        self.index.schedule(candidates, cooldown_end.min(axis=1, initial=np.inf))
+        rows = candidates[hit]
+        return pd.DataFrame({
+            "stock_code": [self.codes[i] for i in rows],
+            "short_name": [self.stocks[i].stock_name for i in rows],
+            "price": price[rows],
+            "ma5": (self.last4_sum[rows] + price[rows]) / 5,
+            "signal": [SELL_SIGNALS[w][0] for w in which],
+            "message": [SELL_SIGNALS[w][1] for w in which],
+        })
+
+
+class BandSignalEngine:
+    """
+    观察股 MA5 区间买点的向量化计算。
+    last_alert 保存每只股票上次提醒的时间戳(nan 表示未提醒)，价格离开区间后清空，重新进入时立即提醒。
+    """
+
+    def __init__(self, historical_data_dict, tolerance, repeat_interval=10):
+        """
+        :param historical_data_dict: {股票代码: 最近4个交易日收盘价列表}
+        :param tolerance: MA5 区间上沿比例
+        :param repeat_interval: 停留在区间内时重复提醒的最小间隔(秒)
+        """
+        self.codes = list(historical_data_dict)
+        self.last4_sum = np.array([sum(closes) if len(closes) >= 4 else np.nan
+                                   for closes in historical_data_dict.values()], dtype=np.float64)
+        self.tolerance = tolerance
+        self.repeat_interval = repeat_interval
+        self.last_alert = np.full(len(self.codes), np.nan)
+        self.lower, self.upper = band_thresholds(self.last4_sum, tolerance)
+        self.index = ThresholdIndex(len(self.codes), 1)
+
+    def load_triggers(self, table):
+        """用触发价格表(以 stock_code 为索引)中预先算好的 S4 与区间阈值替换对应股票，表中没有的股票保持不变"""
+        rows = table.reindex(self.codes)
+        found = rows["last4_sum"].notna().to_numpy()
+        for array, column in ((self.last4_sum, "last4_sum"), (self.lower, "breakeven"), (self.upper, "band_upper")):
+            array[found] = rows[column].to_numpy(dtype=np.float64)[found]
+        self.index.reset()
+
+    def carry_over(self, previous):
+        """观察列表变更后，从旧引擎复制仍在列表中的股票的阈值与上次提醒时间，已提醒过的股票不会因重建而重复提醒"""
+        new, old = common_rows(self.codes, previous.codes)
+        for name in ("last4_sum", "lower", "upper", "last_alert"):
+            getattr(self, name)[new] = getattr(previous, name)[old]
+
+    def evaluate(self, snapshot, now=None):
+        """
+        计算全部观察股的区间信号，返回需要提醒的行：stock_code short_name price ma5 upper
+        """
+        now = time.time() if now is None else now
+        price = _snapshot_prices(snapshot, self.codes)
+        candidates = self.index.update(
+            price, lambda rows: ((price[rows] >= self.lower[rows]) & (price[rows] <= self.upper[rows]))[:, None], now)
+        # 只在越过区间边界或仍在区间内的股票中判断；离开区间的股票清空上次提醒时间
+        in_band = self.index.state[candidates, 0]
+        last_alert = self.last_alert[candidates]
+        alert = in_band & ~(now - last_alert <= self.repeat_interval)
+        last_alert[alert] = now
+        last_alert[~in_band] = np.nan
+        self.last_alert[candidates] = last_alert
+        self.index.schedule(candidates, last_alert + self.repeat_interval)
+        rows = candidates[alert]
+        codes = [self.codes[i] for i in rows]
+        ma5 = (self.last4_sum[rows] + price[rows]) / 5
+        return pd.DataFrame({
+            "stock_code": codes,
+            "short_name": snapshot["short_name"].reindex(codes).to_numpy(),
+            "price": price[rows],
+            "ma5": ma5,
+            "upper": ma5 * (1 + self.tolerance),
+        })
@@ -0,0 +1,97 @@
+# startup.py
+"""
+启动耗时分析(main.py --profile-startup)：
+  - 各个包的导入耗时：替换 builtins.__import__，按顶层包统计自身耗时(不含其中再导入的其他包)
+  - 启动各阶段耗时：数据源初始化、交易日历/代码表、持仓股初始化(逐只统计)、观察者初始化、首个快照
+只依赖标准库，main.py 在导入其余模块之前创建，导入统计才能覆盖 pandas、adata 等第三方库。
+"""
+import builtins
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ImportTimer:
+    """统计每个顶层包的导入自身耗时(秒)"""
+
+    def __init__(self):
+        self.seconds = {}
+        self._local = threading.local()  # 每个线程各自的导入栈：每层导入中子导入的累计耗时
+        self._original = None
+
+    def install(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level and globals:
+            root = (globals.get("__package__") or "").split(".")[0]
+        else:
+            root = name.split(".")[0]
+        stack = self._local.__dict__.setdefault("stack", [0.0])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            stack[-1] += elapsed
+            self.seconds[root] = self.seconds.get(root, 0.0) + elapsed - children
+
+
+class StartupProfile:
+    """
+    启动各阶段计时。stage(name) 计时一个阶段，items(name, seconds) 记录逐项耗时(如每只持仓股的初始化)，
+    report() 返回多行文本报告；track_imports 为 True 时同时统计各个包的导入耗时
+    """
+
+    def __init__(self, track_imports=False):
+        self.started = time.perf_counter()
+        self.stages = []  # [(阶段名, 耗时)]
+        self.item_seconds = {}  # 阶段名 -> [(名称, 耗时)]
+        self.imports = None
+        if track_imports:
+            self.imports = ImportTimer()
+            self.imports.install()
+
+    def elapsed(self):
+        """距创建时的秒数"""
+        return time.perf_counter() - self.started
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def mark(self, name, since=None):
+        """记录一个从 since(默认创建时)到现在的阶段"""
+        self.stages.append((name, time.perf_counter() - (self.started if since is None else since)))
+
+    def items(self, name, seconds):
+        self.item_seconds.setdefault(name, []).append(seconds)
+
+    def report(self, top=10):
+        """启动耗时报告：总耗时、各阶段耗时与占比、逐项耗时统计、导入最慢的包"""
+        total = self.elapsed()
+        lines = [f"启动耗时 {total:.3f}s"]
+        for name, seconds in self.stages:
+            lines.append(f"  {name:<24} {seconds:8.3f}s {seconds / total * 100:5.1f}%")
+            values = self.item_seconds.get(name)
+            if values:
+                lines.append(f"    {len(values)} 项, 平均 {sum(values) / len(values) * 1000:.1f}ms, "
+                             f"最慢 {max(values) * 1000:.1f}ms")
+        if self.imports is not None:
+            self.imports.uninstall()
+            slowest = sorted(self.imports.seconds.items(), key=lambda item: -item[1])[:top]
+            lines.append(f"  导入耗时最多的包(自身耗时，共 {sum(self.imports.seconds.values()):.3f}s):")
+            lines += [f"    {package:<22} {seconds:8.3f}s" for package, seconds in slowest]
+        return "\n".join(lines)
@@ -49,7 +49,12 @@ class PriceRangeStrategy:
         """
         if ma5 is None:
             return False
+        return bool(self.in_range_mask(current_price, ma5))
 
-        lower_bound = ma5
-        upper_bound = ma5 * (1 + self.tolerance)
-        return lower_bound <= current_price <= upper_bound
+    def in_range_mask(self, prices, ma5):
+        """
+        向量化版本的 is_in_range：prices 与 ma5 为等长数组，返回布尔数组(nan 视为不在区间内)
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        ma5 = np.asarray(ma5, dtype=np.float64)
+        return (prices >= ma5) & (prices <= ma5 * (1 + self.tolerance))
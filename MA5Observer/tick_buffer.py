@@ -0,0 +1,85 @@
+# tick_buffer.py
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+class TickBuffer:
+    """
+    单只股票当日 tick 的列式缓冲区：
+      - 每列一个预分配的 float64 数组，写满时容量翻倍，追加为均摊 O(1)
+      - 与上一条相比价格和成交量都未变化的快照直接丢弃(去重)
+      - columns()/to_frame() 返回已写入部分的视图，不复制数据
+    trade_time 保存为 Unix 时间戳(秒)。
+    """
+    COLUMNS = ("trade_time", "price", "change", "change_pct", "volume", "amount")
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._data = {name: np.empty(capacity, dtype=np.float64) for name in self.COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._data["price"])
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name, column in self._data.items():
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self._size] = column[:self._size]
+            self._data[name] = grown
+
+    def append(self, trade_time, price, change, change_pct, volume, amount):
+        """追加一条 tick；价格和成交量与上一条相同时不写入，返回是否写入"""
+        n = self._size
+        if n and self._data["price"][n - 1] == price and self._data["volume"][n - 1] == volume:
+            return False
+        if n == self.capacity:
+            self._grow()
+        data = self._data
+        data["trade_time"][n] = trade_time
+        data["price"][n] = price
+        data["change"][n] = change
+        data["change_pct"][n] = change_pct
+        data["volume"][n] = volume
+        data["amount"][n] = amount
+        self._size = n + 1
+        return True
+
+    def extend(self, columns):
+        """批量追加 {列名: 数组}(从检查点恢复时使用)，不做去重"""
+        n = len(columns["price"])
+        while self._size + n > self.capacity:
+            self._grow()
+        for name in self.COLUMNS:
+            self._data[name][self._size:self._size + n] = columns[name]
+        self._size += n
+
+    def column(self, name):
+        """返回某一列已写入部分的只读视图"""
+        view = self._data[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def columns(self):
+        """返回 {列名: 只读视图}"""
+        return {name: self.column(name) for name in self.COLUMNS}
+
+    def last(self, name):
+        """最近一条 tick 的某个字段，缓冲区为空时返回 None"""
+        return float(self._data[name][self._size - 1]) if self._size else None
+
+    def to_frame(self):
+        """以已写入部分构造 DataFrame(价格、成交量等列直接引用缓冲区视图)，trade_time 转为本地时间"""
+        frame = pd.DataFrame(self.columns(), copy=False)
+        utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+        frame["trade_time"] = pd.to_datetime(frame["trade_time"] + utc_offset, unit="s")
+        return frame
+
+    def clear(self):
+        """清空缓冲区(换日时使用)，保留已分配的容量"""
+        self._size = 0
@@ -0,0 +1,307 @@
+# tick_recorder.py
+"""
+盘中行情录制：把每次轮询得到的实时行情快照追加到按交易日分区的压缩列式日志，供盘后分析与回放(TickTape)。
+
+每个交易日、每个分区一个只追加的文件 cache/ticks/<交易日>/<分区>.log：
+    文件头  MAGIC
+    帧      <BBIddI> 类型 / 压缩方式 / 行数 / 最早时间 / 最晚时间 / 压缩后字节数，之后为压缩后的内容
+      TICKS   按列存放：stock_code(8 字节 ASCII)、trade_time、price change change_pct volume amount(float64)，
+              浮点列按字节转置后压缩(同一字节位置的数据相邻，压缩率远高于逐行)
+      NAMES   首次出现的股票的 {代码: 名称} JSON
+安装了 zstandard 时用 zstd 压缩，否则用标准库 zlib；读取时按帧头的压缩方式解压。
+只记录与该股票上一条相比价格或成交量有变化的行，"某时刻的快照"即每只股票不晚于该时刻的最后一条记录。
+
+record() 只把快照放入队列，变化检测、压缩和写入都在后台线程中按批进行，不占用行情与信号计算的时间。
+"""
+import glob
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR
+from MA5Observer.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_TICK_DIR = os.path.join(DEFAULT_CACHE_DIR, "ticks")
+
+MAGIC = b"MA5TICK1"
+_FRAME = struct.Struct("<BBIddI")
+TICKS, NAMES = 1, 2
+ZLIB, ZSTD = 1, 2
+
+TICK_COLUMNS = ("trade_time", "price", "change", "change_pct", "volume", "amount")
+_QUOTE_COLUMNS = ["price", "change", "change_pct", "volume", "amount"]
+
+
+def _compress(data):
+    if zstandard is not None:
+        return ZSTD, zstandard.ZstdCompressor(level=3).compress(data)
+    return ZLIB, zlib.compress(data, 6)
+
+
+def _decompress(codec, data):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("tick 日志使用 zstd 压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _frame(kind, payload, rows=0, start=0.0, end=0.0):
+    codec, data = _compress(payload)
+    return _FRAME.pack(kind, codec, rows, start, end, len(data)) + data
+
+
+def _encode_ticks(codes, columns):
+    """codes: S8 数组，columns: TICK_COLUMNS 顺序的 float64 数组"""
+    n = len(codes)
+    parts = [np.ascontiguousarray(codes, dtype="S8").tobytes()]
+    for values in columns:
+        parts.append(np.ascontiguousarray(values, dtype="<f8").view(np.uint8).reshape(n, 8).T.tobytes())
+    return b"".join(parts)
+
+
+def _decode_ticks(data, n):
+    codes = np.frombuffer(data, dtype="S8", count=n)
+    offset = 8 * n
+    columns = {}
+    for name in TICK_COLUMNS:
+        shuffled = np.frombuffer(data, dtype=np.uint8, count=8 * n, offset=offset).reshape(8, n)
+        columns[name] = shuffled.T.copy().view("<f8").reshape(n)
+        offset += 8 * n
+    return codes, columns
+
+
+def _scan(f, size):
+    """逐帧读取帧头，返回 [(类型, 压缩方式, 行数, 最早时间, 最晚时间, 内容位置, 内容长度)] 与最后一个完整帧的结束位置"""
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        return [], 0
+    frames = []
+    offset = len(MAGIC)
+    while offset + _FRAME.size <= size:
+        f.seek(offset)
+        kind, codec, rows, start, end, length = _FRAME.unpack(f.read(_FRAME.size))
+        if offset + _FRAME.size + length > size:
+            break
+        frames.append((kind, codec, rows, start, end, offset + _FRAME.size, length))
+        offset += _FRAME.size + length
+    return frames, offset
+
+
+def read_tick_files(paths, codes=None, start=None, end=None):
+    """
+    读取 tick 日志文件，返回 DataFrame stock_code trade_time(时间戳，秒) price change change_pct volume amount short_name，
+    按 (stock_code, trade_time) 排序。codes 为 None 时读取全部股票；start/end 为时间戳(闭区间)，
+    时间范围之外的帧只读帧头，不解压
+    """
+    wanted = None if codes is None else np.array(list(codes), dtype="S8")
+    chunks, names = [], {}
+    for path in paths:
+        with open(path, "rb") as f:
+            frames, _ = _scan(f, os.path.getsize(path))
+            for kind, codec, rows, frame_start, frame_end, offset, length in frames:
+                if kind == TICKS and ((start is not None and frame_end < start) or
+                                      (end is not None and frame_start > end)):
+                    continue
+                f.seek(offset)
+                data = _decompress(codec, f.read(length))
+                if kind == NAMES:
+                    names.update(json.loads(data.decode("utf-8")))
+                    continue
+                frame_codes, columns = _decode_ticks(data, rows)
+                mask = np.ones(rows, dtype=bool)
+                if wanted is not None:
+                    mask &= np.isin(frame_codes, wanted)
+                if start is not None:
+                    mask &= columns["trade_time"] >= start
+                if end is not None:
+                    mask &= columns["trade_time"] <= end
+                if mask.any():
+                    chunks.append((frame_codes[mask], {name: values[mask] for name, values in columns.items()}))
+    if chunks:
+        all_codes = np.concatenate([c for c, _ in chunks]).astype(str)
+        frame = pd.DataFrame({name: np.concatenate([columns[name] for _, columns in chunks])
+                              for name in TICK_COLUMNS})
+    else:
+        all_codes = np.array([], dtype=str)
+        frame = pd.DataFrame({name: np.array([], dtype=np.float64) for name in TICK_COLUMNS})
+    frame.insert(0, "stock_code", all_codes)
+    frame["short_name"] = frame["stock_code"].map(names).fillna(frame["stock_code"])
+    return frame.sort_values(["stock_code", "trade_time"], kind="stable").reset_index(drop=True)
+
+
+def read_ticks(trade_date, codes=None, start=None, end=None, directory=DEFAULT_TICK_DIR):
+    """
+    读取某个交易日全部分区的录制 tick，start/end 可以是时间戳或 datetime(本地时间)，其余同 read_tick_files
+    """
+    if isinstance(start, datetime):
+        start = start.timestamp()
+    if isinstance(end, datetime):
+        end = end.timestamp()
+    return read_tick_files(sorted(glob.glob(os.path.join(directory, trade_date, "*.log"))), codes, start, end)
+
+
+class TickRecorder:
+    """
+    实时行情快照录制器。record(snapshot, now) 在行情任务中调用，只入队；
+    后台线程每 flush_interval 秒(或积压 max_rows 行时)把变化的行压缩成一帧追加到当日文件
+    """
+
+    def __init__(self, directory=DEFAULT_TICK_DIR, part="observer", flush_interval=5.0, max_rows=200_000,
+                 queue_size=1024):
+        """
+        :param part: 分区名，同一交易日多个进程同时录制时各用一个
+        :param flush_interval: 写入间隔(秒，实际时间)
+        :param max_rows: 积压的行数达到该值时提前写入
+        :param queue_size: 待处理快照队列容量，写入跟不上时丢弃新快照
+        """
+        self.directory = directory
+        self.part = part
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last = {}  # 股票代码 -> 上一次记录的 (价格, 成交量)
+        self._named = set()  # 已写入名称的股票代码
+        self._pending = []  # 待写入的 (代码数组, 列数组列表, 新名称)
+        self._pending_rows = 0
+        self._trade_date = None
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, snapshot, now):
+        """放入一份快照(以 stock_code 为索引)，now 为时间戳(秒)"""
+        try:
+            self._queue.put_nowait((snapshot, now))
+        except queue.Full:
+            metrics.inc("tick_record_dropped_total")
+
+    def close(self):
+        """写入队列中剩余的快照并关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                try:
+                    self._add(*item)
+                except Exception as e:
+                    logger.warning(f"录制行情失败: {e}")
+            if self._pending_rows >= self.max_rows or time.monotonic() >= deadline:
+                self._flush_safely()
+                deadline = time.monotonic() + self.flush_interval
+        self._flush_safely()
+
+    def _add(self, snapshot, now):
+        """与上一条相比价格或成交量有变化的行加入待写入批次"""
+        trade_date = datetime.fromtimestamp(now).strftime("%Y-%m-%d")
+        if trade_date != self._trade_date:
+            self._flush_safely()
+            self._switch_date(trade_date)
+        values = snapshot[_QUOTE_COLUMNS].to_numpy(dtype=np.float64)
+        codes = snapshot.index.astype(str)
+        previous = np.array([self._last.get(code, (np.nan, np.nan)) for code in codes]).reshape(-1, 2)
+        current = values[:, [0, 3]]
+        changed = ~np.isnan(current[:, 0]) & ~(current == previous).all(axis=1)
+        if not changed.any():
+            return
+        rows = np.flatnonzero(changed)
+        changed_codes = codes[rows]
+        self._last.update(zip(changed_codes, map(tuple, current[rows].tolist())))
+        names = {}
+        if "short_name" in snapshot:
+            short_names = snapshot["short_name"].to_numpy()
+            names = {code: str(short_names[i]) for code, i in zip(changed_codes, rows.tolist())
+                     if code not in self._named}
+            self._named.update(names)
+        self._pending.append((np.asarray(changed_codes, dtype="S8"), np.full(len(rows), float(now)),
+                              values[rows], names))
+        self._pending_rows += len(rows)
+
+    def _flush_safely(self):
+        try:
+            self._flush()
+        except Exception as e:
+            logger.warning(f"写入行情录制文件失败: {e}")
+
+    def _flush(self):
+        """待写入批次压缩成一帧追加到文件"""
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        with metrics.span("tick_record_flush_seconds"):
+            codes = np.concatenate([p[0] for p in pending])
+            times = np.concatenate([p[1] for p in pending])
+            values = np.concatenate([p[2] for p in pending])
+            names = {code: name for p in pending for code, name in p[3].items()}
+            data = b""
+            if names:
+                data += _frame(NAMES, json.dumps(names, ensure_ascii=False).encode("utf-8"))
+            columns = [times] + [values[:, i] for i in range(values.shape[1])]
+            data += _frame(TICKS, _encode_ticks(codes, columns), len(codes), float(times.min()), float(times.max()))
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+        metrics.inc("tick_record_rows_total", len(codes))
+
+    def _switch_date(self, trade_date):
+        """换日：关闭上一交易日的文件，同一交易日重启时接着上次的记录(读取已有的名称与每只股票的最后一条)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._trade_date = trade_date
+        self._last = {}
+        self._named = set()
+        path = self._path()
+        if os.path.exists(path):
+            existing = read_tick_files([path])
+            last = existing.groupby("stock_code", sort=False).last()
+            self._last = dict(zip(last.index, zip(last["price"], last["volume"])))
+            self._named = set(existing["stock_code"])
+
+    def _path(self):
+        return os.path.join(self.directory, self._trade_date, f"{self.part}.log")
+
+    def _open(self):
+        """打开当日文件准备追加；上次写入中途退出留下的不完整帧先截掉"""
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "ab")
+        size = self._file.tell()
+        if size == 0:
+            self._file.write(MAGIC)
+            return
+        with open(path, "rb") as f:
+            _, end = _scan(f, size)
+        if end < size:
+            self._file.truncate(end)
+            self._file.seek(end)
+            if end == 0:
+                self._file.write(MAGIC)
@@ -0,0 +1,88 @@
+# trigger_table.py
+"""
+下一交易日的触发价格表：非交易时间由 StockObserver.off_hours_report 计算并保存，开盘时直接载入信号引擎。
+
+每只股票一行(均只依赖已收盘的数据，开盘前即可确定)：
+    stock_code      股票代码
+    trade_date      适用的交易日
+    last4_sum       该交易日之前最近4个收盘价之和 S4
+    ma5             该交易日之前最近5个收盘价的均值(仅供参考)
+    breakeven       价格站上 MA5 的最低价 S4 / 4(即 PriceRangeStrategy.calc_open_price)，也是跌破5日均线的临界价
+    band_upper      MA5 区间上沿对应的价格 S4 * (1 + t) / (4 - t)
+    yesterday_high / yesterday_open / yesterday_low   上一交易日高开低，卖点阈值
+    tolerance       计算 band_upper 使用的区间比例
+
+保存在 <目录>/<交易日>/<分区名> 下(目录由观察者传入，实盘为 cache/triggers，回放不落盘)；多进程分片观察时每个分片写自己的分区，载入时合并。
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.data_provider.storage import DEFAULT_CACHE_DIR, FRAME_SUFFIX, frame_path, read_frame, write_frame
+from MA5Observer.signal_engine import band_thresholds
+
+TRIGGER_COLUMNS = ("stock_code", "trade_date", "last4_sum", "ma5", "breakeven", "band_upper",
+                   "yesterday_high", "yesterday_open", "yesterday_low", "tolerance")
+
+DEFAULT_TRIGGER_DIR = os.path.join(DEFAULT_CACHE_DIR, "triggers")
+
+
+def session_date(data_provider, now=None):
+    """
+    触发价格表适用的交易日：交易时段内(含午间休市)为当天，否则为下一个交易时段所在的交易日；
+    交易日历中没有下一个交易日时返回 None
+    """
+    now = now or data_provider.clock.now()
+    if data_provider.is_market_open(now):
+        return now.strftime("%Y-%m-%d")
+    next_open = data_provider.next_market_open(now)
+    return next_open.strftime("%Y-%m-%d") if next_open is not None else None
+
+
+def build_trigger_table(data_provider, codes, trade_date, tolerance):
+    """
+    按日K线计算 codes 在 trade_date 的触发价格表；之前5个交易日数据不全的股票不计入。
+    trade_date 必须是交易日历中的交易日
+    """
+    if not data_provider.reference_cache.is_trade_day(trade_date):
+        raise ValueError(f"{trade_date} 不是交易日，不计算触发价格表")
+    dates = data_provider.get_recent_trade_dates(5, before=trade_date)
+    rows = []
+    for code in codes:
+        df = data_provider.get_history_k_data(code)
+        df = df[df["trade_date"].isin(dates)].sort_values("trade_date")
+        if len(df) < 5:
+            continue
+        closes = df["close"].to_numpy(dtype=np.float64)
+        yesterday = df.iloc[-1]
+        rows.append((code, trade_date, closes[1:].sum(), closes.mean(),
+                     float(yesterday["high"]), float(yesterday["open"]), float(yesterday["low"])))
+    table = pd.DataFrame(rows, columns=["stock_code", "trade_date", "last4_sum", "ma5",
+                                        "yesterday_high", "yesterday_open", "yesterday_low"])
+    table["breakeven"], table["band_upper"] = band_thresholds(table["last4_sum"].to_numpy(), tolerance)
+    table["tolerance"] = tolerance
+    return table[list(TRIGGER_COLUMNS)]
+
+
+def save_trigger_table(table, trade_date, part="observer", directory=DEFAULT_TRIGGER_DIR):
+    """保存为 directory/<交易日>/<part>，返回文件路径"""
+    path = frame_path(os.path.join(directory, trade_date), part)
+    write_frame(table, path)
+    return path
+
+
+def load_trigger_table(trade_date, tolerance=None, directory=DEFAULT_TRIGGER_DIR):
+    """
+    载入 trade_date 的全部分区并按 stock_code 合并(同一代码以较新的文件为准)，返回以 stock_code 为索引的表；
+    没有保存过时返回 None。指定 tolerance 时只保留用相同区间比例计算的行
+    """
+    paths = sorted(glob.glob(os.path.join(directory, trade_date, "*" + FRAME_SUFFIX)), key=os.path.getmtime)
+    frames = [frame for frame in map(read_frame, paths) if frame is not None and not frame.empty]
+    if not frames:
+        return None
+    table = pd.concat(frames, ignore_index=True).drop_duplicates("stock_code", keep="last")
+    if tolerance is not None:
+        table = table[np.isclose(table["tolerance"], tolerance)]
+    return table.set_index("stock_code")
@@ -0,0 +1,65 @@
+# watchlist.py
+"""
+持仓/观察列表文件(holding.txt / observe.txt，每行一个股票代码)的读取与变更检测。
+WatchlistWatcher 按 mtime 和文件大小轮询(标准库没有跨平台的文件事件接口，两次 stat 的开销可以忽略)，
+文件变化且代码集合确实改变时才返回新的列表，由调度器交给观察者增量更新。
+文件暂时不存在(编辑器先删除再改名保存)或原来不为空、现在变为空(写了一半)时不更新，等文件再次变化。
+"""
+import os
+
+from loguru import logger
+
+
+def read_codes(filepath):
+    """读取代码文件，去掉空行并按首次出现的顺序去重；文件不存在时返回空列表"""
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    except FileNotFoundError:
+        return []
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WatchlistWatcher:
+    """
+    轮询持仓与观察列表文件，poll() 在代码集合有变化时返回 (持仓代码, 观察代码)，否则返回 None
+    """
+
+    def __init__(self, holding_path="holding.txt", observe_path="observe.txt"):
+        self.holding_path = holding_path
+        self.observe_path = observe_path
+        self._signatures = (_signature(holding_path), _signature(observe_path))
+        self.holding_codes = read_codes(holding_path)
+        self.observe_codes = read_codes(observe_path)
+
+    def poll(self):
+        signatures = (_signature(self.holding_path), _signature(self.observe_path))
+        if signatures == self._signatures:
+            return None
+        self._signatures = signatures
+        if None in signatures:
+            logger.warning("持仓/观察列表文件不存在，暂不更新")
+            return None
+        holding_codes = read_codes(self.holding_path)
+        observe_codes = read_codes(self.observe_path)
+        if (self.holding_codes and not holding_codes) or (self.observe_codes and not observe_codes):
+            logger.warning("持仓/观察列表文件变为空，可能正在写入，暂不更新")
+            return None
+        if set(holding_codes) == set(self.holding_codes) and set(observe_codes) == set(self.observe_codes):
+            return None
+        for name, old, new in (("持仓", self.holding_codes, holding_codes), ("观察", self.observe_codes, observe_codes)):
+            old_set, new_set = set(old), set(new)
+            added = [code for code in new if code not in old_set]
+            removed = [code for code in old if code not in new_set]
+            if added or removed:
+                logger.info(f"{name}列表变更: 新增 {added}, 移除 {removed}")
+        self.holding_codes = holding_codes
+        self.observe_codes = observe_codes
+        return holding_codes, observe_codes
@@ -0,0 +1,37 @@
+# test_backtest.py
+"""日K线回测的卖点：与 SellSignalEngine 相同的阈值与优先级(突破昨日最高价优先于突破昨日开盘价)"""
+import pandas as pd
+import pytest
+
+from MA5Observer.backtest import EXIT_SIGNALS, evaluate_rules
+from MA5Observer.history_data import PRICE_COLUMNS, HistoryArrays
+
+# 前5天收盘价 10，MA5 下沿 S4/4 = 10；第5天开 10.2 高 10.8 低 10.1
+BASE = [(10.0, 10.0, 10.0, 10.0)] * 4 + [(10.2, 10.0, 10.8, 10.1)]
+
+
+def _exit(open_, high, low):
+    """在 BASE 之后追加一根 K 线，返回 (卖点名称, 成交价)；未触发时为 None"""
+    rows = BASE + [(open_, (high + low) / 2, high, low)]
+    frame = pd.DataFrame(rows, columns=["open", "close", "high", "low"])
+    frame["trade_date"] = pd.date_range("2023-06-01", periods=len(rows))
+    frame = frame.reindex(columns=["trade_date", *PRICE_COLUMNS], fill_value=0.0)
+    signals = evaluate_rules(HistoryArrays.from_frames({"000001": frame}))
+    if not signals["exit"][-1]:
+        return None
+    return EXIT_SIGNALS[signals["exit_signal"][-1]], signals["exit_price"][-1]
+
+
+@pytest.mark.parametrize("bar, expected", [
+    ((10.1, 11.0, 10.1), ("highest_price_break", 10.8)),  # 盘中越过昨日最高价
+    ((10.1, 10.5, 10.1), ("open_price_break", 10.2)),  # 只越过昨日开盘价
+    ((11.0, 11.2, 10.9), ("highest_price_break", 11.0)),  # 开盘即高于昨日最高价
+    ((10.5, 11.0, 10.4), ("open_price_break", 10.5)),  # 开盘即高于昨日开盘价
+    ((10.15, 10.2, 10.12), None),
+])
+def test_up_exits_follow_live_rule(bar, expected):
+    got = _exit(*bar)
+    if expected is None:
+        assert got is None
+    else:
+        assert got[0] == expected[0] and got[1] == pytest.approx(expected[1])
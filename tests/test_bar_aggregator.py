@@ -0,0 +1,74 @@
+# test_bar_aggregator.py
+"""分钟K线增量聚合：与按周期 groupby 的全量计算一致；盘中启动时第一根K线只计启动后的成交量；列表变更保留K线"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from MA5Observer.bar_aggregator import BAR_FIELDS, BarAggregator
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+
+
+def _replay(start, ticks, step=7):
+    """从 start 开始每 step 秒取一次快照，返回 (代码, 聚合器, 原始快照记录)"""
+    provider = ReplayProvider(history=synthetic_history(8, end="2023-06-30"), speed=0)
+    provider.clock.set(start)
+    codes = provider.history.codes
+    bars = BarAggregator(codes, keep=400)
+    rows = []
+    for _ in range(ticks):
+        now = provider.clock.time()
+        snapshot = provider.get_realtime_snapshot(codes)
+        bars.update(snapshot, now)
+        rows.append(snapshot[["price", "volume", "amount"]].assign(t=now).reset_index())
+        provider.clock.advance(step)
+    bars.flush()
+    return codes, bars, pd.concat(rows, ignore_index=True)
+
+
+def _expected(raw, code, period):
+    ticks = raw[raw["stock_code"] == code].assign(start=lambda d: d["t"] // period * period)
+    groups = ticks.groupby("start")
+    bars = pd.DataFrame({"open": groups["price"].first(), "high": groups["price"].max(),
+                         "low": groups["price"].min(), "close": groups["price"].last()})
+    # 成交量：各周期最后一次累计值的增量，第一根从第一次收到的累计值算起
+    for name in ("volume", "amount"):
+        last = groups[name].last()
+        bars[name] = last.diff().fillna(last.iloc[0] - ticks[name].iloc[0])
+    return bars
+
+
+@pytest.fixture(scope="module")
+def session():
+    return _replay(datetime(2023, 6, 30, 10, 0, 13), 600)
+
+
+@pytest.mark.parametrize("period", [60, 300, 900])
+def test_bars_match_groupby(session, period):
+    codes, bars, raw = session
+    for code in codes:
+        expected = _expected(raw, code, period)
+        got = bars.bars(period, code)
+        assert len(got) == len(expected)
+        for name in BAR_FIELDS:
+            np.testing.assert_allclose(got[name].to_numpy(), expected[name].to_numpy())
+        assert bars.bar(period, code)["start"] == expected.index[-1]
+
+
+def test_first_bar_excludes_volume_before_start():
+    codes, bars, raw = _replay(datetime(2023, 6, 30, 10, 30, 20), 30)
+    first = raw.groupby("stock_code")["volume"].first()
+    for code in codes:
+        volume = bars.bars(60, code)["volume"]
+        assert volume.iloc[0] < first[code]
+        assert volume.sum() == pytest.approx(raw[raw["stock_code"] == code]["volume"].iloc[-1] - first[code])
+
+
+def test_carry_over_keeps_common_codes():
+    codes, bars, _ = _replay(datetime(2023, 6, 30, 9, 30), 200)
+    rebuilt = BarAggregator(codes[1:] + ["999999"], keep=400)
+    rebuilt.carry_over(bars)
+    pd.testing.assert_frame_equal(rebuilt.bars(300, codes[1]), bars.bars(300, codes[1]))
+    assert rebuilt.bars(300, "999999")["close"].isna().all()
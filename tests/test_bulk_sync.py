@@ -0,0 +1,75 @@
+# test_bulk_sync.py
+"""日K线批量同步：没有数据不重试，只重试网络错误；增量同步只在文件末尾追加新行"""
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+from MA5Observer import bulk_sync
+from MA5Observer.bulk_sync import BulkSyncer
+
+HEADER = ["股票名称", "股票代码", "日期", "开盘", "收盘", "最高", "最低"]
+
+
+def _klines(dates, close=10.0):
+    return pd.DataFrame([["平安银行", "000001", date, close, close, close, close] for date in dates], columns=HEADER)
+
+
+class _Efinance:
+    """按顺序返回(或抛出) responses 中的结果，记录请求次数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.stock = types.SimpleNamespace(get_quote_history=self.get_quote_history)
+
+    def get_quote_history(self, stock_codes, beg, end, klt, fqt):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def syncer(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_sync.time, "sleep", lambda seconds: None)
+    return BulkSyncer(str(tmp_path), rate=1000)
+
+
+def _install(monkeypatch, *responses):
+    fake = _Efinance(*responses)
+    monkeypatch.setitem(sys.modules, "efinance", fake)
+    return fake
+
+
+def test_empty_response_is_final(syncer, monkeypatch, tmp_path):
+    fake = _install(monkeypatch, pd.DataFrame())
+    assert syncer.sync_code("000001") == 0
+    assert fake.calls == 1
+    assert not (tmp_path / "000001.csv").exists()
+
+
+def test_only_network_errors_are_retried(syncer, monkeypatch):
+    fake = _install(monkeypatch, ConnectionError("reset"), TimeoutError(), _klines(["2023-06-29", "2023-06-30"]))
+    assert syncer.sync_code("000001") == 2
+    assert fake.calls == 3
+
+    fake = _install(monkeypatch, KeyError("data"), _klines(["2023-06-30"]))
+    with pytest.raises(KeyError):
+        syncer.sync_code("000002")
+    assert fake.calls == 1
+
+
+def test_incremental_sync_appends_new_rows(syncer, monkeypatch, tmp_path):
+    path = tmp_path / "000001.csv"
+    _klines(["2023-06-28", "2023-06-29"]).to_csv(path, index=False)
+    before = path.read_bytes().rstrip(b"\n")  # 原文件不以换行结尾时补上
+    path.write_bytes(before)
+    _install(monkeypatch, _klines(["2023-06-29", "2023-06-30"]))
+    assert syncer.sync_code("000001") == 1
+    assert path.read_bytes().startswith(before + b"\n")
+    got = pd.read_csv(path, dtype={"股票代码": str})
+    pd.testing.assert_frame_equal(got, _klines(["2023-06-28", "2023-06-29", "2023-06-30"]))
+    assert syncer.manifest["000001"] == "2023-06-30"
@@ -0,0 +1,92 @@
+# test_checkpoint.py
+"""检查点日志：记录编码与解析的往返、末尾不完整记录的处理、SessionCheckpoint 写入后恢复"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from MA5Observer.checkpoint import BAND_ALERT, MAGIC, SELL_TIMES, TICKS, SessionCheckpoint, _parse, _record
+from MA5Observer.tick_buffer import TickBuffer
+
+TRADE_DATE = "2024-12-27"
+
+
+def _records(rng):
+    return [(TICKS, "600000", rng.random((3, len(TickBuffer.COLUMNS)))),
+            (SELL_TIMES, "000001", np.array([0.0, 1.7e9, 0.0, 1.7e9 + 5])),
+            (BAND_ALERT, "300750", np.array([np.nan])),
+            (TICKS, "000001", np.empty((0, len(TickBuffer.COLUMNS))))]
+
+
+def test_parse_round_trip():
+    records = _records(np.random.default_rng(0))
+    data = MAGIC + b"".join(_record(*record) for record in records)
+    parsed, end = _parse(data)
+    assert end == len(data)
+    assert len(parsed) == len(records)
+    for (kind, code, values), (parsed_kind, parsed_code, parsed_values) in zip(records, parsed):
+        assert (parsed_kind, parsed_code) == (kind, code)
+        np.testing.assert_array_equal(parsed_values, values.ravel())
+
+
+def test_parse_ignores_torn_tail():
+    records = _records(np.random.default_rng(1))
+    complete = MAGIC + b"".join(_record(*record) for record in records[:2])
+    tail = _record(*records[0])
+    for cut in range(1, len(tail)):
+        parsed, end = _parse(complete + tail[:cut])
+        assert len(parsed) == 2
+        assert end == len(complete)
+
+
+def test_parse_rejects_unknown_file():
+    assert _parse(b"") == ([], 0)
+    assert _parse(b"NOTACKPT" + _record(TICKS, "600000", np.zeros(6))) == ([], 0)
+
+
+def _stock(code):
+    return SimpleNamespace(stock_code=code, ticks=TickBuffer(), signal_times=np.zeros(4))
+
+
+def _append_ticks(stock, rng, start, n):
+    for i in range(n):
+        stock.ticks.append(start + i * 3.0, *rng.uniform(1, 100, len(TickBuffer.COLUMNS) - 1))
+
+
+def test_session_checkpoint_round_trip(tmp_path):
+    rng = np.random.default_rng(2)
+    stocks = [_stock("600000"), _stock("000001")]
+    band_codes = ["300750", "002594"]
+    band_alert = np.array([1.7e9, np.nan])
+
+    checkpoint = SessionCheckpoint(TRADE_DATE, directory=str(tmp_path))
+    _append_ticks(stocks[0], rng, 1.7e9, 5)
+    assert checkpoint.write(stocks, band_codes, band_alert) > 0
+    assert checkpoint.write(stocks, band_codes, band_alert) == 0  # 没有变化时不写入
+    _append_ticks(stocks[0], rng, 1.7e9 + 100, 3)
+    _append_ticks(stocks[1], rng, 1.7e9 + 50, 4)
+    stocks[1].signal_times[2] = 1.7e9 + 60
+    band_alert[:] = [np.nan, 1.7e9 + 70]
+    checkpoint.write(stocks, band_codes, band_alert)
+    checkpoint.close()
+    # 写入中途退出：末尾留下半条记录
+    with open(checkpoint.path, "ab") as f:
+        f.write(_record(SELL_TIMES, "600000", np.ones(4))[:-5])
+
+    ticks, sell_times, restored_band = SessionCheckpoint(TRADE_DATE, directory=str(tmp_path)).load()
+    for stock in stocks:
+        columns = stock.ticks.columns()
+        for name in TickBuffer.COLUMNS:
+            np.testing.assert_array_equal(ticks[stock.stock_code][name], columns[name])
+        np.testing.assert_array_equal(sell_times[stock.stock_code], stock.signal_times)
+    assert restored_band["300750"] != restored_band["300750"]  # nan：已离开区间
+    assert restored_band["002594"] == 1.7e9 + 70
+
+    # 重新打开追加时截掉不完整的记录，之后的记录仍可读出
+    checkpoint = SessionCheckpoint(TRADE_DATE, directory=str(tmp_path))
+    checkpoint.mark_written(ticks, sell_times, restored_band)
+    _append_ticks(stocks[1], rng, 1.7e9 + 200, 2)
+    checkpoint.write(stocks, band_codes, band_alert)
+    checkpoint.close()
+    ticks, _, _ = SessionCheckpoint(TRADE_DATE, directory=str(tmp_path)).load()
+    np.testing.assert_array_equal(ticks["000001"]["price"], stocks[1].ticks.column("price"))
+    assert len(ticks["600000"]["price"]) == 8
@@ -0,0 +1,63 @@
+# test_composite_provider.py
+"""组合数据源的快照对冲：主数据源只返回部分代码时向备用数据源补取缺少的代码并合并"""
+import time
+from datetime import datetime
+
+import pytest
+
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.composite_provider import CompositeProvider
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+
+
+class _Source:
+    """从回放数据源取快照，丢掉 dropped 中的代码(模拟 adata 某一批请求失败)，并记录每次请求的代码"""
+
+    def __init__(self, name, replay, dropped=(), delay=0.0):
+        self.name = name
+        self.replay = replay
+        self.reference_cache = replay.reference_cache
+        self.dropped = set(dropped)
+        self.delay = delay
+        self.requests = []
+
+    def get_realtime_snapshot(self, stock_codes):
+        self.requests.append(list(stock_codes))
+        time.sleep(self.delay)
+        snapshot = self.replay.get_realtime_snapshot(stock_codes)
+        return snapshot[~snapshot.index.isin(self.dropped)]
+
+
+@pytest.fixture
+def replay():
+    replay = ReplayProvider(history=synthetic_history(6, end="2023-06-30"), speed=0)
+    replay.clock.set(datetime(2023, 6, 30, 10, 0))
+    return replay
+
+
+def test_partial_primary_is_completed_by_secondary(replay):
+    codes = replay.history.codes
+    primary = _Source("adata", replay, dropped=codes[2:4])
+    secondary = _Source("akshare", replay, delay=0.01)
+    provider = CompositeProvider([primary, secondary], hedge_delay=1.0)
+    snapshot = provider.get_realtime_snapshot(codes)
+    assert sorted(snapshot.index) == sorted(codes)
+    assert secondary.requests == [codes[2:4]]
+    expected = replay.get_realtime_snapshot(codes)
+    assert snapshot.loc[codes, "price"].tolist() == expected.loc[codes, "price"].tolist()
+
+
+def test_complete_primary_skips_secondary(replay):
+    codes = replay.history.codes
+    primary, secondary = _Source("adata", replay), _Source("akshare", replay)
+    provider = CompositeProvider([primary, secondary], hedge_delay=1.0)
+    assert sorted(provider.get_realtime_snapshot(codes).index) == sorted(codes)
+    assert secondary.requests == []
+
+
+def test_returns_partial_when_no_source_covers(replay):
+    codes = replay.history.codes
+    primary = _Source("adata", replay, dropped=codes[:1])
+    secondary = _Source("akshare", replay, dropped=codes[:1])
+    provider = CompositeProvider([primary, secondary], hedge_delay=1.0)
+    assert sorted(provider.get_realtime_snapshot(codes).index) == sorted(codes[1:])
@@ -0,0 +1,64 @@
+# test_notifier.py
+"""通知分发：窗口内合并、同一股票同一信号在 repeat_interval 内只发送一次、慢 sink 发送期间的批次合并等待"""
+import threading
+
+from MA5Observer.notifier import Alert, NotificationDispatcher
+
+
+class _Sink:
+    """记录每次发送的提醒；gate 未打开时阻塞在发送中(模拟慢的弹窗)"""
+
+    name = "test"
+
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        if not blocked:
+            self.gate.set()
+
+    def send(self, title, message, alerts):
+        self.started.set()
+        self.gate.wait(5)
+        self.sent.append([(alert.stock_code, alert.signal) for alert in alerts])
+
+
+def _alert(code, signal="突破上一日最高价"):
+    return Alert(code, signal, f"股票 {code}", signal)
+
+
+def _flush(dispatcher, *alerts):
+    """直接分发一批提醒(不经过合并线程的时间窗口)"""
+    dispatcher._dispatch(list(alerts))
+
+
+def test_repeat_interval_suppresses_duplicates():
+    sink = _Sink()
+    dispatcher = NotificationDispatcher([sink], repeat_interval=60.0)
+    _flush(dispatcher, _alert("600000"), _alert("600000"), _alert("000001"))
+    _flush(dispatcher, _alert("600000"), _alert("600000", "跌破5日均线"))
+    dispatcher.close()
+    assert sink.sent == [[("600000", "突破上一日最高价"), ("000001", "突破上一日最高价")],
+                         [("600000", "跌破5日均线")]]
+
+
+def test_zero_repeat_interval_sends_every_batch():
+    sink = _Sink()
+    dispatcher = NotificationDispatcher([sink], repeat_interval=0)
+    _flush(dispatcher, _alert("600000"))
+    _flush(dispatcher, _alert("600000"))
+    dispatcher.close()
+    assert sink.sent == [[("600000", "突破上一日最高价")]] * 2
+
+
+def test_slow_sink_coalesces_waiting_batches():
+    sink = _Sink(blocked=True)
+    dispatcher = NotificationDispatcher([sink], repeat_interval=0)
+    _flush(dispatcher, _alert("600000"))
+    assert sink.started.wait(5)
+    for code in ("000001", "300750", "000001"):
+        _flush(dispatcher, _alert(code))
+    sink.gate.set()
+    dispatcher.close()
+    assert sink.sent == [[("600000", "突破上一日最高价")],
+                         [("000001", "突破上一日最高价"), ("300750", "突破上一日最高价")]]
@@ -0,0 +1,92 @@
+# test_observer.py
+"""StockObserver 跨交易日运行：换日后均线状态、昨日开高低收与信号引擎的阈值都前移到新交易日"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.observer import StockObserver
+
+DAY1, DAY2 = "2023-06-29", "2023-06-30"
+
+
+@pytest.fixture
+def provider():
+    provider = ReplayProvider(history=synthetic_history(6, end=DAY2), replay_date=DAY1, speed=0)
+    provider.clock.set(datetime(2023, 6, 29, 9, 30))
+    return provider
+
+
+def _run_session(observer, provider, ticks=20):
+    observer.set_market_open(True)
+    for _ in range(ticks):
+        observer.on_snapshot(provider.get_realtime_snapshot(observer.watch_codes))
+        provider.clock.advance(60)
+    observer.set_market_open(False)
+
+
+def test_second_day_uses_rolled_ma5(provider):
+    codes = provider.history.codes
+    holdings = [Stock(code, provider) for code in codes[:3]]
+    observer = StockObserver(provider, holdings, codes[3:])
+    _run_session(observer, provider)
+
+    provider.clock.set(datetime(2023, 6, 30, 9, 30))
+    observer.set_market_open(True)
+    assert observer.trade_date == DAY2
+    snapshot = provider.get_realtime_snapshot(observer.watch_codes)
+    observer.on_snapshot(snapshot)
+
+    for stock in holdings:
+        history = provider.history.to_frame(stock.stock_code)
+        history = history[history["trade_date"] <= pd.Timestamp(DAY1)]
+        day1 = history.iloc[-1]
+        last4 = history["close"].iloc[-4:].sum()
+        price = float(snapshot.loc[stock.stock_code, "price"])
+        assert stock.yesterday == DAY1
+        assert stock.highest_price_yesterday == pytest.approx(day1["high"])
+        assert stock.ma5 == pytest.approx((last4 + price) / 5)
+        assert len(stock.ticks) == 1
+        row = observer.sell_engine.codes.index(stock.stock_code)
+        assert observer.sell_engine.last4_sum[row] == pytest.approx(last4)
+    for code in codes[3:]:
+        closes = provider.history.to_frame(code)["close"]
+        last4 = closes[provider.history.to_frame(code)["trade_date"] <= pd.Timestamp(DAY1)].iloc[-4:].sum()
+        row = observer.band_engine.codes.index(code)
+        assert observer.band_engine.last4_sum[row] == pytest.approx(last4)
+
+
+def test_close_day_fallback_without_new_bar(provider):
+    """数据源还没有上一交易日K线时，用当日 tick 收盘前移"""
+    stock = Stock(provider.history.codes[0], provider)
+    stock.isOpened = True
+    sums = stock.indicators.history_sum(5)
+    oldest = float(stock.k_day["close"].iloc[-4])
+    prices = []
+    for _ in range(5):
+        snapshot = provider.get_realtime_snapshot([stock.stock_code])
+        stock.update_current(snapshot.loc[stock.stock_code])
+        prices.append(stock.current_price)
+        provider.clock.advance(600)
+    stock.data_provider = _NoHistory(provider)
+    stock.start_new_day(DAY2)
+    assert stock.lowest_price_yesterday == pytest.approx(min(prices))
+    assert stock.indicators.history_sum(5) == pytest.approx(sums - oldest + prices[-1])
+    assert len(stock.ticks) == 0
+
+
+class _NoHistory:
+    """历史K线为空的数据源(其余接口委托给回放数据源)"""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def get_history_k_data(self, stock_code, start_date=None, end_date=None):
+        return pd.DataFrame()
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
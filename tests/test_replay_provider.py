@@ -0,0 +1,45 @@
+# test_replay_provider.py
+"""回放数据源的交易日历：数据末尾之后没有下一个交易日(不按自然日推算)，调度器在回放末尾结束"""
+import asyncio
+from datetime import datetime
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.observer import StockObserver
+from MA5Observer.scheduler import ObserverScheduler
+from MA5Observer.trigger_table import session_date
+
+LAST_DAY = "2023-06-30"  # 周五
+
+
+def _provider(moment, speed=0):
+    provider = ReplayProvider(history=synthetic_history(4, end=LAST_DAY), speed=speed)
+    provider.clock.set(moment)
+    return provider
+
+
+def test_no_trade_date_after_history():
+    provider = _provider(datetime(2023, 6, 29, 16, 0))
+    assert provider.next_market_open() == datetime(2023, 6, 30, 9, 15)
+    assert session_date(provider) == LAST_DAY
+    provider.clock.set(datetime(2023, 6, 30, 15, 30))
+    assert provider.next_market_open() is None
+    assert session_date(provider) is None
+
+
+class _Dispatcher:
+    def __init__(self):
+        self.alerts = []
+
+    def submit(self, alert):
+        self.alerts.append(alert)
+
+
+def test_scheduler_stops_at_end_of_replay():
+    provider = _provider(datetime(2023, 6, 30, 14, 59, 50), speed=60)
+    codes = provider.history.codes
+    observer = StockObserver(provider, [Stock(codes[0], provider)], codes[1:])
+    scheduler = ObserverScheduler(observer, _Dispatcher(), metrics_interval=0, checkpoint_interval=0)
+    asyncio.run(asyncio.wait_for(scheduler.run(), timeout=10))
+    assert observer.trade_date == LAST_DAY
@@ -0,0 +1,57 @@
+# test_sharded_observer.py
+"""多进程分片观察与单进程 StockObserver 的提醒一致；其他命令的失败与过期 tick 的回复不计入当前 tick"""
+import time
+from datetime import datetime
+
+import pytest
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.observer import StockObserver
+from MA5Observer.sharded_observer import ShardedObserver
+
+TICK_TIMEOUT = 10.0
+
+
+def make_provider():
+    provider = ReplayProvider(history=synthetic_history(40, end="2023-06-30"), speed=0)
+    provider.clock.set(datetime(2023, 6, 30, 9, 31))
+    return provider
+
+
+@pytest.fixture(scope="module")
+def observers():
+    provider = make_provider()
+    codes = provider.history.codes
+    single = StockObserver(provider, [Stock(code, provider) for code in codes[:10]], codes)
+    sharded = ShardedObserver(provider, make_provider, codes[:10], codes, workers=2, tick_timeout=TICK_TIMEOUT)
+    single.set_market_open(True)
+    sharded.set_market_open(True)
+    yield provider, single, sharded
+    sharded.close()
+
+
+def test_sharded_alerts_match_single_process(observers):
+    provider, single, sharded = observers
+    for _ in range(20):
+        provider.clock.advance(30)
+        snapshot = provider.get_realtime_snapshot(single.watch_codes)
+        assert sorted(sharded.on_snapshot(snapshot)) == sorted(single.on_snapshot(snapshot))
+
+
+def test_stray_replies_are_not_counted(observers):
+    provider, single, sharded = observers
+    # 其他命令的失败与更早 tick 的回复不能顶替本 tick 的回复
+    sharded._results.put(("failed", 0, "report", "boom"))
+    sharded._results.put(("skipped", 0, -5))
+    sharded._results.put(("error", 1, -4, "old"))
+    time.sleep(0.2)
+    provider.clock.advance(30)
+    snapshot = provider.get_realtime_snapshot(single.watch_codes)
+    start = time.monotonic()
+    assert sorted(sharded.on_snapshot(snapshot)) == sorted(single.on_snapshot(snapshot))
+    assert time.monotonic() - start < TICK_TIMEOUT / 2
+    # 本 tick 的回复已全部取走，没有留到下一个 tick
+    time.sleep(0.5)
+    assert sharded._results.empty()
@@ -0,0 +1,100 @@
+# test_signal_engine.py
+"""
+信号引擎(ThresholdIndex 增量判断)与逐 tick 全量计算的等价性：
+随机价格序列中约一半股票价格不变、少量缺失，其余在阈值附近随机取值，每个 tick 的提醒必须完全一致。
+逐只股票的标量判断(first_sell_signal)与数组版本逐行一致。
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.signal_engine import (SELL_SIGNALS, BandSignalEngine, SellSignalEngine, evaluate_sell_signals,
+                                       first_sell_signal)
+from MA5Observer.strategy import PriceRangeStrategy
+
+N_CODES = 200
+N_TICKS = 300
+
+
+@pytest.fixture(scope="module")
+def provider():
+    return ReplayProvider(history=synthetic_history(N_CODES), speed=0)
+
+
+def _random_prices(rng, previous, lower, upper):
+    """约一半股票沿用上一个价格，2% 缺失，其余在 [lower, upper] 内均匀取值"""
+    price = rng.uniform(lower, upper)
+    keep = rng.random(len(price)) < 0.5
+    price[keep] = previous[keep]
+    price[rng.random(len(price)) < 0.02] = np.nan
+    return price
+
+
+def _snapshot(codes, price):
+    return pd.DataFrame({"price": price, "short_name": codes}, index=pd.Index(codes, name="stock_code"))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sell_engine_matches_full_evaluation(provider, seed):
+    rng = np.random.default_rng(seed)
+    stocks = [Stock(code, provider, time_interval=int(rng.choice([5, 30, 60]))) for code in provider.history.codes]
+    engine = SellSignalEngine(stocks)
+    last_times = engine.last_times.copy()
+    lower = np.fmin(engine.low, engine.breakeven) * 0.97
+    upper = np.fmax(engine.high, engine.open) * 1.03
+    price = np.full(len(stocks), np.nan)
+    now = 1_700_000_000.0
+    for _ in range(N_TICKS):
+        now += rng.uniform(0.5, 20)
+        price = _random_prices(rng, price, lower, upper)
+        got = engine.evaluate(_snapshot(engine.codes, price), now)
+        # 全量计算：每个 tick 对全部持仓按真实 MA5 判断
+        ma5 = (engine.last4_sum + price) / 5
+        rows, which = evaluate_sell_signals(price, engine.high, engine.open, engine.low, ma5,
+                                            last_times, now, engine.interval)
+        expected = {(engine.codes[row], SELL_SIGNALS[w][0]) for row, w in zip(rows, which)}
+        assert set(zip(got["stock_code"], got["signal"])) == expected
+    np.testing.assert_array_equal(engine.last_times, last_times)
+
+
+def test_scalar_sell_signal_matches_vectorized():
+    rng = np.random.default_rng(0)
+    n = 2000
+    high, open_price, low = rng.uniform(9, 11, (3, n))
+    price, ma5 = rng.uniform(8, 12, (2, n))
+    price[rng.random(n) < 0.05] = np.nan
+    last_times = rng.choice([0.0, 95.0, 99.5], (n, len(SELL_SIGNALS)))
+    scalar_times = last_times.copy()
+    rows, which = evaluate_sell_signals(price, high, open_price, low, ma5, last_times, 100.0, 2.0)
+    expected = dict(zip(rows, which))
+    for row in range(n):
+        got = first_sell_signal(price[row], high[row], open_price[row], low[row], ma5[row],
+                                scalar_times[row], 100.0, 2.0)
+        assert got == expected.get(row)
+    np.testing.assert_array_equal(scalar_times, last_times)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_band_engine_matches_band_rule(provider, seed):
+    rng = np.random.default_rng(seed)
+    codes = provider.history.codes
+    closes = {code: provider.get_history_k_data(code)["close"].tail(4).tolist() for code in codes}
+    engine = BandSignalEngine(closes, tolerance=0.03, repeat_interval=10)
+    strategy = PriceRangeStrategy(tolerance=0.03)
+    last_alert = np.full(len(codes), np.nan)
+    price = np.full(len(codes), np.nan)
+    now = 1_700_000_000.0
+    for _ in range(N_TICKS):
+        now += rng.uniform(0.5, 8)
+        price = _random_prices(rng, price, engine.lower * 0.99, engine.upper * 1.01)
+        got = engine.evaluate(_snapshot(engine.codes, price), now)
+        # 全量计算：以当前价代入 MA5，按 PriceRangeStrategy 的区间判断
+        in_band = strategy.in_range_mask(price, (engine.last4_sum + price) / 5)
+        alert = in_band & ~(now - last_alert <= engine.repeat_interval)
+        last_alert[alert] = now
+        last_alert[~in_band] = np.nan
+        assert set(got["stock_code"]) == {engine.codes[row] for row in np.flatnonzero(alert)}
+    np.testing.assert_array_equal(engine.last_alert, last_alert)
@@ -0,0 +1,82 @@
+# test_tick_recorder.py
+"""行情录制：录制后读出的 tick 与只保留变化行的期望一致，按代码/时间过滤，末尾不完整的帧被忽略"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from MA5Observer.tick_recorder import TICK_COLUMNS, TickRecorder, read_ticks
+
+TRADE_DATE = "2024-12-27"
+CODES = ["600000", "000001", "300750"]
+NAMES = {"600000": "浦发银行", "000001": "平安银行", "300750": "宁德时代"}
+
+
+def _snapshots(rng, n):
+    """n 个快照：价格和成交量经常不变(应被跳过)，偶尔缺失价格"""
+    start = datetime(2024, 12, 27, 9, 30).timestamp()
+    price = rng.uniform(5, 50, len(CODES))
+    volume = np.zeros(len(CODES))
+    snapshots = []
+    for i in range(n):
+        moved = rng.random(len(CODES)) < 0.5
+        price = np.where(moved, price * rng.uniform(0.99, 1.01, len(CODES)), price)
+        volume = volume + np.where(moved, rng.integers(1, 100, len(CODES)) * 100, 0)
+        quoted = np.where(rng.random(len(CODES)) < 0.1, np.nan, price)
+        snapshot = pd.DataFrame({"short_name": [NAMES[code] for code in CODES], "price": quoted,
+                                 "change": quoted - 10, "change_pct": quoted / 10 - 1,
+                                 "volume": volume, "amount": volume * quoted},
+                                index=pd.Index(CODES, name="stock_code"))
+        snapshots.append((snapshot, start + 3 * i))
+    return snapshots
+
+
+def _expected(snapshots):
+    """每只股票与上一条记录相比价格或成交量有变化的行"""
+    rows, last = [], {}
+    for snapshot, now in snapshots:
+        for code, row in snapshot.iterrows():
+            key = (row["price"], row["volume"])
+            if np.isnan(row["price"]) or last.get(code) == key:
+                continue
+            last[code] = key
+            rows.append({"stock_code": code, "trade_time": now,
+                         **{name: row[name] for name in TICK_COLUMNS[1:]}, "short_name": row["short_name"]})
+    frame = pd.DataFrame(rows)
+    return frame.sort_values(["stock_code", "trade_time"], kind="stable").reset_index(drop=True)
+
+
+def test_record_and_read_round_trip(tmp_path):
+    snapshots = _snapshots(np.random.default_rng(0), 60)
+    # max_rows 很小，写成多帧，时间过滤会跳过整帧
+    recorder = TickRecorder(directory=str(tmp_path), flush_interval=60, max_rows=10)
+    for snapshot, now in snapshots:
+        recorder.record(snapshot, now)
+    recorder.close()
+
+    expected = _expected(snapshots)
+    pd.testing.assert_frame_equal(read_ticks(TRADE_DATE, directory=str(tmp_path)), expected)
+
+    start, end = snapshots[10][1], snapshots[40][1]
+    selected = expected[(expected["stock_code"] == "300750") &
+                        (expected["trade_time"] >= start) & (expected["trade_time"] <= end)].reset_index(drop=True)
+    got = read_ticks(TRADE_DATE, codes=["300750"], start=datetime.fromtimestamp(start),
+                     end=datetime.fromtimestamp(end), directory=str(tmp_path))
+    pd.testing.assert_frame_equal(got, selected)
+
+    # 写入中途退出：末尾留下不完整的帧
+    path = tmp_path / TRADE_DATE / "observer.log"
+    with open(path, "ab") as f:
+        f.write(path.read_bytes()[8:40])
+    pd.testing.assert_frame_equal(read_ticks(TRADE_DATE, directory=str(tmp_path)), expected)
+
+
+def test_restart_continues_same_day(tmp_path):
+    snapshots = _snapshots(np.random.default_rng(1), 40)
+    for part in (snapshots[:20], snapshots[20:]):
+        recorder = TickRecorder(directory=str(tmp_path), flush_interval=60)
+        for snapshot, now in part:
+            recorder.record(snapshot, now)
+        recorder.close()
+    # 重启后接着上次每只股票的最后一条判断变化，结果与一次录制相同
+    pd.testing.assert_frame_equal(read_ticks(TRADE_DATE, directory=str(tmp_path)), _expected(snapshots))
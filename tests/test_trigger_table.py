@@ -0,0 +1,76 @@
+# test_trigger_table.py
+"""触发价格表：阈值与日K线一致，只为交易日计算，保存在指定目录并在下一交易日开盘前直接载入信号引擎"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.observer import StockObserver
+from MA5Observer.trigger_table import (DEFAULT_TRIGGER_DIR, build_trigger_table, load_trigger_table,
+                                       save_trigger_table)
+
+DAY1, DAY2 = "2023-06-29", "2023-06-30"
+
+
+@pytest.fixture
+def provider():
+    provider = ReplayProvider(history=synthetic_history(6, end=DAY2), replay_date=DAY1, speed=0)
+    provider.clock.set(datetime(2023, 6, 29, 16, 0))
+    return provider
+
+
+def test_thresholds_match_history(provider):
+    codes = provider.history.codes
+    table = build_trigger_table(provider, codes, DAY2, 0.03).set_index("stock_code")
+    for code in codes:
+        history = provider.history.to_frame(code)
+        history = history[history["trade_date"] <= pd.Timestamp(DAY1)].tail(5)
+        row = table.loc[code]
+        last4 = history["close"].iloc[1:].sum()
+        assert row["last4_sum"] == pytest.approx(last4)
+        assert row["breakeven"] == pytest.approx(last4 / 4)
+        assert row["band_upper"] == pytest.approx(last4 * 1.03 / (4 - 0.03))
+        assert row["yesterday_high"] == pytest.approx(history["high"].iloc[-1])
+
+
+def test_rejects_non_trading_date(provider):
+    with pytest.raises(ValueError):
+        build_trigger_table(provider, provider.history.codes, "2023-07-01", 0.03)
+
+
+def test_save_load_merges_parts(provider, tmp_path):
+    codes = provider.history.codes
+    table = build_trigger_table(provider, codes, DAY2, 0.03)
+    save_trigger_table(table.iloc[:3], DAY2, "shard-0", str(tmp_path))
+    save_trigger_table(table.iloc[3:], DAY2, "shard-1", str(tmp_path))
+    loaded = load_trigger_table(DAY2, 0.03, str(tmp_path))
+    assert sorted(loaded.index) == sorted(codes)
+    assert load_trigger_table(DAY2, 0.05, str(tmp_path)).empty
+    assert load_trigger_table(DAY1, 0.03, str(tmp_path)) is None
+
+
+def test_observer_persists_only_to_given_directory(provider, tmp_path):
+    codes = provider.history.codes
+    observer = StockObserver(provider, [Stock(codes[0], provider)], codes[1:], trigger_dir=str(tmp_path))
+    observer.off_hours_report()
+    assert os.listdir(tmp_path) == [DAY2]
+
+    # 第二天开盘前启动：观察股的阈值直接来自触发价格表，不再读取日K线
+    provider.clock.set(datetime(2023, 6, 30, 9, 0))
+    fetched = []
+    get_history = provider.get_history_k_data
+    provider.get_history_k_data = lambda code, *args: fetched.append(code) or get_history(code, *args)
+    restarted = StockObserver(provider, [], codes[1:], trigger_dir=str(tmp_path))
+    assert fetched == []
+    np.testing.assert_allclose(restarted.band_engine.upper, observer._pending_triggers.loc[codes[1:], "band_upper"])
+
+    # 不指定目录(回放、基准测试)时只在内存中使用
+    replay = StockObserver(provider, [], codes[1:])
+    replay.off_hours_report()
+    assert replay._pending_triggers is not None
+    assert not os.path.exists(os.path.join(DEFAULT_TRIGGER_DIR, DAY2))
@@ -0,0 +1,85 @@
+# test_watchlist.py
+"""列表热更新：文件变更检测，以及观察者增量更新时只为新增代码读取历史数据、保留原有股票的状态"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from MA5Observer.Stock import Stock
+from MA5Observer.benchmark import synthetic_history
+from MA5Observer.data_provider.replay_provider import ReplayProvider
+from MA5Observer.observer import StockObserver
+from MA5Observer.watchlist import WatchlistWatcher
+
+
+def _write(path, codes):
+    """写入代码文件，并把 mtime 往后推，保证与上一次的签名不同"""
+    path.write_text("".join(f"{code}\n" for code in codes), encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.fixture
+def files(tmp_path):
+    holding, observe = tmp_path / "holding.txt", tmp_path / "observe.txt"
+    _write(holding, ["600000"])
+    _write(observe, ["000001", "300750"])
+    return holding, observe
+
+
+def test_poll_reports_only_real_changes(files):
+    holding, observe = files
+    watcher = WatchlistWatcher(str(holding), str(observe))
+    assert watcher.poll() is None
+    _write(observe, ["300750", "000001", "000001", ""])  # 顺序、重复与空行不算变化
+    assert watcher.poll() is None
+    _write(observe, ["000001", "300750", "002594"])
+    assert watcher.poll() == (["600000"], ["000001", "300750", "002594"])
+    assert watcher.poll() is None
+
+
+def test_poll_ignores_missing_or_emptied_files(files):
+    holding, observe = files
+    watcher = WatchlistWatcher(str(holding), str(observe))
+    os.remove(observe)
+    assert watcher.poll() is None
+    _write(observe, [])
+    assert watcher.poll() is None
+    assert watcher.observe_codes == ["000001", "300750"]
+    _write(observe, ["002594"])
+    assert watcher.poll() == (["600000"], ["002594"])
+
+
+class _CountingProvider:
+    """记录 get_history_k_data 调用的数据源(其余接口委托给回放数据源)"""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.fetched = []
+
+    def get_history_k_data(self, stock_code, start_date=None, end_date=None):
+        self.fetched.append(stock_code)
+        return self.provider.get_history_k_data(stock_code, start_date, end_date)
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+
+def test_apply_watchlist_fetches_only_added_codes():
+    replay = ReplayProvider(history=synthetic_history(10, end="2023-06-30"), speed=0)
+    replay.clock.set(datetime(2023, 6, 30, 10, 0))
+    provider = _CountingProvider(replay)
+    codes = replay.history.codes
+    observer = StockObserver(provider, [Stock(code, provider) for code in codes[:2]], codes[2:6])
+    observer.holding_stocks[0].signal_times[:] = [1.0, 2.0, 3.0, 4.0]
+    observer.band_engine.last_alert[1] = 123.0
+    kept = observer.holding_stocks[0]
+
+    provider.fetched.clear()
+    observer.apply_watchlist(observer.prepare_watchlist([codes[0], codes[6]], codes[3:8]))
+    assert sorted(provider.fetched) == sorted([codes[6], codes[6], codes[7]])  # 新持仓(Stock)与两只新观察股
+    assert observer.holding_stocks[0] is kept
+    np.testing.assert_array_equal(observer.sell_engine.last_times[0], [1.0, 2.0, 3.0, 4.0])
+    assert observer.band_engine.codes == codes[3:8]
+    assert observer.band_engine.last_alert[0] == 123.0  # codes[3] 原来在第 1 行